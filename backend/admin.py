@@ -0,0 +1,131 @@
+"""
+Admin endpoints shared by the R_Health backends
+Cache and query statistics, warehouse cost per route and query, request profiles, cache invalidation
+(called by execute_gold_layer_sdk.py after a gold rebuild), gold replica refresh and the Prometheus
+/metrics endpoint
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import hmac
+import os
+
+from .cache import GOLD_TABLES
+from .disconnect import DISCONNECT_STATS
+from .metrics import CONTENT_TYPE, render_metrics
+from .profiling import PROFILER
+from .resilience import RESILIENCE_STATS
+
+# Admin calls must send a matching X-Admin-Token header; without ADMIN_TOKEN they are all refused
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Serve /metrics without the admin token, for scrapers that can't send the header
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() == "true"
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def require_metrics_access(x_admin_token: Optional[str] = Header(None)):
+    if not METRICS_PUBLIC:
+        require_admin(x_admin_token)
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+# Served at the conventional scrape path rather than under /api/admin
+metrics_router = APIRouter(tags=["admin"], dependencies=[Depends(require_metrics_access)])
+
+
+@router.get("/cache")
+async def get_cache_stats(request: Request):
+    """Result cache counters and the last seen gold table versions"""
+    service = request.app.state.query_service
+    stats = {"cache": service.cache.stats(), "gold_versions": service.gold_versions}
+    if service.shared_cache:
+        stats["shared_cache"] = service.shared_cache.stats()
+    return stats
+
+
+@router.get("/stats")
+async def get_query_stats(request: Request):
+    """Query service counters: cache, coalesced calls, admission queue and waits, cancelled statements, retries, the circuit breaker and warehouse routing"""
+    service = request.app.state.query_service
+    stats = {
+        "cache": service.cache.stats(),
+        "singleflight": service.singleflight.stats(),
+        "admission": service.admission.stats(),
+        "cancellations": {**DISCONNECT_STATS, **service.router.runtime_stats()},
+        "resilience": {**RESILIENCE_STATS, "circuit": service.breaker.stats()},
+        "routing": service.router.stats(),
+    }
+    if service.shared_cache:
+        stats["shared_cache"] = service.shared_cache.stats()
+    if service.replica:
+        stats["replica"] = service.replica.stats()
+    return stats
+
+
+@router.get("/costs")
+async def get_costs(
+    request: Request,
+    refresh: bool = Query(False, description="Read Query History now instead of waiting for the collector"),
+):
+    """Warehouse seconds, bytes scanned and rows produced of the statements sent, per route and per query template"""
+    service = request.app.state.query_service
+    if refresh:
+        try:
+            await service.costs.collect()
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Query History unavailable: {str(e)[:200]}")
+    return service.costs.report()
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """Profiled requests kept in this worker, newest first"""
+    return {"profiles": PROFILER.list()}
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """Folded stacks of one profiled request (flamegraph.pl / speedscope input)"""
+    profile = PROFILER.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"No profile {profile_id} in this worker")
+    return PlainTextResponse(profile.folded())
+
+
+@router.post("/cache/invalidate")
+async def invalidate_cache(
+    request: Request,
+    table: Optional[str] = Query(None, description="Gold table to invalidate (default: all)"),
+):
+    """Drop cached results, e.g. right after the gold layer is rebuilt"""
+    if table and table not in GOLD_TABLES:
+        raise HTTPException(status_code=400, detail=f"Unknown gold table: {table}")
+
+    service = request.app.state.query_service
+    dropped = service.cache.invalidate([table] if table else None)
+    if service.shared_cache:
+        dropped += await asyncio.to_thread(service.shared_cache.invalidate, [table] if table else None)
+    return {"invalidated": dropped, "table": table or "all"}
+
+
+@router.post("/replica/refresh")
+async def refresh_replica(request: Request):
+    """Check gold versions now and re-snapshot changed tables instead of waiting for the watcher"""
+    service = request.app.state.query_service
+    if not service.replica:
+        raise HTTPException(status_code=404, detail="Gold replica is not enabled (set GOLD_REPLICA_DIR)")
+    changed = await service.check_gold_versions()
+    return {"changed": changed, "replica": service.replica.stats()}
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(request: Request):
+    """Prometheus text exposition of this worker's metrics"""
+    return PlainTextResponse(render_metrics(request.app.state.query_service), media_type=CONTENT_TYPE)
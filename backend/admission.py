@@ -0,0 +1,232 @@
+"""
+Admission control in front of the SQL warehouse
+Caps the statements one process has running on the warehouse, admits waiting calls by priority
+(summaries and lookups before bulk lists before exports) and round-robin across clients within a
+priority, and rejects fast with 503 + Retry-After once the wait queue is full or a call has waited
+too long
+"""
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+import asyncio
+import math
+import os
+import time
+
+# Statements in flight on the warehouse per process (0 = unlimited)
+WAREHOUSE_MAX_IN_FLIGHT = int(os.getenv("WAREHOUSE_MAX_IN_FLIGHT", "16"))
+# Calls allowed to wait for a slot before new ones are rejected
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "200"))
+# Longest a call waits for a slot (seconds) before it is rejected
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "30"))
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0  # summaries, payer / DRG lookups
+PRIORITY_LIST = 1  # paginated scenario lists
+PRIORITY_EXPORT = 2  # streamed ndjson / csv exports
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_LIST: "list", PRIORITY_EXPORT: "export"}
+
+# Who the current request is for; set by ClientIdentityMiddleware
+CLIENT_ID: ContextVar[Optional[str]] = ContextVar("client_id", default=None)
+
+_RECENT_WAITS = 1000
+
+
+class AdmissionRejected(Exception):
+    """No warehouse slot for this call; the caller should answer 503 with Retry-After"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def client_identity(scope: Dict[str, Any]) -> str:
+    """Databricks Apps forwards the signed-in user; otherwise fall back to the client address"""
+    headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+    for header in ("x-forwarded-email", "x-forwarded-user"):
+        if headers.get(header):
+            return headers[header]
+    if headers.get("x-forwarded-for"):
+        return headers["x-forwarded-for"].split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "anonymous"
+
+
+class ClientIdentityMiddleware:
+    """
+    Records the caller in CLIENT_ID for fair queuing
+
+    An identity that is already set is kept, so calls an /api/batch request makes through the
+    app itself are queued as the batch's caller rather than as the in-process client.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or CLIENT_ID.get() is not None:
+            await self.app(scope, receive, send)
+            return
+        token = CLIENT_ID.set(client_identity(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            CLIENT_ID.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "client", "enqueued_at")
+
+    def __init__(self, priority: int, client: str):
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.priority = priority
+        self.client = client
+        self.enqueued_at = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Priority + per-client fair scheduler for warehouse statements
+
+    A slot is held for the whole statement (submit, polling and result download). Calls that
+    find a free slot and nobody waiting go straight through; the rest queue per priority, each
+    priority holding one FIFO per client that is served round-robin.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = WAREHOUSE_MAX_IN_FLIGHT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_wait: float = ADMISSION_MAX_WAIT,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.waiting = 0
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+        self._service_time = 1.0  # moving average of slot hold time, for Retry-After
+        self._waits: Deque[float] = deque(maxlen=_RECENT_WAITS)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.peak_waiting = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0
+
+    @property
+    def has_capacity(self) -> bool:
+        """A new call would be admitted right away"""
+        return not self.enabled or (self.in_flight < self.max_in_flight and not self.waiting)
+
+    def retry_after(self) -> int:
+        """Rough seconds until a new call would be admitted"""
+        backlog = (self.waiting + 1) * self._service_time / max(self.max_in_flight, 1)
+        return max(1, min(60, math.ceil(backlog)))
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_LIST, client: Optional[str] = None) -> AsyncIterator[None]:
+        """Hold a warehouse slot for the duration of the block; raises AdmissionRejected"""
+        if not self.enabled:
+            yield
+            return
+        await self._acquire(priority, client or CLIENT_ID.get() or "anonymous")
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+            self._release()
+
+    async def _acquire(self, priority: int, client: str):
+        if self.in_flight < self.max_in_flight and not self.waiting:
+            self.in_flight += 1
+            self.admitted += 1
+            self._waits.append(0.0)
+            return
+        if self.waiting >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected("Warehouse queue is full", self.retry_after())
+
+        waiter = _Waiter(priority, client)
+        self._queues.setdefault(priority, OrderedDict()).setdefault(client, deque()).append(waiter)
+        self.waiting += 1
+        self.queued += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await asyncio.wait_for(waiter.future, timeout=self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we gave up: hand the slot on
+                self._release()
+            else:
+                self._discard(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected_timeout += 1
+                raise AdmissionRejected(f"Waited {self.max_wait:g}s for a warehouse slot", self.retry_after())
+            raise
+        self._waits.append(time.monotonic() - waiter.enqueued_at)
+        self.admitted += 1
+
+    def _discard(self, waiter: _Waiter):
+        clients = self._queues.get(waiter.priority, {})
+        queue = clients.get(waiter.client)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self.waiting -= 1
+            if not queue:
+                del clients[waiter.client]
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        for priority in sorted(self._queues):
+            clients = self._queues[priority]
+            while clients:
+                client, queue = next(iter(clients.items()))
+                waiter = queue.popleft()
+                self.waiting -= 1
+                if queue:
+                    clients.move_to_end(client)  # round-robin: this client goes to the back
+                else:
+                    del clients[client]
+                if not waiter.future.done():
+                    return waiter
+        return None
+
+    def _release(self):
+        self.in_flight -= 1
+        while self.in_flight < self.max_in_flight:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self.in_flight += 1
+            waiter.future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        waits: List[float] = sorted(self._waits)
+        depth = {
+            PRIORITY_NAMES.get(priority, str(priority)): sum(len(queue) for queue in clients.values())
+            for priority, clients in sorted(self._queues.items())
+        }
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "queue_depth": depth,
+            "waiting_clients": sum(len(clients) for clients in self._queues.values()),
+            "peak_waiting": self.peak_waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_wait_timeout": self.rejected_timeout,
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+                "max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            },
+        }
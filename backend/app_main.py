@@ -7,10 +7,30 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Any, Optional
 import os
-import requests
-import time
+import sys
+import httpx
+
+if __package__ in (None, ""):
+    # Allow `cd backend && python app_main.py` as well as `uvicorn backend.app_main:app`
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.admin import metrics_router, router as admin_router
+from backend.admission import AdmissionRejected, ClientIdentityMiddleware
+from backend.attribution import REQUEST_ID_HEADER, RequestIdMiddleware
+from backend.batch import router as batch_router
+from backend.disconnect import CancelOnDisconnectMiddleware
+from backend.formats import (
+    FORMAT_QUERY, STALENESS_HEADER, STREAMING_FORMATS, ResponseFormat, check_limit, render_result, stream_result,
+)
+from backend.metrics import MetricsMiddleware
+from backend.pagination import CURSOR_QUERY, NEXT_CURSOR_HEADER
+from backend.profiling import PROFILE_ID_HEADER, ProfilingMiddleware
+from backend.queries import BoundQuery, bind_query
+from backend.resilience import WarehouseUnavailable
+from backend.service import QueryService
+from backend.warehouse import AsyncWarehouseClient, StatementTimeoutError, WarehouseError
 
 app = FastAPI(
     title="R_Health Healthcare Analytics API",
@@ -25,7 +45,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, STALENESS_HEADER, REQUEST_ID_HEADER, PROFILE_ID_HEADER],
 )
+app.add_middleware(ClientIdentityMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(RequestIdMiddleware)
+app.add_middleware(CancelOnDisconnectMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Databricks configuration from environment variables
 DATABRICKS_HOST = os.getenv("DATABRICKS_HOST", "https://fe-vm-hls-amer.cloud.databricks.com")
@@ -33,74 +59,74 @@ DATABRICKS_TOKEN = os.getenv("DATABRICKS_TOKEN")
 WAREHOUSE_ID = os.getenv("WAREHOUSE_ID", "4b28691c780d9875")
 CATALOG_NAME = os.getenv("CATALOG_NAME", "hls_amer_catalog")
 
+# Shared async pooled client - every endpoint reuses the same keep-alive connections
+warehouse = AsyncWarehouseClient(host=DATABRICKS_HOST, warehouse_id=WAREHOUSE_ID, token=DATABRICKS_TOKEN)
+
+# Result cache + gold version watcher in front of the warehouse
+query_service = QueryService(warehouse)
+app.state.query_service = query_service
+app.include_router(admin_router)
+app.include_router(metrics_router)
+app.include_router(batch_router)
+
+
+@app.on_event("startup")
+async def start_query_service():
+    query_service.start()
 
-def execute_query(query: str) -> List[Dict[str, Any]]:
-    """Execute SQL query using Databricks SQL API and return results as list of dictionaries"""
+
+@app.on_event("shutdown")
+async def stop_query_service():
+    await query_service.stop()
+
+
+async def execute_query(query: BoundQuery, response_format: ResponseFormat = "json", first_row: bool = False) -> Any:
+    """Execute SQL query using Databricks SQL API and return results as list of dictionaries (or the requested format)"""
 
     # Check if running in development mode without token
     if not DATABRICKS_TOKEN:
         # In production, this will be auto-injected by Databricks Apps
         # If not available, we need to handle gracefully
-        print(f"Warning: DATABRICKS_TOKEN not available. Query will fail: {query[:100]}")
+        print(f"Warning: DATABRICKS_TOKEN not available. Query will fail: {query.name}")
         raise HTTPException(
             status_code=503,
             detail="Database connection not configured. Please ensure DATABRICKS_TOKEN is set."
         )
 
     try:
-        # Execute statement using Databricks SQL API
-        url = f"{DATABRICKS_HOST}/api/2.0/sql/statements"
-        headers = {
-            "Authorization": f"Bearer {DATABRICKS_TOKEN}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "warehouse_id": WAREHOUSE_ID,
-            "statement": query,
-            "wait_timeout": "50s"
-        }
-
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        result = response.json()
-
-        # Check if query succeeded
-        if result.get("status", {}).get("state") != "SUCCEEDED":
-            error_msg = result.get("status", {}).get("error", {}).get("message", "Unknown error")
-            raise HTTPException(status_code=500, detail=f"Query failed: {error_msg}")
-
-        # Extract results
-        if not result.get("result") or not result.get("result", {}).get("data_array"):
-            return []
-
-        columns = [col["name"] for col in result["result"]["manifest"]["schema"]["columns"]]
-        rows = result["result"]["data_array"]
-
-        results = []
-        for row in rows:
-            results.append(dict(zip(columns, row)))
-
-        return results
-
-    except requests.exceptions.RequestException as e:
+        if response_format in STREAMING_FORMATS:
+            return stream_result(await query_service.stream(query), response_format)
+        result = await query_service.execute_result(query)
+
+    except (AdmissionRejected, WarehouseUnavailable) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except StatementTimeoutError as e:
+        print(f"Query timed out: {str(e)}")
+        raise HTTPException(status_code=504, detail=f"Query timed out: {str(e)}")
+    except WarehouseError as e:
+        print(f"Query failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
+    except httpx.HTTPError as e:
         print(f"Request error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
     except Exception as e:
         print(f"Query error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database query error: {str(e)}")
 
+    return render_result(result, response_format, query.page, first_row)
+
 
 # ==============================================================================
 # API ENDPOINTS (Same as main.py - all 14 endpoints)
 # ==============================================================================
 
 @app.get("/api/health")
-def health_check():
-    return {"status": "healthy", "service": "R_Health API"}
+async def health_check():
+    return {"status": "healthy", "service": "R_Health API", **query_service.health()}
 
 
 @app.get("/api/info")
-def api_info():
+async def api_info():
     return {
         "name": "R_Health Healthcare Analytics API",
         "version": "1.0.0",
@@ -116,209 +142,109 @@ def api_info():
 
 # Capacity Management
 @app.get("/api/capacity-management")
-def get_capacity_management(
+async def get_capacity_management(
     priority: Optional[str] = None,
     min_encounters: Optional[int] = None,
-    limit: Optional[int] = 100
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = CURSOR_QUERY,
+    response_format: ResponseFormat = FORMAT_QUERY
 ):
-    query = """
-    SELECT * FROM hls_amer_catalog.r_health_gold.capacity_management
-    WHERE 1=1
-    """
-    if priority:
-        query += f" AND optimization_priority LIKE '%{priority}%'"
-    if min_encounters:
-        query += f" AND total_encounters >= {min_encounters}"
-    query += f" ORDER BY estimated_cost_opportunity DESC LIMIT {limit}"
-    return execute_query(query)
+    check_limit(limit, response_format)
+    query = bind_query("capacity_management", cursor, priority=priority, min_encounters=min_encounters, limit=limit)
+    return await execute_query(query, response_format)
 
 
 @app.get("/api/capacity-management/summary")
-def get_capacity_summary():
-    query = """
-    SELECT
-        COUNT(*) as total_drgs,
-        SUM(total_encounters) as total_encounters,
-        SUM(total_bed_days) as total_bed_days,
-        ROUND(AVG(avg_los), 2) as overall_avg_los,
-        SUM(estimated_cost_opportunity) as total_cost_opportunity,
-        SUM(CASE WHEN optimization_priority LIKE '%Critical%' THEN 1 ELSE 0 END) as critical_count,
-        SUM(CASE WHEN optimization_priority LIKE '%High%' THEN 1 ELSE 0 END) as high_priority_count
-    FROM hls_amer_catalog.r_health_gold.capacity_management
-    """
-    results = execute_query(query)
-    return results[0] if results else {}
+async def get_capacity_summary():
+    return await execute_query(bind_query("capacity_summary"), first_row=True)
 
 
 # Denials Management
 @app.get("/api/denials-management")
-def get_denials_management(
+async def get_denials_management(
     payer: Optional[str] = None,
     denial_category: Optional[str] = None,
-    limit: Optional[int] = 100
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = CURSOR_QUERY,
+    response_format: ResponseFormat = FORMAT_QUERY
 ):
-    query = "SELECT * FROM hls_amer_catalog.r_health_gold.denials_management WHERE 1=1"
-    if payer:
-        query += f" AND payer_name = '{payer}'"
-    if denial_category:
-        query += f" AND denial_category = '{denial_category}'"
-    query += f" ORDER BY priority_score DESC LIMIT {limit}"
-    return execute_query(query)
+    check_limit(limit, response_format)
+    query = bind_query("denials_management", cursor, payer=payer, denial_category=denial_category, limit=limit)
+    return await execute_query(query, response_format)
 
 
 @app.get("/api/denials-management/summary")
-def get_denials_summary():
-    query = """
-    SELECT
-        COUNT(*) as total_denial_groups,
-        SUM(total_denials) as total_denials,
-        SUM(total_appealed) as total_appealed,
-        ROUND(SUM(total_denied_amount), 2) as total_denied_amount,
-        ROUND(SUM(recovered_amount), 2) as total_recovered,
-        ROUND(AVG(appeal_win_rate), 2) as avg_win_rate
-    FROM hls_amer_catalog.r_health_gold.denials_management
-    """
-    results = execute_query(query)
-    return results[0] if results else {}
+async def get_denials_summary():
+    return await execute_query(bind_query("denials_summary"), first_row=True)
 
 
 # Clinical Trial Matching
 @app.get("/api/clinical-trial-matching")
-def get_clinical_trial_matching(
+async def get_clinical_trial_matching(
     trial_type: Optional[str] = None,
     eligible_only: Optional[bool] = False,
-    limit: Optional[int] = 100
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = CURSOR_QUERY,
+    response_format: ResponseFormat = FORMAT_QUERY
 ):
-    query = "SELECT * FROM hls_amer_catalog.r_health_gold.clinical_trial_matching WHERE 1=1"
-    if eligible_only:
-        query += " AND eligible_trial_count > 0"
-    if trial_type:
-        trial_type_upper = trial_type.upper()
-        if trial_type_upper == "KRAS":
-            query += " AND kras_trial_eligible = true"
-        elif trial_type_upper == "COPD":
-            query += " AND copd_trial_eligible = true"
-        elif trial_type_upper == "PDL1":
-            query += " AND pdl1_trial_eligible = true"
-    query += f" ORDER BY eligible_trial_count DESC LIMIT {limit}"
-    return execute_query(query)
+    check_limit(limit, response_format)
+    query = bind_query("clinical_trial_matching", cursor, trial_type=trial_type, eligible_only=eligible_only, limit=limit)
+    return await execute_query(query, response_format)
 
 
 @app.get("/api/clinical-trial-matching/summary")
-def get_clinical_trial_summary():
-    query = """
-    SELECT
-        COUNT(*) as total_patients,
-        SUM(CASE WHEN kras_trial_eligible THEN 1 ELSE 0 END) as kras_eligible,
-        SUM(CASE WHEN copd_trial_eligible THEN 1 ELSE 0 END) as copd_eligible,
-        SUM(CASE WHEN pdl1_trial_eligible THEN 1 ELSE 0 END) as pdl1_eligible
-    FROM hls_amer_catalog.r_health_gold.clinical_trial_matching
-    """
-    results = execute_query(query)
-    return results[0] if results else {}
+async def get_clinical_trial_summary():
+    return await execute_query(bind_query("clinical_trial_summary"), first_row=True)
 
 
 # Timely Filing & Appeals
 @app.get("/api/timely-filing-appeals")
-def get_timely_filing_appeals(
+async def get_timely_filing_appeals(
     urgency: Optional[str] = None,
     compliance_status: Optional[str] = None,
-    limit: Optional[int] = 100
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = CURSOR_QUERY,
+    response_format: ResponseFormat = FORMAT_QUERY
 ):
-    query = "SELECT * FROM hls_amer_catalog.r_health_gold.timely_filing_appeals WHERE 1=1"
-    if urgency:
-        urgency_map = {
-            "Critical": "urgency_score >= 90",
-            "High": "urgency_score >= 70 AND urgency_score < 90",
-            "Medium": "urgency_score >= 40 AND urgency_score < 70",
-            "Low": "urgency_score < 40"
-        }
-        if urgency in urgency_map:
-            query += f" AND {urgency_map[urgency]}"
-    if compliance_status:
-        query += f" AND compliance_status = '{compliance_status}'"
-    query += f" ORDER BY urgency_score DESC LIMIT {limit}"
-    return execute_query(query)
+    check_limit(limit, response_format)
+    query = bind_query("timely_filing_appeals", cursor, urgency=urgency, compliance_status=compliance_status, limit=limit)
+    return await execute_query(query, response_format)
 
 
 @app.get("/api/timely-filing-appeals/summary")
-def get_timely_filing_summary():
-    query = """
-    SELECT
-        COUNT(*) as total_claims,
-        SUM(CASE WHEN is_at_risk THEN 1 ELSE 0 END) as at_risk_claims,
-        SUM(CASE WHEN urgency_score >= 90 THEN 1 ELSE 0 END) as critical_urgency,
-        ROUND(SUM(at_risk_amount), 2) as total_at_risk_amount
-    FROM hls_amer_catalog.r_health_gold.timely_filing_appeals
-    """
-    results = execute_query(query)
-    return results[0] if results else {}
+async def get_timely_filing_summary():
+    return await execute_query(bind_query("timely_filing_summary"), first_row=True)
 
 
 # Documentation Management
 @app.get("/api/documentation-management")
-def get_documentation_management(
+async def get_documentation_management(
     doc_type: Optional[str] = None,
     payer: Optional[str] = None,
     urgency: Optional[str] = None,
-    limit: Optional[int] = 100
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = CURSOR_QUERY,
+    response_format: ResponseFormat = FORMAT_QUERY
 ):
-    query = "SELECT * FROM hls_amer_catalog.r_health_gold.documentation_management WHERE 1=1"
-    if doc_type:
-        query += f" AND documentation_type = '{doc_type}'"
-    if payer:
-        query += f" AND payer_name = '{payer}'"
-    if urgency:
-        query += f" AND request_urgency = '{urgency}'"
-    query += f" ORDER BY associated_claim_value DESC LIMIT {limit}"
-    return execute_query(query)
+    check_limit(limit, response_format)
+    query = bind_query("documentation_management", cursor, doc_type=doc_type, payer=payer, urgency=urgency, limit=limit)
+    return await execute_query(query, response_format)
 
 
 @app.get("/api/documentation-management/summary")
-def get_documentation_summary():
-    query = """
-    SELECT
-        COUNT(*) as total_doc_groups,
-        SUM(total_requests) as total_requests,
-        SUM(completed_requests) as total_completed,
-        ROUND(AVG(avg_turnaround_days), 1) as overall_avg_turnaround,
-        ROUND(AVG(completion_rate), 2) as overall_completion_rate
-    FROM hls_amer_catalog.r_health_gold.documentation_management
-    """
-    results = execute_query(query)
-    return results[0] if results else {}
+async def get_documentation_summary():
+    return await execute_query(bind_query("documentation_summary"), first_row=True)
 
 
 # Utility endpoints
 @app.get("/api/payers")
-def get_payers():
-    query = """
-    SELECT DISTINCT payer_name
-    FROM (
-        SELECT payer_name FROM hls_amer_catalog.r_health_gold.denials_management
-        UNION
-        SELECT payer_name FROM hls_amer_catalog.r_health_gold.timely_filing_appeals
-        UNION
-        SELECT payer_name FROM hls_amer_catalog.r_health_gold.documentation_management
-    )
-    ORDER BY payer_name
-    """
-    return execute_query(query)
+async def get_payers():
+    return await execute_query(bind_query("payers"))
 
 
 @app.get("/api/drg-codes")
-def get_drg_codes():
-    query = """
-    SELECT DISTINCT drg_code
-    FROM (
-        SELECT drg_code FROM hls_amer_catalog.r_health_gold.capacity_management
-        UNION
-        SELECT drg_code FROM hls_amer_catalog.r_health_gold.denials_management
-    )
-    WHERE drg_code IS NOT NULL
-    ORDER BY drg_code
-    """
-    return execute_query(query)
+async def get_drg_codes():
+    return await execute_query(bind_query("drg_codes"))
 
 
 # ==============================================================================
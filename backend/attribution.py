@@ -0,0 +1,314 @@
+"""
+Warehouse cost attribution for the R_Health backends
+Every statement the API or a layer run sends is tagged with its route (or pipeline layer), query
+template and request / run id. The tag is sent as a leading SQL comment, so it shows in Query
+History, and the statement id is kept in a ledger. A collector looks the ledger's statements up in
+Query History and sums warehouse time, bytes scanned and rows produced per route and per query.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import os
+import re
+import time
+import uuid
+
+from .metrics import PRODUCED_ROWS, QUERY_NAME, SCANNED_BYTES, WAREHOUSE_SECONDS, route_template
+
+# Prefix statements with a /* rhealth ... */ tag comment
+STATEMENT_TAGS = os.getenv("STATEMENT_TAGS", "true").lower() == "true"
+# How often Query History is read for the statements sent (seconds, 0 disables the collector)
+COST_COLLECT_INTERVAL = float(os.getenv("COST_COLLECT_INTERVAL", "300"))
+# Statements waiting to be found in Query History; the oldest are dropped beyond this
+COST_LEDGER_SIZE = int(os.getenv("COST_LEDGER_SIZE", "10000"))
+# Statements not in Query History after this long (seconds) are given up on
+COST_HISTORY_MAX_AGE = float(os.getenv("COST_HISTORY_MAX_AGE", "3600"))
+
+# Query History statuses of statements that won't run any further
+FINAL_STATUSES = ("FINISHED", "FAILED", "CANCELED")
+HISTORY_BATCH = 100  # statement ids per Query History call
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class StatementTag:
+    """Who a statement was sent for: route (or pipeline layer), query template and request / run id"""
+
+    __slots__ = ("route", "query", "request_id")
+
+    def __init__(self, route: str, query: str, request_id: Optional[str] = None):
+        self.route = route
+        self.query = query
+        self.request_id = request_id
+
+    def comment(self, with_request_id: bool = True) -> str:
+        """
+        Leading SQL comment for the statement text
+
+        Read-only statements leave the request id out, so repeats from different requests still
+        have identical text and hit the warehouse result cache; the ledger keeps the id.
+        """
+        fields = [f"route={self.route}", f"query={self.query}"]
+        if with_request_id and self.request_id:
+            fields.append(f"request={self.request_id}")
+        return "/* rhealth " + " ".join(fields).replace("*/", "") + " */"
+
+
+# (request id, ASGI scope) of the request being handled; set by RequestIdMiddleware
+REQUEST: ContextVar[Optional[Tuple[str, Dict[str, Any]]]] = ContextVar("request", default=None)
+# Explicit tag for statements sent outside a request (layer runs)
+STATEMENT_TAG: ContextVar[Optional[StatementTag]] = ContextVar("statement_tag", default=None)
+
+
+def current_tag() -> StatementTag:
+    """Tag of a statement sent now; statements sent outside a request are "background" work"""
+    tag = STATEMENT_TAG.get()
+    if tag is not None:
+        return tag
+    request = REQUEST.get()
+    if request is None:
+        return StatementTag("background", QUERY_NAME.get())
+    request_id, scope = request
+    return StatementTag(route_template(scope), QUERY_NAME.get(), request_id)
+
+
+class RequestIdMiddleware:
+    """
+    Gives every HTTP request an id (X-Request-ID, or a new one) and records it in REQUEST
+
+    The id is echoed in the X-Request-ID response header. Calls an /api/batch request makes
+    through the app itself keep the batch's id but are attributed to their own route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = REQUEST.get()
+        request_id = parent[0] if parent else None
+        if request_id is None:
+            for name, value in scope.get("headers", []):
+                if name.decode("latin-1") == REQUEST_ID_HEADER.lower() and _REQUEST_ID.match(value.decode("latin-1")):
+                    request_id = value.decode("latin-1")
+            request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start" and parent is None:
+                message = dict(message, headers=list(message.get("headers", [])) + [(REQUEST_ID_HEADER.lower().encode(), request_id.encode())])
+            await send(message)
+
+        token = REQUEST.set((request_id, scope))
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            REQUEST.reset(token)
+
+
+def _costs(row: Dict[str, Any]) -> Dict[str, float]:
+    """Warehouse seconds, bytes scanned and rows produced of one Query History entry"""
+    metrics = row.get("metrics") or {}
+    total_ms = metrics.get("total_time_ms", row.get("duration")) or 0
+    return {
+        "warehouse_seconds": total_ms / 1000,
+        "bytes_scanned": metrics.get("read_bytes") or 0,
+        "rows_produced": metrics.get("rows_produced_count", row.get("rows_produced")) or 0,
+    }
+
+
+class CostLedger:
+    """
+    Statements sent and not yet found in Query History, and the costs of those that were
+
+    Costs are summed per route and per query template. Statements shared by coalesced callers
+    (single-flight) are attributed to the request that sent them.
+    """
+
+    def __init__(self, max_pending: int = COST_LEDGER_SIZE, max_age: float = COST_HISTORY_MAX_AGE):
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self._pending: "OrderedDict[str, Tuple[StatementTag, float]]" = OrderedDict()
+        self.by_route: Dict[str, Dict[str, float]] = {}
+        self.by_query: Dict[str, Dict[str, float]] = {}
+        self.attributed = 0
+        self.unmatched = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, statement_id: Optional[str], tag: StatementTag):
+        if not statement_id:
+            return
+        self._pending[statement_id] = (tag, time.monotonic())
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.unmatched += 1
+
+    def pending_ids(self, request_id: Optional[str] = None) -> List[str]:
+        return [sid for sid, (tag, _) in self._pending.items() if request_id is None or tag.request_id == request_id]
+
+    def apply(self, rows: Sequence[Dict[str, Any]]) -> List[Tuple[StatementTag, Dict[str, float]]]:
+        """Attribute the Query History entries of finished statements; returns (tag, costs) for each"""
+        attributed = []
+        for row in rows:
+            statement_id = row.get("query_id") or row.get("statement_id")
+            if row.get("status") not in FINAL_STATUSES or statement_id not in self._pending:
+                continue
+            tag, _ = self._pending.pop(statement_id)
+            costs = _costs(row)
+            for totals in (self.by_route.setdefault(tag.route, {}), self.by_query.setdefault(tag.query, {})):
+                totals["statements"] = totals.get("statements", 0) + 1
+                for name, value in costs.items():
+                    totals[name] = totals.get(name, 0) + value
+            WAREHOUSE_SECONDS.inc(costs["warehouse_seconds"], route=tag.route, query=tag.query)
+            SCANNED_BYTES.inc(costs["bytes_scanned"], route=tag.route, query=tag.query)
+            PRODUCED_ROWS.inc(costs["rows_produced"], route=tag.route, query=tag.query)
+            self.attributed += 1
+            attributed.append((tag, costs))
+        return attributed
+
+    def expire(self) -> int:
+        """Give up on statements Query History still doesn't know after max_age"""
+        cutoff = time.monotonic() - self.max_age
+        expired = [sid for sid, (_, recorded) in self._pending.items() if recorded < cutoff]
+        for statement_id in expired:
+            del self._pending[statement_id]
+        self.unmatched += len(expired)
+        return len(expired)
+
+    @staticmethod
+    def _rounded(groups: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+        ranked = sorted(groups.items(), key=lambda item: -item[1].get("warehouse_seconds", 0))
+        return {name: {k: round(v, 3) if isinstance(v, float) else v for k, v in totals.items()} for name, totals in ranked}
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "by_route": self._rounded(self.by_route),
+            "by_query": self._rounded(self.by_query),
+            "attributed": self.attributed,
+            "pending": len(self._pending),
+            "unmatched": self.unmatched,
+        }
+
+
+# Statements this process has sent; the warehouse clients record into it
+LEDGER = CostLedger()
+
+
+class CostCollector:
+    """
+    Reads Query History for the ledger's statements every `interval` seconds
+
+    Query History is a workspace API, so collecting never starts or loads a warehouse. Entries
+    appear once a statement finishes; statements still queued or running are looked up again
+    on the next pass.
+    """
+
+    def __init__(self, client, ledger: CostLedger = LEDGER, interval: float = COST_COLLECT_INTERVAL):
+        self.client = client
+        self.ledger = ledger
+        self.interval = interval
+        self.collections = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def collect(self) -> int:
+        """Look up every pending statement now; returns how many were attributed"""
+        ids = self.ledger.pending_ids()
+        attributed = 0
+        for start in range(0, len(ids), HISTORY_BATCH):
+            rows = await self.client.query_history(ids[start:start + HISTORY_BATCH])
+            attributed += len(self.ledger.apply(rows))
+        self.ledger.expire()
+        self.collections += 1
+        return attributed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not len(self.ledger):
+                continue
+            try:
+                await self.collect()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)[:200]
+                print(f"Query History collection failed: {self.last_error}")
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+        self._task = None
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.ledger.report(),
+            "collect_interval_seconds": self.interval,
+            "collections": self.collections,
+            "last_error": self.last_error,
+        }
+
+
+class PipelineRun:
+    """
+    Tags the statements of one layer run and reports what each cost
+
+    Statements sent inside `statement(n)` are tagged route=pipeline/<layer>, query=<layer>#<n>
+    and the run id. `report` waits for them to show up in Query History and prints warehouse
+    seconds, bytes scanned and rows produced per statement.
+    """
+
+    def __init__(self, layer: str, ledger: CostLedger = LEDGER):
+        self.layer = layer
+        self.run_id = f"{layer}-{uuid.uuid4().hex[:12]}"
+        self.ledger = ledger
+
+    @contextmanager
+    def statement(self, number: int) -> Iterator[None]:
+        token = STATEMENT_TAG.set(StatementTag(f"pipeline/{self.layer}", f"{self.layer}#{number}", self.run_id))
+        try:
+            yield
+        finally:
+            STATEMENT_TAG.reset(token)
+
+    def collect(self, client, wait: float = 60.0, interval: float = 5.0) -> List[Tuple[StatementTag, Dict[str, float]]]:
+        """Costs of this run's statements from Query History, waiting up to `wait` seconds for them"""
+        attributed: List[Tuple[StatementTag, Dict[str, float]]] = []
+        deadline = time.monotonic() + wait
+        while True:
+            ids = self.ledger.pending_ids(self.run_id)
+            for start in range(0, len(ids), HISTORY_BATCH):
+                attributed += self.ledger.apply(client.query_history(ids[start:start + HISTORY_BATCH]))
+            if not self.ledger.pending_ids(self.run_id) or time.monotonic() >= deadline:
+                return sorted(attributed, key=lambda item: int(item[0].query.rsplit("#", 1)[-1]))
+            time.sleep(interval)
+
+    def report(self, client, wait: float = 60.0):
+        """Print the cost of each statement of the run; best effort, the run itself has already finished"""
+        try:
+            attributed = self.collect(client, wait)
+        except Exception as e:
+            print(f"Could not read Query History for run {self.run_id}: {str(e)[:200]}")
+            return
+        print(f"Warehouse cost of run {self.run_id} (from Query History):")
+        totals = {"warehouse_seconds": 0.0, "bytes_scanned": 0, "rows_produced": 0}
+        for tag, costs in attributed:
+            print(f"  {tag.query:<14} {costs['warehouse_seconds']:>9.1f}s {costs['bytes_scanned'] / 1e6:>11.1f} MB scanned "
+                  f"{costs['rows_produced']:>12,} rows")
+            for name in totals:
+                totals[name] += costs[name]
+        print(f"  {'total':<14} {totals['warehouse_seconds']:>9.1f}s {totals['bytes_scanned'] / 1e6:>11.1f} MB scanned "
+              f"{totals['rows_produced']:>12,} rows")
+        missing = len(self.ledger.pending_ids(self.run_id))
+        if missing:
+            print(f"  ({missing} statement(s) not in Query History yet)")
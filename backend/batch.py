@@ -0,0 +1,95 @@
+"""
+Batch endpoint shared by the R_Health backends
+Runs several GET endpoint calls concurrently inside the app and returns one combined payload,
+so a page load costs one HTTP round trip and as long as its slowest query
+"""
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List
+import asyncio
+import os
+import time
+
+import httpx
+
+# Most calls accepted in one batch request
+BATCH_MAX_CALLS = int(os.getenv("BATCH_MAX_CALLS", "20"))
+
+# Formats that come back as JSON and can be embedded in the batch response
+BATCH_FORMATS = ("json", "columnar")
+_EXCLUDED_PREFIXES = ("/api/batch", "/api/admin")
+
+
+class BatchCall(BaseModel):
+    id: str = Field(..., description="Name of this call in the response")
+    path: str = Field(..., description="GET endpoint, e.g. /api/denials-management")
+    params: Dict[str, Any] = Field(default_factory=dict, description="Query parameters")
+
+
+class BatchRequest(BaseModel):
+    calls: List[BatchCall]
+
+
+router = APIRouter(prefix="/api", tags=["batch"])
+
+
+def _reject(call: BatchCall) -> str:
+    """Reason a call can't be batched, or an empty string"""
+    if not call.path.startswith("/api/") or call.path.startswith(_EXCLUDED_PREFIXES):
+        return f"Endpoint not available in a batch: {call.path}"
+    if call.params.get("format", "json") not in BATCH_FORMATS:
+        return f"format must be one of {', '.join(BATCH_FORMATS)} in a batch"
+    return ""
+
+
+async def _dispatch(client: httpx.AsyncClient, call: BatchCall) -> Dict[str, Any]:
+    started = time.perf_counter()
+    reason = _reject(call)
+    if reason:
+        return {"status": 400, "elapsed_ms": 0.0, "error": reason}
+
+    try:
+        response = await client.get(call.path, params=call.params)
+        outcome: Dict[str, Any] = {"status": response.status_code}
+        body = response.json()
+        if response.is_success:
+            outcome["data"] = body
+            if "x-next-cursor" in response.headers:
+                outcome["next_cursor"] = response.headers["x-next-cursor"]
+            if "x-result-staleness" in response.headers:
+                outcome["staleness_seconds"] = int(response.headers["x-result-staleness"])
+        else:
+            outcome["error"] = body.get("detail", body) if isinstance(body, dict) else body
+            if "retry-after" in response.headers:
+                outcome["retry_after"] = int(response.headers["retry-after"])
+    except Exception as e:
+        print(f"Batch call {call.id} failed: {str(e)[:200]}")
+        outcome = {"status": 500, "error": f"Batch call failed: {str(e)}"}
+
+    outcome["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return outcome
+
+
+@router.post("/batch")
+async def run_batch(batch: BatchRequest, request: Request):
+    """
+    Run endpoint calls concurrently and return {"results": {id: {status, elapsed_ms, data | error}}}
+
+    Calls go through the app itself (routing, validation, result cache and single-flight), so a
+    batched call behaves exactly like the same GET issued on its own.
+    """
+    if len(batch.calls) > BATCH_MAX_CALLS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_CALLS} calls per batch")
+    ids = [call.id for call in batch.calls]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Batch call ids must be unique")
+
+    started = time.perf_counter()
+    transport = httpx.ASGITransport(app=request.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://batch") as client:
+        outcomes = await asyncio.gather(*(_dispatch(client, call) for call in batch.calls))
+
+    return {
+        "results": dict(zip(ids, outcomes)),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1 @@
+# R_Health Backend Benchmarks (run from the repo root, e.g. `python -m backend.benchmarks.bench_pool`)
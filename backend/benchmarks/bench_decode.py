@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark: decode cost of JSON_ARRAY results per 100k rows
+Compares the old dict(zip(columns, row)) of raw strings and a per-cell typed conversion against the
+schema-driven Arrow decode (one cast per column) used by ResultSet. With --fixtures, the schema
+and rows of a recorded query (record_fixtures.py) are repeated up to --rows instead.
+
+    python -m backend.benchmarks.bench_decode --rows 100000
+    python -m backend.benchmarks.bench_decode --fixtures gold.json --query denials_management
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import json
+import time
+
+from backend.benchmarks.gold_fixtures import load_fixtures
+from backend.decode import decode_json_array, json_ready
+
+SCHEMA = [
+    {"name": "claim_id", "type_name": "STRING"},
+    {"name": "days_to_deadline", "type_name": "INT"},
+    {"name": "billed_amount", "type_name": "DECIMAL"},
+    {"name": "urgency_score", "type_name": "DOUBLE"},
+    {"name": "is_at_risk", "type_name": "BOOLEAN"},
+    {"name": "filing_deadline", "type_name": "DATE"},
+    {"name": "gold_load_timestamp", "type_name": "TIMESTAMP"},
+]
+
+PER_CELL = {
+    "BYTE": int,
+    "SHORT": int,
+    "INT": int,
+    "LONG": int,
+    "FLOAT": float,
+    "DECIMAL": lambda v: float(Decimal(v)),
+    "DOUBLE": float,
+    "BOOLEAN": lambda v: v == "true",
+    "DATE": lambda v: date.fromisoformat(v).isoformat(),
+    "TIMESTAMP": lambda v: datetime.fromisoformat(v.replace("Z", "+00:00")).isoformat(),
+    "TIMESTAMP_NTZ": lambda v: datetime.fromisoformat(v).isoformat(),
+    "STRING": str,
+}
+
+
+def wire_rows(count: int) -> List[List[str]]:
+    """Rows as the Statement Execution API sends them: every value a string"""
+    return [
+        [f"CLM{i:08d}", str(i % 180), f"{1000 + i * 1.37:.2f}", f"{(i * 7) % 100:.1f}",
+         "true" if i % 3 == 0 else "false", f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}",
+         "2026-10-01T08:30:00.000Z"]
+        for i in range(count)
+    ]
+
+
+def recorded_rows(path: str, query: str, count: int) -> Tuple[List[Dict[str, Any]], List[List[str]]]:
+    """Schema and rows of a recorded query, its rows repeated up to `count`"""
+    fixture = load_fixtures(path)[query]
+    rows = fixture["data_array"]
+    if not rows:
+        raise SystemExit(f"{query}: no rows recorded")
+    return fixture["columns"], [rows[i % len(rows)] for i in range(count)]
+
+
+def before_strings(schema: List[Dict[str, Any]], rows: List[List[str]]) -> List[Dict[str, Any]]:
+    columns = [col["name"] for col in schema]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def before_per_cell(schema: List[Dict[str, Any]], rows: List[List[str]]) -> List[Dict[str, Any]]:
+    columns = [col["name"] for col in schema]
+    converters = [PER_CELL.get(col["type_name"], str) for col in schema]
+    return [
+        {name: (None if value is None else convert(value)) for name, convert, value in zip(columns, converters, row)}
+        for row in rows
+    ]
+
+
+def after_decode(schema: List[Dict[str, Any]], rows: List[List[str]]):
+    return decode_json_array(schema, rows)
+
+
+def after_records(schema: List[Dict[str, Any]], rows: List[List[str]]) -> List[Dict[str, Any]]:
+    return json_ready(decode_json_array(schema, rows)).to_pylist()
+
+
+def best_of(fn: Callable, schema: List[Dict[str, Any]], rows: List[List[str]], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(schema, rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fixtures", help="Fixture file (record_fixtures.py) to take the schema and rows from")
+    parser.add_argument("--query", default="timely_filing_appeals", help="Template name in --fixtures")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        schema, rows = recorded_rows(args.fixtures, args.query, args.rows)
+    else:
+        schema, rows = SCHEMA, wire_rows(args.rows)
+    scale = 100000 / args.rows
+    variants = {
+        "before_dict_of_strings": before_strings,
+        "before_per_cell_typed": before_per_cell,
+        "after_arrow_decode": after_decode,
+        "after_arrow_decode_to_records": after_records,
+    }
+    results = {name: round(best_of(fn, schema, rows, args.repeat) * 1000 * scale, 1) for name, fn in variants.items()}
+    source = f"{args.fixtures}:{args.query}" if args.fixtures else "synthetic"
+    print(json.dumps({"rows": args.rows, "source": source, "ms_per_100k_rows": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
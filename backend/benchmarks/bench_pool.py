@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pooled WarehouseClient vs. the previous bare requests.post per call
+Runs against the local fake statements server, so no warehouse or token is needed
+
+    python -m backend.benchmarks.bench_pool --requests 500 --concurrency 8
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+import argparse
+import json
+import statistics
+import time
+
+import requests
+
+from backend.benchmarks.fake_warehouse import FakeWarehouse
+from backend.warehouse import STATEMENTS_PATH, WarehouseClient, to_records
+
+QUERY = "SELECT * FROM hls_amer_catalog.r_health_gold.capacity_management LIMIT 100"
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def per_call(url: str) -> Callable[[], None]:
+    """The original app_main.execute_query behaviour: a fresh connection every call"""
+    def run():
+        response = requests.post(
+            f"{url}{STATEMENTS_PATH}",
+            headers={"Authorization": "Bearer fake", "Content-Type": "application/json"},
+            json={"warehouse_id": "fake", "statement": QUERY, "wait_timeout": "50s"},
+        )
+        response.raise_for_status()
+        to_records(response.json())
+    return run
+
+
+def pooled(url: str, pool_maxsize: int) -> Callable[[], None]:
+    client = WarehouseClient(host=url, warehouse_id="fake", token="fake", pool_maxsize=pool_maxsize)
+
+    def run():
+        to_records(client.execute_statement(QUERY))
+    return run
+
+
+def measure(fake: FakeWarehouse, call: Callable[[], None], total: int, concurrency: int) -> Dict[str, float]:
+    connections_before = fake.connection_count
+
+    def timed(_):
+        start = time.perf_counter()
+        call()
+        return (time.perf_counter() - start) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(total)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "connections_opened": fake.connection_count - connections_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.005, help="Fake warehouse latency in seconds")
+    parser.add_argument("--handshake", type=float, default=0.02,
+                        help="Extra delay per new connection, approximating a TLS handshake over the WAN")
+    parser.add_argument("--rows", type=int, default=100)
+    args = parser.parse_args()
+
+    with FakeWarehouse(latency=args.latency, handshake_delay=args.handshake, rows=args.rows) as fake:
+        results = {
+            "per_call_requests_post": measure(fake, per_call(fake.url), args.requests, args.concurrency),
+            "pooled_client": measure(fake, pooled(fake.url, args.concurrency), args.requests, args.concurrency),
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent React page sessions against the API and a local stand-in warehouse
+Serves backend/app_main.py against the fake warehouse answering every query template with
+gold-table fixtures (synthetic, or a saved set: --fixtures), then runs `--sessions`
+simulated users at once. Each user opens `--pages` scenario pages with `--think` seconds between
+them, and each page load makes the calls the React page makes: one /api/batch request, or the
+individual GETs with --direct. Throughput and p50/p95/p99 per endpoint and per page are written
+as JSON; with --baseline the run fails when a p95 regressed by more than --tolerance.
+
+    python -m backend.benchmarks.bench_sessions --sessions 50 --pages 8 --latency 0.3 --output run.json
+    python -m backend.benchmarks.bench_sessions --no-cache --fail-rate 0.02 --baseline run.json
+"""
+from typing import Any, Dict, List, Tuple
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+
+from backend.benchmarks.bench_pool import percentile
+from backend.benchmarks.fake_warehouse import FakeWarehouse
+from backend.benchmarks.gold_fixtures import load_fixtures, synthetic_fixtures
+from backend.benchmarks.load_test import free_port, start_backend
+
+# The calls each page of frontend/src/pages makes on load
+PAGES: Dict[str, Dict[str, Tuple[str, Dict[str, Any]]]] = {
+    "capacity": {
+        "summary": ("/api/capacity-management/summary", {}),
+        "rows": ("/api/capacity-management", {"limit": 100}),
+    },
+    "denials": {
+        "summary": ("/api/denials-management/summary", {}),
+        "rows": ("/api/denials-management", {"limit": 100}),
+        "payers": ("/api/payers", {}),
+    },
+    "clinical_trials": {
+        "summary": ("/api/clinical-trial-matching/summary", {}),
+        "rows": ("/api/clinical-trial-matching", {"limit": 100}),
+    },
+    "timely_filing": {
+        "summary": ("/api/timely-filing-appeals/summary", {}),
+        "rows": ("/api/timely-filing-appeals", {"limit": 100}),
+    },
+    "documentation": {
+        "summary": ("/api/documentation-management/summary", {}),
+        "rows": ("/api/documentation-management", {"limit": 100}),
+        "payers": ("/api/payers", {}),
+    },
+}
+
+
+class Recorder:
+    """Latencies (seconds) and error counts per endpoint and per page"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float, ok: bool):
+        self.latencies.setdefault(name, []).append(seconds)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, wall: float) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for name, samples in sorted(self.latencies.items()):
+            report[name] = {
+                "count": len(samples),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(samples) / wall, 2),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 1),
+                "p50_ms": round(percentile(samples, 50) * 1000, 1),
+                "p95_ms": round(percentile(samples, 95) * 1000, 1),
+                "p99_ms": round(percentile(samples, 99) * 1000, 1),
+            }
+        return report
+
+
+async def load_page(client: httpx.AsyncClient, page: str, direct: bool, endpoints: Recorder) -> bool:
+    calls = PAGES[page]
+    if direct:
+        async def get(path: str, params: Dict[str, Any]) -> bool:
+            started = time.perf_counter()
+            try:
+                ok = (await client.get(path, params=params)).status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            endpoints.add(path, time.perf_counter() - started, ok)
+            return ok
+
+        return all(await asyncio.gather(*(get(path, params) for path, params in calls.values())))
+
+    # Per-endpoint times come from the batch response: elapsed_ms of each call inside the app
+    body = {"calls": [{"id": name, "path": path, "params": params} for name, (path, params) in calls.items()]}
+    try:
+        response = await client.post("/api/batch", json=body)
+    except httpx.HTTPError:
+        for path, _ in calls.values():
+            endpoints.add(path, 0.0, False)
+        return False
+    if response.status_code != 200:
+        for path, _ in calls.values():
+            endpoints.add(path, 0.0, False)
+        return False
+    results = response.json()["results"]
+    for name, (path, _) in calls.items():
+        result = results.get(name, {})
+        endpoints.add(path, result.get("elapsed_ms", 0.0) / 1000, result.get("status") == 200)
+    return all(result.get("status") == 200 for result in results.values())
+
+
+async def session(client: httpx.AsyncClient, rng: random.Random, args, endpoints: Recorder, pages: Recorder):
+    await asyncio.sleep(rng.uniform(0, args.ramp))
+    for visit in range(args.pages):
+        if visit:
+            await asyncio.sleep(rng.expovariate(1 / args.think) if args.think > 0 else 0)
+        page = rng.choice(list(PAGES))
+        started = time.perf_counter()
+        ok = await load_page(client, page, args.direct, endpoints)
+        pages.add(page, time.perf_counter() - started, ok)
+
+
+async def run(base_url: str, args) -> Dict[str, Any]:
+    endpoints, pages = Recorder(), Recorder()
+    rng = random.Random(args.seed)
+    # A browser keeps up to 6 connections per host
+    limits = httpx.Limits(max_connections=args.sessions * 6, max_keepalive_connections=args.sessions * 6)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            session(client, random.Random(rng.random()), args, endpoints, pages) for _ in range(args.sessions)
+        ))
+        wall = time.perf_counter() - started
+
+    requests = sum(len(samples) for samples in (endpoints if args.direct else pages).latencies.values())
+    return {
+        "wall_s": round(wall, 3),
+        "http_requests": requests,
+        "throughput_rps": round(requests / wall, 1),
+        "page_loads_per_s": round(sum(len(s) for s in pages.latencies.values()) / wall, 1),
+        "endpoints": endpoints.report(wall),
+        "pages": pages.report(wall),
+    }
+
+
+def regressions(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Endpoints and pages whose p95 grew by more than `tolerance` (0.2 = 20%) over the baseline"""
+    found = []
+    for group in ("endpoints", "pages"):
+        for name, stats in result.get(group, {}).items():
+            before = baseline.get(group, {}).get(name)
+            if before and before["p95_ms"] > 0 and stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                found.append(f"{name}: p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent simulated users")
+    parser.add_argument("--pages", type=int, default=8, help="Page loads per session")
+    parser.add_argument("--think", type=float, default=1.0, help="Mean seconds between page loads (exponential)")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Sessions start spread over this many seconds")
+    parser.add_argument("--latency", type=float, default=0.3, help="Warehouse time per statement in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Extra warehouse time per statement, up to this")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of statement API calls answered 503")
+    parser.add_argument("--list-rows", type=int, default=500, help="Rows per list query in the synthetic fixtures")
+    parser.add_argument("--fixtures", help="Fixture file (gold_fixtures.save_fixtures format) instead of synthetic results")
+    parser.add_argument("--direct", action="store_true", help="Individual GETs per page instead of /api/batch")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the result cache so every call reaches the warehouse")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON result here as well as to stdout")
+    parser.add_argument("--baseline", help="Earlier --output to compare p95s against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    # The app reads its settings at import, which start_backend does
+    os.environ.setdefault("GOLD_VERSION_CHECK_INTERVAL", "0")
+    os.environ.setdefault("COST_COLLECT_INTERVAL", "0")
+    if args.no_cache:
+        os.environ["RESULT_CACHE_TTL"] = "0"
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else synthetic_fixtures(args.list_rows)
+    with FakeWarehouse(latency=args.latency, latency_jitter=args.jitter, failure_rate=args.fail_rate,
+                       fixtures=fixtures, seed=args.seed) as fake:
+        port = free_port()
+        server = start_backend(fake.url, port)
+        try:
+            result = asyncio.run(run(f"http://127.0.0.1:{port}", args))
+        finally:
+            server.should_exit = True
+        statements, failures = fake.request_count, fake.failed_count
+
+    report: Dict[str, Any] = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "warehouse_statements": statements,
+        "injected_failures": failures,
+        **result,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        if found:
+            print("p95 regressions:\n  " + "\n  ".join(found), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: backend cold start, from process launch to the first answered page
+Launches main.py and app_main.py in fresh interpreters against the fake warehouse, the way a
+Databricks Apps cold start or scale-out does, and reports per backend: module import time,
+time until uvicorn accepts connections, and the latency of the first /api/health call and of the
+first and second data calls (the second is a cache hit). Medians over --runs launches.
+
+    python -m backend.benchmarks.bench_startup --runs 5 --latency 0.5
+    python -m backend.benchmarks.bench_startup --no-prewarm    # first data call goes to the warehouse
+"""
+from typing import Any, Dict, List
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from backend.benchmarks.fake_warehouse import FakeWarehouse
+from backend.benchmarks.gold_fixtures import synthetic_fixtures
+from backend.benchmarks.load_test import free_port
+
+BACKENDS = ("backend.main", "backend.app_main")
+DATA_ENDPOINT = "/api/capacity-management/summary"
+
+
+def serve(module: str, port: int):
+    """Child process: import the backend, report how long that took, then serve it"""
+    started = time.perf_counter()
+    app = importlib.import_module(module).app
+    print(json.dumps({"import_ms": round((time.perf_counter() - started) * 1000, 1)}), flush=True)
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 1)  # nobody reads the backend's own output
+
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def wait_until_listening(client: httpx.Client, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"backend exited with {process.returncode}")
+        try:
+            client.get("/")
+            return
+        except httpx.TransportError:
+            time.sleep(0.005)
+    raise RuntimeError("backend did not start listening")
+
+
+def timed_get(client: httpx.Client, path: str) -> float:
+    started = time.perf_counter()
+    client.get(path).raise_for_status()
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def launch(module: str, env: Dict[str, str], settle: float) -> Dict[str, Any]:
+    port = free_port()
+    launched = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "backend.benchmarks.bench_startup", "--serve", module, "--port", str(port)],
+        env=env, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            imported = json.loads(process.stdout.readline())
+            wait_until_listening(client, process)
+            run = {"import_ms": imported["import_ms"], "listening_ms": round((time.perf_counter() - launched) * 1000, 1)}
+            time.sleep(settle)  # real traffic arrives some time after the port opens
+            run["first_health_ms"] = timed_get(client, "/api/health")
+            run["first_query_ms"] = timed_get(client, DATA_ENDPOINT)
+            run["second_query_ms"] = timed_get(client, DATA_ENDPOINT)
+            health = client.get("/api/health").json()
+            run["prewarm"] = health.get("prewarm")
+            if "workspace" in health:
+                run["workspace_resolve_ms"] = health["workspace"].get("resolve_ms")
+            return run
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {}
+    for key, value in runs[0].items():
+        values = [run[key] for run in runs if run.get(key) is not None]
+        if isinstance(value, (int, float)) and values:
+            summary[f"median_{key}"] = round(statistics.median(values), 1)
+        else:
+            summary[key] = value
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Launches per backend")
+    parser.add_argument("--latency", type=float, default=0.3, help="Warehouse time per statement in seconds")
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds between the port opening and the first call")
+    parser.add_argument("--no-prewarm", action="store_true", help="Start with STARTUP_PREWARM disabled")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma separated backend modules")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    results = {}
+    with FakeWarehouse(latency=args.latency, fixtures=synthetic_fixtures()) as fake:
+        env = dict(os.environ, DATABRICKS_HOST=fake.url, DATABRICKS_TOKEN="fake-token")
+        if args.no_prewarm:
+            env["STARTUP_PREWARM"] = ""
+        for module in args.backends.split(","):
+            results[module] = summarize([launch(module, env, args.settle) for _ in range(args.runs)])
+    print(json.dumps({"runs": args.runs, "warehouse_latency_s": args.latency, "backends": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
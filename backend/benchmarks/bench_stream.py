@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark: buffered JSON vs streamed NDJSON/CSV for a large list query
+Serves backend/app_main.py against the fake warehouse and reports time to first byte, total time
+and the growth of the process peak RSS for each format. Streaming formats run first because
+peak RSS only ever grows.
+
+    python -m backend.benchmarks.bench_stream --rows 200000
+"""
+import argparse
+import json
+import os
+import resource
+import time
+
+import httpx
+
+from backend.benchmarks.fake_warehouse import FakeWarehouse
+from backend.benchmarks.load_test import free_port, start_backend
+
+ENDPOINT = "/api/timely-filing-appeals"
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(base_url: str, rows: int, response_format: str) -> dict:
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    first_byte = None
+    size = 0
+    params = {"limit": rows, "format": response_format}
+    with httpx.stream("GET", base_url + ENDPOINT, params=params, timeout=600) as response:
+        response.raise_for_status()
+        for piece in response.iter_raw():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            size += len(piece)
+    return {
+        "format": response_format,
+        "ttfb_ms": round(first_byte * 1000, 1),
+        "total_ms": round((time.perf_counter() - start) * 1000, 1),
+        "bytes": size,
+        "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunk-rows", type=int, default=20000, help="Rows per warehouse result chunk")
+    args = parser.parse_args()
+
+    # Let the buffered path accept the same limit so the comparison is like for like
+    os.environ["MAX_LIMIT"] = str(args.rows)
+    os.environ["RESULT_CACHE_MAX_ENTRIES"] = "0"
+
+    with FakeWarehouse(rows=args.rows, chunk_rows=args.chunk_rows) as fake:
+        port = free_port()
+        server = start_backend(fake.url, port)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            results = [measure(base_url, args.rows, fmt) for fmt in ("ndjson", "csv", "json")]
+        finally:
+            server.should_exit = True
+
+    print(json.dumps({"rows": args.rows, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
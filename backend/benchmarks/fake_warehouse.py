@@ -0,0 +1,502 @@
+"""
+Local stand-in for the Databricks SQL Statement Execution API
+Serves canned results on /api/2.0/sql/statements for offline benchmarks, including the
+PENDING/RUNNING -> SUCCEEDED lifecycle, statement polling and cancellation, chunked INLINE
+results and ARROW_STREAM chunks behind EXTERNAL_LINKS. /api/2.0/sql/warehouses/{id} reports a
+warehouse state that can be stopped and takes `startup_delay` seconds to start again. Throttling
+(429/503), random failures, latency jitter and slow statements can be injected to exercise
+retries, the breaker and hedging. With `fixtures` (see gold_fixtures.py), each statement is answered
+with the result recorded for its query template, cut to its `limit` parameter; with `strict`, a
+statement without one fails instead of getting the default rows (replay_warehouse.py).
+/api/2.0/sql/history/queries answers Query History lookups by statement id with execution metrics.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+
+import pyarrow as pa
+
+HISTORY_COLUMNS = [
+    {"name": "version", "type_name": "LONG"},
+    {"name": "timestamp", "type_name": "TIMESTAMP"},
+    {"name": "operation", "type_name": "STRING"},
+]
+HISTORY_STATEMENT = re.compile(r"^\s*DESCRIBE\s+HISTORY\s+(?P<table>[\w.]+)", re.IGNORECASE)
+LEADING_COMMENT = re.compile(r"^\s*/\*.*?\*/\s*", re.DOTALL)
+QUERY_HISTORY_PATH = "/api/2.0/sql/history/queries"
+QUERY_TAG = re.compile(r"^\s*/\*[^*]*\bquery=(?P<query>[\w#-]+)")
+HISTORY_STATUS = {"SUCCEEDED": "FINISHED", "CANCELED": "CANCELED", "FAILED": "FAILED", "RUNNING": "RUNNING"}
+
+STATEMENT_PATH = re.compile(
+    r"^/api/2\.0/sql/statements/(?P<id>[^/]+)(?:(?P<cancel>/cancel)|/result/chunks/(?P<chunk>\d+))?/?$"
+)
+EXTERNAL_PATH = re.compile(r"^/external/(?P<id>[^/]+)/(?P<chunk>\d+)$")
+WAREHOUSE_PATH = re.compile(r"^/api/2\.0/sql/warehouses/(?P<id>[^/]+)(?P<start>/start)?/?$")
+INLINE_LIMIT_BYTES = 25 * 1024 * 1024
+
+ARROW_TYPES = {
+    "STRING": pa.string(),
+    "BYTE": pa.int8(),
+    "SHORT": pa.int16(),
+    "INT": pa.int32(),
+    "LONG": pa.int64(),
+    "FLOAT": pa.float32(),
+    "DOUBLE": pa.float64(),
+    "BOOLEAN": pa.bool_(),
+    "DATE": pa.date32(),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+    "TIMESTAMP_NTZ": pa.timestamp("us"),
+}
+
+DEFAULT_COLUMNS = [
+    {"name": "drg_code", "type_name": "STRING"},
+    {"name": "total_encounters", "type_name": "LONG"},
+    {"name": "avg_los", "type_name": "DOUBLE"},
+    {"name": "estimated_cost_opportunity", "type_name": "DECIMAL"},
+    {"name": "optimization_priority", "type_name": "STRING"},
+]
+
+
+def sample_rows(count: int) -> List[List[str]]:
+    """Rows in the JSON_ARRAY wire format (every value is a string)"""
+    return [
+        [str(470 + i % 300), str(100 + i), f"{3 + (i % 7) * 0.5:.2f}", f"{1500.0 * (i % 97):.2f}", "High - Extended LOS"]
+        for i in range(count)
+    ]
+
+
+def arrow_field_type(column: Dict[str, Any]) -> pa.DataType:
+    if column["type_name"] == "DECIMAL":
+        return pa.decimal128(int(column.get("type_precision", 18)), int(column.get("type_scale", 2)))
+    return ARROW_TYPES.get(column["type_name"], pa.string())
+
+
+def arrow_chunk(columns: List[Dict[str, Any]], rows: List[List[str]]) -> bytes:
+    """Serialize rows as an Arrow IPC stream, the way ARROW_STREAM chunks are delivered"""
+    arrays = [pa.array([row[i] for row in rows], pa.string()).cast(arrow_field_type(col)) for i, col in enumerate(columns)]
+    table = pa.Table.from_arrays(arrays, names=[col["name"] for col in columns])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _normalized(statement: str) -> str:
+    return " ".join(LEADING_COMMENT.sub("", statement).split())
+
+
+def parse_wait_timeout(value: str) -> float:
+    return float(value.rstrip("s") or 0)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # load tests open hundreds of connections at once
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response (cancelled requests) are expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeWarehouse:
+    """
+    Threaded HTTP/1.1 server speaking just enough of the statements API
+
+    Every statement takes `latency` seconds (plus up to `latency_jitter`) of warehouse time, or with
+    `recorded_latency` the time recorded with its fixture. The submit call blocks for at most its
+    wait_timeout and otherwise answers RUNNING, like the real endpoint. Results are split into
+    chunks of `chunk_rows` (a fixture's own chunk_rows when it has one); INLINE results above
+    `inline_limit_bytes` fail the way the real 25 MiB inline limit does.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        handshake_delay: float = 0.0,
+        rows: int = 10,
+        chunk_rows: int = 10000,
+        inline_limit_bytes: int = INLINE_LIMIT_BYTES,
+        columns: Optional[List[Dict[str, Any]]] = None,
+        startup_delay: float = 0.0,
+        fixtures: Optional[Dict[str, Dict[str, Any]]] = None,
+        latency_jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+        strict: bool = False,
+        recorded_latency: bool = False,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate  # share of statement API calls answered 503
+        self.fixtures = fixtures or {}
+        self.strict = strict  # fail statements that have no fixture
+        self.recorded_latency = recorded_latency  # take each fixture's recorded warehouse_ms as its latency
+        # Fixtures by statement text too, for statements sent without the tag comment (STATEMENT_TAGS=false)
+        self._fixture_statements = {
+            _normalized(fixture["statement"]): name for name, fixture in self.fixtures.items() if fixture.get("statement")
+        }
+        self._random = random.Random(seed)
+        self.handshake_delay = handshake_delay  # stands in for the TCP+TLS setup cost per new connection
+        self.columns = columns or DEFAULT_COLUMNS
+        self.data_array = sample_rows(rows)
+        self.chunk_rows = chunk_rows
+        self.inline_limit_bytes = inline_limit_bytes
+        self.request_count = 0
+        self.connection_count = 0
+        self.poll_count = 0
+        self.canceled_count = 0
+        self.chunk_downloads = 0
+        self.authorized_downloads = 0  # external links must be fetched without workspace credentials
+        self.statements: Dict[str, Dict[str, Any]] = {}
+        self.warehouse_statements: Dict[str, int] = {}  # statements submitted per warehouse_id
+        self.table_versions: Dict[str, int] = {}  # DESCRIBE HISTORY answers, keyed by short table name
+        self.startup_delay = startup_delay
+        self.running_at: Optional[float] = 0.0  # None while STOPPED, else when the warehouse is (was) up
+        self.start_count = 0
+        self.failures: List[Any] = []  # (status, retry_after) answered to the next statement API calls
+        self.failed_count = 0
+        self.slow: List[float] = []  # extra latency of the next submitted statements
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _wake(self) -> float:
+        """Start a stopped warehouse (caller holds the lock); returns when it is up"""
+        if self.running_at is None:
+            self.start_count += 1
+            self.running_at = time.monotonic() + self.startup_delay
+        return max(self.running_at, time.monotonic())
+
+    def warehouse_state(self) -> str:
+        with self._lock:
+            if self.running_at is None:
+                return "STOPPED"
+            return "RUNNING" if time.monotonic() >= self.running_at else "STARTING"
+
+    def stop_warehouse(self):
+        """Simulate auto-stop: the next statement or start call waits `startup_delay`"""
+        with self._lock:
+            self.running_at = None
+
+    def start_warehouse(self):
+        with self._lock:
+            self._wake()
+
+    def fail_next(self, count: int = 1, status: int = 503, retry_after: Optional[float] = None):
+        """Answer the next `count` statement API calls with `status` (429 throttling, 503 overload)"""
+        with self._lock:
+            self.failures.extend([(status, retry_after)] * count)
+
+    def slow_next(self, count: int = 1, extra: float = 1.0):
+        """Make the next `count` statements take `extra` seconds longer (a straggler for hedging)"""
+        with self._lock:
+            self.slow.extend([extra] * count)
+
+    def _take_failure(self):
+        with self._lock:
+            if not self.failures:
+                if self.failure_rate and self._random.random() < self.failure_rate:
+                    self.failed_count += 1
+                    return 503, None
+                return None
+            self.failed_count += 1
+            return self.failures.pop(0)
+
+    def submit(
+        self,
+        statement: str,
+        disposition: str = "INLINE",
+        format: str = "JSON_ARRAY",
+        warehouse_id: str = "",
+        parameters: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
+        statement_id = str(uuid.uuid4())
+        limit = next((int(p["value"]) for p in parameters or [] if p.get("name") == "limit" and p.get("value")), None)
+        latency = self.latency
+        if self.recorded_latency:
+            latency = (self.fixture_for(statement) or {}).get("warehouse_ms", latency * 1000) / 1000
+        with self._lock:
+            self.request_count += 1
+            self.warehouse_statements[warehouse_id] = self.warehouse_statements.get(warehouse_id, 0) + 1
+            self.statements[statement_id] = {
+                "statement": statement,
+                "disposition": disposition,
+                "format": format,
+                "submitted_at": time.monotonic(),
+                "done_at": self._wake() + latency + self._random.uniform(0, self.latency_jitter)
+                + (self.slow.pop(0) if self.slow else 0.0),
+                "limit": limit,
+                "state": None,
+            }
+        return statement_id
+
+    def cancel(self, statement_id: str) -> bool:
+        with self._lock:
+            entry = self.statements.get(statement_id)
+            if entry is None:
+                return False
+            if self._state(entry) in ("PENDING", "RUNNING"):
+                entry["state"] = "CANCELED"
+                self.canceled_count += 1
+            return True
+
+    def bump_version(self, table: str):
+        """Simulate a gold rebuild of `table`"""
+        with self._lock:
+            self.table_versions[table] = self.table_versions.get(table, 0) + 1
+
+    def fixture_for(self, statement: str) -> Optional[Dict[str, Any]]:
+        tag = QUERY_TAG.match(statement)
+        name = tag.group("query") if tag else self._fixture_statements.get(_normalized(statement))
+        return self.fixtures.get(name) if name else None
+
+    def unanswered(self, statement: str) -> bool:
+        """True when `strict` and the statement has no fixture (DESCRIBE HISTORY is always answered)"""
+        return self.strict and not HISTORY_STATEMENT.match(LEADING_COMMENT.sub("", statement)) \
+            and self.fixture_for(statement) is None
+
+    def result_for(self, statement: str, limit: Optional[int] = None):
+        """(columns, data_array) the warehouse would return for a statement"""
+        history = HISTORY_STATEMENT.match(LEADING_COMMENT.sub("", statement))
+        if history:
+            table = history.group("table").split(".")[-1]
+            return HISTORY_COLUMNS, [[str(self.table_versions.get(table, 0)), "2026-01-01T00:00:00.000Z",
+                                      "CREATE OR REPLACE TABLE AS SELECT"]]
+        fixture = self.fixture_for(statement)
+        if fixture is not None:
+            return fixture["columns"], fixture["data_array"][:limit]
+        return self.columns, self.data_array[:limit]
+
+    def _state(self, entry: Dict[str, Any]) -> str:
+        if entry["state"]:
+            return entry["state"]
+        return "SUCCEEDED" if time.monotonic() >= entry["done_at"] else "RUNNING"
+
+    def _chunks(self, entry: Dict[str, Any]):
+        columns, data_array = self.result_for(entry["statement"], entry["limit"])
+        # A recorded result keeps the chunk size the warehouse used
+        size = (self.fixture_for(entry["statement"]) or {}).get("chunk_rows") or self.chunk_rows
+        chunks = [data_array[i:i + size] for i in range(0, len(data_array), size)]
+        return columns, chunks
+
+    def chunk_payload(self, statement_id: str, index: int) -> Dict[str, Any]:
+        entry = self.statements[statement_id]
+        _, chunks = self._chunks(entry)
+        chunk = {
+            "chunk_index": index,
+            "row_offset": sum(len(c) for c in chunks[:index]),
+            "row_count": len(chunks[index]),
+        }
+        if index + 1 < len(chunks):
+            chunk["next_chunk_index"] = index + 1
+            chunk["next_chunk_internal_link"] = f"/api/2.0/sql/statements/{statement_id}/result/chunks/{index + 1}"
+        if entry["disposition"] == "EXTERNAL_LINKS":
+            link = dict(chunk, external_link=f"{self.url}/external/{statement_id}/{index}",
+                        expiration="2099-01-01T00:00:00Z")
+            return {"external_links": [link]}
+        chunk["data_array"] = chunks[index]
+        return chunk
+
+    def statement_response(self, statement_id: str) -> Dict[str, Any]:
+        entry = self.statements[statement_id]
+        state = self._state(entry)
+        response = {"statement_id": statement_id, "status": {"state": state}}
+        if state != "SUCCEEDED":
+            return response
+        if self.unanswered(entry["statement"]):
+            response["status"] = {"state": "FAILED", "error": {
+                "error_code": "NOT_FOUND", "message": "No recorded result for this statement",
+            }}
+            return response
+
+        columns, chunks = self._chunks(entry)
+        external = entry["disposition"] == "EXTERNAL_LINKS"
+        total_bytes = sum(len(arrow_chunk(columns, c)) if external else len(json.dumps(c)) for c in chunks)
+        if not external and total_bytes > self.inline_limit_bytes:
+            response["status"] = {"state": "FAILED", "error": {
+                "error_code": "BAD_REQUEST",
+                "message": "Result exceeds the inline limit of 25 MiB; use EXTERNAL_LINKS disposition",
+            }}
+            return response
+
+        response["manifest"] = {
+            "format": entry["format"],
+            "schema": {"column_count": len(columns), "columns": columns},
+            "total_row_count": sum(len(c) for c in chunks),
+            "total_byte_count": total_bytes,
+            "total_chunk_count": len(chunks),
+            "chunks": [{"chunk_index": i, "row_count": len(c)} for i, c in enumerate(chunks)],
+        }
+        if chunks:
+            response["result"] = self.chunk_payload(statement_id, 0)
+        return response
+
+    def query_history(self, statement_ids: List[str]) -> Dict[str, Any]:
+        """Query History entries of the given statements; total time is the statement's latency"""
+        rows = []
+        for statement_id in statement_ids:
+            entry = self.statements.get(statement_id)
+            if entry is None:
+                continue
+            state = self._state(entry)
+            _, data_array = self.result_for(entry["statement"], entry["limit"])
+            ended = entry["done_at"] if state == "SUCCEEDED" else time.monotonic()
+            rows.append({
+                "query_id": statement_id,
+                "query_text": entry["statement"],
+                "status": HISTORY_STATUS.get(state, "QUEUED"),
+                "duration": int((ended - entry["submitted_at"]) * 1000),
+                "metrics": {
+                    "total_time_ms": int((ended - entry["submitted_at"]) * 1000),
+                    "read_bytes": len(json.dumps(data_array)),
+                    "rows_produced_count": len(data_array) if state == "SUCCEEDED" else 0,
+                },
+            })
+        return {"res": rows, "has_next_page": False}
+
+    def external_chunk(self, statement_id: str, index: int) -> bytes:
+        columns, chunks = self._chunks(self.statements[statement_id])
+        return arrow_chunk(columns, chunks[index])
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+
+            def setup(self):
+                super().setup()
+                # Avoid Nagle/delayed-ACK stalls on reused connections, as production servers do
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with fake._lock:
+                    fake.connection_count += 1
+                if fake.handshake_delay:
+                    time.sleep(fake.handshake_delay)
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, payload: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                self._send(status, json.dumps(body).encode(), "application/json")
+
+            def _send_injected_failure(self) -> bool:
+                failure = fake._take_failure() if self.path.startswith("/api/2.0/sql/statements") else None
+                if failure is None:
+                    return False
+                status, retry_after = failure
+                payload = json.dumps({"error_code": "TEMPORARILY_UNAVAILABLE", "message": "Injected failure"}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.end_headers()
+                self.wfile.write(payload)
+                return True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self._send_injected_failure():
+                    return
+
+                warehouse = WAREHOUSE_PATH.match(self.path)
+                if warehouse and warehouse.group("start"):
+                    fake.start_warehouse()
+                    self._send_json(200, {})
+                    return
+
+                match = STATEMENT_PATH.match(self.path)
+                if match and match.group("cancel"):
+                    found = fake.cancel(match.group("id"))
+                    self._send_json(200 if found else 404, {})
+                    return
+
+                statement_id = fake.submit(
+                    body.get("statement", ""),
+                    disposition=body.get("disposition", "INLINE"),
+                    format=body.get("format", "JSON_ARRAY"),
+                    warehouse_id=body.get("warehouse_id", ""),
+                    parameters=body.get("parameters"),
+                )
+                entry = fake.statements[statement_id]
+                wait = parse_wait_timeout(body.get("wait_timeout", "10s"))
+                remaining = entry["done_at"] - time.monotonic()
+                if remaining > 0 and wait > 0:
+                    time.sleep(min(remaining, wait))
+                self._send_json(200, fake.statement_response(statement_id))
+
+            def do_GET(self):
+                if self._send_injected_failure():
+                    return
+                external = EXTERNAL_PATH.match(self.path)
+                if external:
+                    with fake._lock:
+                        fake.chunk_downloads += 1
+                        if "Authorization" in self.headers:
+                            fake.authorized_downloads += 1
+                    payload = fake.external_chunk(external.group("id"), int(external.group("chunk")))
+                    self._send(200, payload, "application/vnd.apache.arrow.stream")
+                    return
+
+                url = urlsplit(self.path)
+                if url.path == QUERY_HISTORY_PATH:
+                    ids = parse_qs(url.query).get("filter_by.statement_ids", [])
+                    self._send_json(200, fake.query_history(ids))
+                    return
+
+                warehouse = WAREHOUSE_PATH.match(self.path)
+                if warehouse:
+                    self._send_json(200, {"id": warehouse.group("id"), "state": fake.warehouse_state()})
+                    return
+
+                match = STATEMENT_PATH.match(self.path)
+                if not match or match.group("id") not in fake.statements:
+                    self._send_json(404, {"error_code": "NOT_FOUND"})
+                    return
+                if match.group("chunk") is not None:
+                    self._send_json(200, fake.chunk_payload(match.group("id"), int(match.group("chunk"))))
+                    return
+                with fake._lock:
+                    fake.poll_count += 1
+                self._send_json(200, fake.statement_response(match.group("id")))
+
+        return Handler
+
+    def start(self) -> "FakeWarehouse":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeWarehouse":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
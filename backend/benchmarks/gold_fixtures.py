@@ -0,0 +1,133 @@
+"""
+Gold-table results for the fake warehouse, per query template
+A fixture set maps a template name (the `query=` of the statement tag) to the columns and
+JSON_ARRAY rows the warehouse returns for it. `synthetic_fixtures` derives one from the template
+SQL (column names from the SELECT list, types and values from the names) so the benchmarks run
+offline with result shapes close to the real ones; `load_fixtures` reads a saved set, such as one
+recorded from the live warehouse by record_fixtures.py. Recorded fixtures also carry the statement
+text, the warehouse's chunk size (chunk_rows) and its execution time (warehouse_ms).
+"""
+from typing import Any, Dict, List, Optional
+import json
+import random
+import re
+
+FIXTURE_VERSION = 1
+
+_SELECT_LIST = re.compile(r"^\s*SELECT\s+(?:DISTINCT\s+)?(?P<columns>.*?)\s+FROM\b", re.IGNORECASE | re.DOTALL)
+_ALIAS = re.compile(r"\s+as\s+(\w+)\s*$", re.IGNORECASE)
+
+PAYERS = ["Aetna", "Anthem", "Cigna", "Humana", "Medicaid", "Medicare", "UnitedHealthcare", "Hometown Health"]
+PRIORITIES = ["Critical - Immediate Review", "High - Extended LOS", "Medium - Monitor", "Low - Within Benchmark"]
+
+# Template columns whose names the patterns below would mis-type
+_COLUMN_TYPES = {
+    "critical_urgency": "LONG",
+    "high_urgency": "LONG",
+    "excess_days": "DOUBLE",
+    "total_recovered": "DOUBLE",
+}
+# (name pattern, type) in order; the first match wins
+_TYPES = [
+    (r"^(is_|has_)|_eligible$|_mutation$", "BOOLEAN"),
+    (r"_status$|_category$|_priority$|_code$|_id$", "STRING"),
+    (r"^(avg|overall|median|p90)_|_(rate|pct|score|amount|value|opportunity|los|benchmark|compliance|variance)$|fev1$",
+     "DOUBLE"),
+    (r"^(total|days)_|_(count|claims|requests|patients|encounters|days|appealed|denials|appeals)$|^age$", "LONG"),
+    (r"_date$|_deadline$", "DATE"),
+]
+
+
+def column_type(name: str) -> str:
+    if name in _COLUMN_TYPES:
+        return _COLUMN_TYPES[name]
+    for pattern, type_name in _TYPES:
+        if re.search(pattern, name):
+            return type_name
+    return "STRING"
+
+
+def _split_columns(select_list: str) -> List[str]:
+    """SELECT list items, split on commas outside parentheses"""
+    items, depth, current = [], 0, []
+    for char in select_list:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            items.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    items.append("".join(current))
+    return [item.strip() for item in items if item.strip()]
+
+
+def template_columns(sql: str) -> List[Dict[str, str]]:
+    match = _SELECT_LIST.match(sql)
+    if not match:
+        return []
+    columns = []
+    for item in _split_columns(match.group("columns")):
+        alias = _ALIAS.search(item)
+        name = alias.group(1) if alias else item.split(".")[-1].split()[-1]
+        columns.append({"name": name, "type_name": column_type(name)})
+    return columns
+
+
+def _value(column: Dict[str, str], row: int, rng: random.Random) -> Optional[str]:
+    """One value in the JSON_ARRAY wire format (strings, or null)"""
+    name, type_name = column["name"], column["type_name"]
+    if type_name == "BOOLEAN":
+        return "true" if rng.random() < 0.3 else "false"
+    if type_name == "DATE":
+        return f"2026-{1 + row % 12:02d}-{1 + row % 28:02d}"
+    if type_name == "LONG":
+        return str(rng.randint(1, 5000))
+    if type_name == "DOUBLE":
+        return f"{rng.uniform(0, 100000 if 'amount' in name or 'value' in name else 100):.2f}"
+    if "payer" in name:
+        return PAYERS[row % len(PAYERS)]
+    if "priority" in name:
+        return PRIORITIES[row % len(PRIORITIES)]
+    if name.endswith("_id"):
+        return f"{name[:3].upper()}{100000 + row}"
+    if "drg" in name:
+        return str(470 + row % 300)
+    return f"{name.replace('_', ' ').title()} {row % 17}"
+
+
+def synthetic_fixtures(list_rows: int = 500, seed: int = 7) -> Dict[str, Dict[str, Any]]:
+    """Fixtures for every registered template: one row for summaries, `list_rows` for the rest"""
+    # Imported here: the backend modules read their settings at import, after the benchmark set them
+    from backend.queries import QUERIES
+
+    rng = random.Random(seed)
+    fixtures = {}
+    for name, template in QUERIES.items():
+        columns = template_columns(template.sql)
+        if name.endswith("_summary"):
+            count = 1
+        elif name in ("payers", "drg_codes"):
+            count = len(PAYERS) if name == "payers" else 60
+        else:
+            count = list_rows
+        rows = [[_value(column, row, rng) for column in columns] for row in range(count)]
+        if name == "payers":
+            rows = [[payer] for payer in sorted(PAYERS)]
+        fixtures[name] = {"columns": columns, "data_array": rows}
+    return fixtures
+
+
+def load_fixtures(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path) as f:
+        saved = json.load(f)
+    if saved.get("version") != FIXTURE_VERSION:
+        raise ValueError(f"{path}: unsupported fixture version {saved.get('version')}")
+    return saved["queries"]
+
+
+def save_fixtures(path: str, fixtures: Dict[str, Dict[str, Any]], **metadata: Any):
+    with open(path, "w") as f:
+        json.dump({"version": FIXTURE_VERSION, **metadata, "queries": fixtures}, f, indent=1)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Load test: concurrency scaling of the async FastAPI backend against a local stand-in warehouse
+Starts the fake statements server and backend/app_main.py under one uvicorn worker, then fires
+bursts of concurrent API calls. The result cache and startup prewarm are turned off and every call
+in a burst asks for a different filter, so each one is a statement on the warehouse rather than a
+cache hit or a share of another call's statement (single-flight). Statements past the admission
+cap (WAREHOUSE_MAX_IN_FLIGHT, --max-in-flight) wait for a slot, so with a fixed warehouse latency
+wall time per burst should stay close to latency * ceil(concurrency / cap), not grow with a
+thread pool.
+Load generator, backend and fake warehouse share one process, so on small machines the
+highest levels become CPU bound.
+
+    python -m backend.benchmarks.load_test --levels 10,50,100,200 --latency 2.0
+    python -m backend.benchmarks.load_test --max-in-flight 0    # no admission cap
+"""
+from typing import Dict, List
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from backend.benchmarks.fake_warehouse import FakeWarehouse
+from backend.benchmarks.bench_pool import percentile
+
+ENDPOINT = "/api/capacity-management"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_backend(warehouse_url: str, port: int) -> uvicorn.Server:
+    """Import app_main against the fake warehouse and serve it from a background thread"""
+    os.environ["DATABRICKS_HOST"] = warehouse_url
+    os.environ["DATABRICKS_TOKEN"] = "fake-token"
+    app_main = importlib.import_module("backend.app_main")
+
+    server = uvicorn.Server(uvicorn.Config(app_main.app, host="127.0.0.1", port=port, log_level="warning",
+                                           backlog=4096))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def burst(base_url: str, concurrency: int) -> Dict[str, float]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one(index: int) -> float:
+            start = time.perf_counter()
+            # A distinct filter per call: identical concurrent calls would share one statement
+            response = await client.get(ENDPOINT, params={"min_encounters": index, "limit": 10})
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        started = time.perf_counter()
+        latencies: List[float] = await asyncio.gather(*(one(index) for index in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(concurrency / wall, 1),
+        "effective_concurrency": round(sum(latencies) / wall, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="10,50,100,200", help="Comma separated concurrency levels")
+    parser.add_argument("--latency", type=float, default=2.0, help="Warehouse time per statement in seconds")
+    parser.add_argument("--max-in-flight", type=int, help="WAREHOUSE_MAX_IN_FLIGHT for the backend (default: its own)")
+    args = parser.parse_args()
+
+    # Read by the backend modules at import, so set before start_backend imports app_main
+    os.environ["RESULT_CACHE_TTL"] = "0"
+    os.environ["STARTUP_PREWARM"] = ""
+    os.environ.setdefault("GOLD_VERSION_CHECK_INTERVAL", "0")
+    if args.max_in_flight is not None:
+        os.environ["WAREHOUSE_MAX_IN_FLIGHT"] = str(args.max_in_flight)
+
+    with FakeWarehouse(latency=args.latency) as fake:
+        port = free_port()
+        server = start_backend(fake.url, port)
+        max_in_flight = importlib.import_module("backend.admission").WAREHOUSE_MAX_IN_FLIGHT
+        try:
+            results = [
+                asyncio.run(burst(f"http://127.0.0.1:{port}", int(level)))
+                for level in args.levels.split(",")
+            ]
+        finally:
+            server.should_exit = True
+
+    for result in results:
+        waves = math.ceil(result["concurrency"] / max_in_flight) if max_in_flight > 0 else 1
+        result["expected_wall_s"] = round(waves * args.latency, 3)
+    print(json.dumps({"endpoint": ENDPOINT, "warehouse_latency_s": args.latency, "max_in_flight": max_in_flight,
+                      "bursts": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Record gold-table results from the live warehouse as fixtures for offline runs
+Runs every query template through the Statement Execution API with its default parameters (list
+templates with --list-rows rows, so any page size can be cut from them) and saves what the
+warehouse sent back: the manifest schema, the JSON_ARRAY rows of every chunk, the chunk size and
+the time from submit to SUCCEEDED. replay_warehouse.py serves the file to main.py / app_main.py;
+bench_sessions.py and bench_decode.py take it with --fixtures.
+
+    DATABRICKS_HOST=https://... DATABRICKS_TOKEN=... WAREHOUSE_ID=... \\
+        python -m backend.benchmarks.record_fixtures --output gold.json
+"""
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from backend.attribution import STATEMENT_TAG, StatementTag
+from backend.benchmarks.gold_fixtures import save_fixtures
+from backend.queries import QUERIES
+from backend.warehouse import AsyncWarehouseClient, ExecutionPolicy, WarehouseError
+
+DATABRICKS_HOST = os.getenv("DATABRICKS_HOST", "https://fe-vm-hls-amer.cloud.databricks.com")
+DATABRICKS_TOKEN = os.getenv("DATABRICKS_TOKEN")
+WAREHOUSE_ID = os.getenv("WAREHOUSE_ID", "4b28691c780d9875")
+
+RECORD_POLICY = ExecutionPolicy(deadline=600)  # a cold warehouse takes minutes to start
+
+
+async def record_one(client: AsyncWarehouseClient, name: str, list_rows: int) -> Dict[str, Any]:
+    template = QUERIES[name]
+    query = template.bind(limit=list_rows) if template.order is not None else template.bind()
+    token = STATEMENT_TAG.set(StatementTag("record", name))
+    try:
+        started = time.perf_counter()
+        result = await client.execute_statement(query.statement, RECORD_POLICY, parameters=query.parameters)
+        elapsed = time.perf_counter() - started
+        rows = await client._inline_rows(result)
+    finally:
+        STATEMENT_TAG.reset(token)
+
+    manifest = result.get("manifest", {})
+    chunks = manifest.get("chunks") or []
+    return {
+        "columns": manifest.get("schema", {}).get("columns", []),
+        "data_array": rows,
+        "chunk_rows": chunks[0]["row_count"] if len(chunks) > 1 else None,
+        "statement": query.statement,
+        "warehouse_ms": round(elapsed * 1000),
+    }
+
+
+async def record(names: List[str], list_rows: int) -> Dict[str, Dict[str, Any]]:
+    client = AsyncWarehouseClient(host=DATABRICKS_HOST, warehouse_id=WAREHOUSE_ID, token=DATABRICKS_TOKEN)
+    fixtures = {}
+    try:
+        for name in names:
+            try:
+                fixtures[name] = await record_one(client, name, list_rows)
+            except (WarehouseError, httpx.HTTPError) as e:
+                print(f"  {name:<40} FAILED: {e}")
+                continue
+            fixture = fixtures[name]
+            print(f"  {name:<40} {len(fixture['data_array']):>7} rows  {fixture['warehouse_ms']:>6} ms")
+    finally:
+        await client.aclose()
+    return fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="gold.json", help="Fixture file to write")
+    parser.add_argument("--list-rows", type=int, default=1000, help="Rows recorded for each paginated template")
+    parser.add_argument("--only", help="Comma separated template names (default: all)")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else sorted(QUERIES)
+    unknown = [name for name in names if name not in QUERIES]
+    if unknown:
+        parser.error(f"Unknown template(s): {', '.join(unknown)}")
+
+    print(f"Recording {len(names)} templates from warehouse {WAREHOUSE_ID} at {DATABRICKS_HOST}")
+    fixtures = asyncio.run(record(names, args.list_rows))
+    save_fixtures(args.output, fixtures, recorded_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                  warehouse_id=WAREHOUSE_ID, list_rows=args.list_rows)
+    print(f"Wrote {len(fixtures)} of {len(names)} templates to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
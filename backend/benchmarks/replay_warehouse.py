@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Serve recorded warehouse results so the backends run without a live warehouse
+Starts the fake Statement Execution API on a fixed port with a fixture file (record_fixtures.py)
+and answers each statement with the result recorded for its query template, cut to its limit. A
+statement with no recording fails rather than getting made-up rows. Replies are immediate unless
+--latency or --recorded-latency is given, so endpoint timings reflect the backend alone.
+
+    python -m backend.benchmarks.replay_warehouse --fixtures gold.json --port 8765
+    DATABRICKS_HOST=http://127.0.0.1:8765 DATABRICKS_TOKEN=replay python backend/app_main.py
+"""
+import argparse
+import time
+
+from backend.benchmarks.fake_warehouse import FakeWarehouse
+from backend.benchmarks.gold_fixtures import load_fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", required=True, help="Fixture file written by record_fixtures.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Warehouse time per statement in seconds")
+    parser.add_argument("--recorded-latency", action="store_true", help="Take each statement's recorded warehouse time")
+    parser.add_argument("--lenient", action="store_true", help="Answer unrecorded statements with default rows")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    fake = FakeWarehouse(latency=args.latency, fixtures=fixtures, strict=not args.lenient,
+                         recorded_latency=args.recorded_latency, host=args.host, port=args.port)
+    with fake:
+        print(f"Replaying {len(fixtures)} templates from {args.fixtures} at {fake.url}")
+        print(f"  DATABRICKS_HOST={fake.url} DATABRICKS_TOKEN=replay")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        print(f"{fake.request_count} statements answered")
+
+
+if __name__ == "__main__":
+    main()
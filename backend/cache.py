@@ -0,0 +1,128 @@
+"""
+In-process result cache for gold-layer queries
+TTL + LRU bounded, keyed by normalized SQL and parameters, invalidated per gold table. Expired
+entries stay until evicted so they can be served as last-known results while the warehouse starts.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Optional, Tuple
+import os
+import re
+import threading
+import time
+
+CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "512"))
+
+GOLD_SCHEMA = f"{os.getenv('CATALOG_NAME', 'hls_amer_catalog')}.r_health_gold"
+GOLD_TABLES = (
+    "capacity_management",
+    "denials_management",
+    "clinical_trial_matching",
+    "timely_filing_appeals",
+    "documentation_management",
+)
+
+_WHITESPACE = re.compile(r"\s+")
+_GOLD_TABLE_REF = re.compile(r"r_health_gold\.(\w+)", re.IGNORECASE)
+
+
+def normalize_sql(query: str) -> str:
+    """Collapse formatting differences so equivalent statements share a cache entry"""
+    return _WHITESPACE.sub(" ", query).strip().rstrip(";").strip()
+
+
+def make_key(query: str, params: Optional[Dict[str, Any]] = None) -> Tuple[str, Tuple]:
+    return normalize_sql(query), tuple(sorted((params or {}).items()))
+
+
+def referenced_tables(query: str) -> FrozenSet[str]:
+    """Gold tables a statement reads, used to target invalidation"""
+    return frozenset(name.lower() for name in _GOLD_TABLE_REF.findall(query))
+
+
+class ResultCache:
+    """Thread-safe TTL/LRU cache with hit/miss counters"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, FrozenSet[str], Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value); expired entries count as misses"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[2]
+
+    def get_stale(self, key: Hashable) -> Tuple[bool, Any, float]:
+        """Return (found, value, age in seconds) ignoring the TTL - for when fresh data is unavailable"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None, 0.0
+            self.stale_hits += 1
+            return True, entry[2], time.monotonic() - entry[3]
+
+    def set(self, key: Hashable, value: Any, tables: Iterable[str] = ()):
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._entries[key] = (now + self.ttl, frozenset(tables), value, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tables: Optional[Iterable[str]] = None) -> int:
+        """Drop entries reading any of `tables` (all entries when None); returns the count"""
+        with self._lock:
+            if tables is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                targets = set(tables)
+                stale = [key for key, entry in self._entries.items() if entry[1] & targets]
+                for key in stale:
+                    del self._entries[key]
+                dropped = len(stale)
+            self.invalidations += dropped
+            return dropped
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def fresh_entries(self) -> int:
+        """Entries still within their TTL (len() also counts the expired ones kept for stale serving)"""
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for entry in self._entries.values() if entry[0] >= now)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale_hits": self.stale_hits,
+        }
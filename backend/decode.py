@@ -0,0 +1,84 @@
+"""
+Schema-aware decoding of warehouse results
+Turns JSON_ARRAY strings into typed Arrow columns (one vectorized cast per column, not per cell)
+and renders them as JSON-native values for the API
+"""
+from typing import Any, Dict, List
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# manifest.schema.columns[].type_name -> Arrow type served by the API. DECIMAL becomes float64:
+# JSON numbers are doubles anyway and the frontend charts them directly.
+ARROW_TYPES = {
+    "BYTE": pa.int8(),
+    "SHORT": pa.int16(),
+    "INT": pa.int32(),
+    "LONG": pa.int64(),
+    "FLOAT": pa.float32(),
+    "DOUBLE": pa.float64(),
+    "DECIMAL": pa.float64(),
+    "BOOLEAN": pa.bool_(),
+    "DATE": pa.date32(),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+    "TIMESTAMP_NTZ": pa.timestamp("us"),
+}
+
+
+def arrow_type(column: Dict[str, Any]) -> pa.DataType:
+    """Target type for a manifest column; complex and unknown types stay strings"""
+    return ARROW_TYPES.get((column.get("type_name") or "STRING").upper(), pa.string())
+
+
+def _cast(values: pa.Array, target: pa.DataType) -> pa.Array:
+    if values.type == target:
+        return values
+    try:
+        return values.cast(target)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # Unexpected wire format (e.g. "NaN" in a DECIMAL): serve the column as sent
+        return values
+
+
+def decode_json_array(schema_columns: List[Dict[str, Any]], data_array: List[List[Any]]) -> pa.Table:
+    """Build a typed table from JSON_ARRAY rows"""
+    names = [col["name"] for col in schema_columns]
+    if not data_array:
+        return pa.Table.from_arrays([pa.array([], arrow_type(col)) for col in schema_columns], names=names)
+
+    # Transposing is the only per-row step; the type conversion runs once per column in Arrow
+    columns = list(zip(*data_array))
+    arrays = [
+        _cast(pa.array(values, pa.string()), arrow_type(col))
+        for values, col in zip(columns, schema_columns)
+    ]
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def normalize_table(table: pa.Table) -> pa.Table:
+    """Align ARROW_STREAM results with the decoded JSON types (decimals -> float64)"""
+    for index, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            table = table.set_column(index, field.name, _cast(table.column(index), pa.float64()))
+    return table
+
+
+def _json_column(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    if pa.types.is_timestamp(column.type):
+        suffix = "Z" if column.type.tz else ""
+        return pc.strftime(column, format=f"%Y-%m-%dT%H:%M:%S{suffix}")
+    if pa.types.is_date(column.type):
+        return column.cast(pa.string())
+    if pa.types.is_decimal(column.type):
+        column = column.cast(pa.float64())
+    if pa.types.is_floating(column.type):
+        # NaN and +/-Infinity (sent as "NaN", "Infinity", "-Infinity") have no JSON form
+        finite = pc.is_finite(column)
+        if not pc.all(finite).as_py():
+            return pc.if_else(finite, column, pa.scalar(None, column.type))
+    return column
+
+
+def json_ready(table: pa.Table) -> pa.Table:
+    """Temporal columns as ISO-8601 strings and non-finite floats as null, so every value is a native JSON type"""
+    return pa.Table.from_arrays([_json_column(column) for column in table.columns], names=table.column_names)
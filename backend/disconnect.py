@@ -0,0 +1,60 @@
+"""
+Client disconnect handling shared by the R_Health backends
+When the HTTP client goes away before its response is sent (page left, request aborted), the
+request handler is cancelled. The cancellation reaches the warehouse client, which cancels the
+statements nobody is waiting for any more.
+"""
+from typing import Any, Dict
+import asyncio
+
+DISCONNECT_STATS: Dict[str, int] = {"abandoned_requests": 0}
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    Runs each HTTP request in its own task and cancels it on http.disconnect
+
+    Incoming ASGI messages are read ahead into a queue the app reads from, so the disconnect is
+    seen while the handler is still awaiting the warehouse rather than only when it next reads
+    the request. Disconnects after the response has been fully sent are ignored.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        messages: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        state = {"responded": False, "abandoned": False}
+
+        async def send_tracked(message: Dict[str, Any]):
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                state["responded"] = True
+            await send(message)
+
+        handler = asyncio.ensure_future(self.app(scope, messages.get, send_tracked))
+
+        async def watch():
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    if not handler.done() and not state["responded"]:
+                        state["abandoned"] = True
+                        DISCONNECT_STATS["abandoned_requests"] += 1
+                        handler.cancel()
+                    return
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not state["abandoned"]:
+                # The server is cancelling us (e.g. shutdown): take the handler down too
+                handler.cancel()
+                raise
+        finally:
+            watcher.cancel()
@@ -0,0 +1,130 @@
+"""
+Response formats for the scenario list endpoints
+Selected with ?format=json|columnar|arrow (rendered from the decoded ResultSet table) or
+?format=ndjson|csv (streamed chunk by chunk as the warehouse result is downloaded)
+"""
+from typing import Any, AsyncIterator, Literal, Optional
+import io
+import json
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from fastapi import HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from .decode import json_ready
+from .metrics import observe_phase
+from .pagination import NEXT_CURSOR_HEADER, Page
+from .results import ResultSet, ResultStream
+
+# Largest `limit` served by the buffered formats; bigger results must use a streaming format
+MAX_LIMIT = int(os.getenv("MAX_LIMIT", "10000"))
+# Rows serialized per write while streaming (bounds the size of each response piece)
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "5000"))
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Set (to the age in seconds) when a last-known result is served because the warehouse is starting
+STALENESS_HEADER = "X-Result-Staleness"
+
+ResponseFormat = Literal["json", "columnar", "arrow", "ndjson", "csv"]
+STREAMING_FORMATS = ("ndjson", "csv")
+STREAMING_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+FORMAT_QUERY = Query(
+    "json",
+    alias="format",
+    description=(
+        "json: list of rows, columnar: {columns, data: {column: [...]}}, arrow: Arrow IPC stream, "
+        "ndjson / csv: rows streamed as they arrive from the warehouse"
+    ),
+)
+
+
+def check_limit(limit: Optional[int], response_format: ResponseFormat):
+    """Buffered formats hold the whole result in memory, so cap their size"""
+    if response_format not in STREAMING_FORMATS and limit is not None and limit > MAX_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"limit must be <= {MAX_LIMIT}; use format=ndjson or format=csv for larger results",
+        )
+
+
+def render_result(
+    result: ResultSet,
+    response_format: ResponseFormat = "json",
+    page: Optional[Page] = None,
+    first_row: bool = False,
+) -> Any:
+    """
+    Response for a list (or, with first_row, a single-row summary) in the requested format
+
+    Values are already JSON-native, so the body is rendered here rather than by FastAPI's
+    per-value jsonable_encoder walk, and its time is recorded as the serialize phase.
+    """
+    started = time.perf_counter()
+    headers = {}
+    next_cursor = page.next_cursor(result) if page else None
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if result.staleness is not None:
+        headers[STALENESS_HEADER] = str(int(result.staleness))
+
+    if first_row:
+        records = result.to_records()
+        response = JSONResponse(records[0] if records else {}, headers=headers)
+    elif response_format == "columnar":
+        response = JSONResponse(result.to_columnar(), headers=headers)
+    elif response_format == "arrow":
+        response = Response(result.to_arrow_ipc(), media_type=ARROW_MEDIA_TYPE, headers=headers)
+    else:
+        response = JSONResponse(result.to_records(), headers=headers)
+    observe_phase("serialize", time.perf_counter() - started)
+    return response
+
+
+async def _batches(stream: ResultStream) -> AsyncIterator[pa.RecordBatch]:
+    try:
+        async for chunk in stream:
+            for batch in json_ready(chunk).to_batches(max_chunksize=STREAM_BATCH_ROWS):
+                yield batch
+    except Exception as e:
+        # Headers are already sent: all we can do is log and cut the response short
+        print(f"Result stream aborted: {str(e)[:200]}")
+        raise
+    finally:
+        await stream.aclose()
+
+
+async def _ndjson(stream: ResultStream) -> AsyncIterator[bytes]:
+    spent = 0.0
+    try:
+        async for batch in _batches(stream):
+            started = time.perf_counter()
+            lines = [json.dumps(row, separators=(",", ":")) for row in batch.to_pylist()]
+            body = ("\n".join(lines) + "\n").encode()
+            spent += time.perf_counter() - started
+            yield body
+    finally:
+        observe_phase("serialize", spent)
+
+
+async def _csv(stream: ResultStream) -> AsyncIterator[bytes]:
+    yield (",".join(json.dumps(name) for name in stream.columns) + "\n").encode()
+    options = pa_csv.WriteOptions(include_header=False)
+    spent = 0.0
+    try:
+        async for batch in _batches(stream):
+            started = time.perf_counter()
+            buffer = io.BytesIO()
+            pa_csv.write_csv(batch, buffer, write_options=options)
+            spent += time.perf_counter() - started
+            yield buffer.getvalue()
+    finally:
+        observe_phase("serialize", spent)
+
+
+def stream_result(stream: ResultStream, response_format: ResponseFormat) -> StreamingResponse:
+    body = _csv(stream) if response_format == "csv" else _ndjson(stream)
+    return StreamingResponse(body, media_type=STREAMING_MEDIA_TYPES[response_format])
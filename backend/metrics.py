@@ -0,0 +1,279 @@
+"""
+Prometheus metrics for the R_Health backends
+/metrics (served by admin.py) exposes HTTP latency per route, per-phase query timings (admission
+wait, warehouse execution, result fetch, decode, serialization), row and byte counters, and gauges
+read from the query service at scrape time (cache hit ratios, in-flight statements, queue depth).
+Metrics are per process; each worker answers for itself.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # the response adds "; charset=utf-8"
+PREFIX = "rhealth_"
+
+# Seconds; from cached hits (sub-millisecond) to long exports
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Query template the current request runs, for the per-query metric labels
+QUERY_NAME: ContextVar[str] = ContextVar("query_name", default="other")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: Any):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelValues, List[float]] = {}  # count per bucket (+Inf last), then sum, then count
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {_number(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {_number(series[-1])}")
+        return lines
+
+
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled")
+HTTP_RESPONSE_BYTES = Counter("http_response_bytes_total", "Response body bytes sent", ("route",))
+QUERY_PHASE = Histogram(
+    "query_phase_seconds",
+    "Time per query phase: admission (wait for a warehouse slot), warehouse (submit to SUCCEEDED), "
+    "fetch (result chunk download), decode (to Arrow), serialize (response body)",
+    ("query", "phase"),
+)
+RESULT_ROWS = Counter("result_rows_total", "Rows returned by the warehouse", ("query",))
+RESULT_BYTES = Counter("result_bytes_total", "Result bytes reported by the warehouse", ("query",))
+SERVED = Counter("query_results_total", "Query results by where they were served from", ("query", "source"))
+# From Query History, so they trail the statements by up to COST_COLLECT_INTERVAL
+WAREHOUSE_SECONDS = Counter("warehouse_seconds_total", "Warehouse time of the statements sent per route and query",
+                            ("route", "query"))
+SCANNED_BYTES = Counter("scanned_bytes_total", "Bytes read by the statements sent per route and query", ("route", "query"))
+PRODUCED_ROWS = Counter("produced_rows_total", "Rows produced by the statements sent per route and query", ("route", "query"))
+
+METRICS: List[_Metric] = [
+    HTTP_LATENCY, HTTP_IN_FLIGHT, HTTP_RESPONSE_BYTES, QUERY_PHASE, RESULT_ROWS, RESULT_BYTES, SERVED,
+    WAREHOUSE_SECONDS, SCANNED_BYTES, PRODUCED_ROWS,
+]
+
+
+def observe_phase(phase: str, seconds: float):
+    QUERY_PHASE.observe(seconds, query=QUERY_NAME.get(), phase=phase)
+
+
+_ROUTES: Dict[Any, str] = {}
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the route that handled the request, or "unmatched"
+
+    The template (/api/denials-management, not the query string or path parameters) keeps the
+    number of label values bounded.
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    route = _ROUTES.get(endpoint)
+    if route is None:
+        app = scope.get("app")
+        for candidate in getattr(app, "routes", []):
+            if getattr(candidate, "endpoint", None) is endpoint:
+                route = getattr(candidate, "path", "unmatched")
+                break
+        route = _ROUTES[endpoint] = route or "unmatched"
+    return route
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and counts response bytes per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        state = {"status": 500, "bytes": 0}
+
+        async def send_tracked(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_tracked)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = route_template(scope)
+            HTTP_LATENCY.observe(time.perf_counter() - started, method=scope["method"], route=route, status=state["status"])
+            HTTP_RESPONSE_BYTES.inc(state["bytes"], route=route)
+
+
+def _gauge_lines(name: str, help: str, samples: List[Tuple[Dict[str, Any], Optional[float]]], kind: str = "gauge") -> List[str]:
+    lines = [f"# HELP {PREFIX}{name} {help}", f"# TYPE {PREFIX}{name} {kind}"]
+    for labels, value in samples:
+        if value is not None:
+            names = tuple(labels)
+            lines.append(f"{PREFIX}{name}{_labels(names, tuple(str(labels[n]) for n in names))} {_number(value)}")
+    return lines
+
+
+def service_lines(service) -> List[str]:
+    """Gauges and counters read from the query service's own stats at scrape time"""
+    cache = service.cache.stats()
+    tiers = [({"tier": "memory"}, cache)]
+    if service.shared_cache:
+        tiers.append(({"tier": "shared"}, service.shared_cache.stats()))
+    singleflight = service.singleflight.stats()
+    admission = service.admission.stats()
+    lines: List[str] = []
+    lines += _gauge_lines("cache_hits_total", "Result cache hits", [(labels, s.get("hits")) for labels, s in tiers], "counter")
+    lines += _gauge_lines("cache_misses_total", "Result cache misses", [(labels, s.get("misses")) for labels, s in tiers], "counter")
+    lines += _gauge_lines("cache_hit_ratio", "Result cache hits / lookups", [(labels, s.get("hit_ratio")) for labels, s in tiers])
+    lines += _gauge_lines("cache_entries", "Results held in the cache", [(labels, s.get("entries")) for labels, s in tiers])
+    lines += _gauge_lines("singleflight_coalesced_total", "Calls that shared an in-flight statement",
+                          [({}, singleflight["coalesced"])], "counter")
+    lines += _gauge_lines("singleflight_in_flight", "Distinct statements being fetched", [({}, singleflight["in_flight"])])
+    lines += _gauge_lines("admission_in_flight", "Warehouse slots in use", [({}, admission["in_flight"])])
+    lines += _gauge_lines("admission_waiting", "Calls waiting for a warehouse slot",
+                          [({"priority": name}, depth) for name, depth in admission["queue_depth"].items()] or [({"priority": "all"}, 0)])
+    lines += _gauge_lines("admission_rejected_total", "Calls answered 503 by admission control",
+                          [({"reason": "queue_full"}, admission["rejected_queue_full"]),
+                           ({"reason": "wait_timeout"}, admission["rejected_wait_timeout"])], "counter")
+    targets = service.router.targets
+    lines += _gauge_lines("warehouse_statements_in_flight", "Statements running per warehouse",
+                          [({"warehouse": t.warehouse_id}, t.client.in_flight) for t in targets])
+    lines += _gauge_lines("warehouse_statements_queued", "Statements the warehouse reports PENDING",
+                          [({"warehouse": t.warehouse_id}, t.client.queued) for t in targets])
+    lines += _gauge_lines("warehouse_up", "1 when the warehouse is RUNNING",
+                          [({"warehouse": t.warehouse_id}, 1 if t.monitor.state == "RUNNING" else 0) for t in targets])
+    lines += _gauge_lines("circuit_open", "1 while the warehouse circuit breaker is open", [({}, 1 if service.breaker.is_open else 0)])
+    if service.replica:
+        replica = service.replica.stats()
+        lines += _gauge_lines("replica_ready", "1 when the gold replica can serve", [({}, 1 if replica["ready"] else 0)])
+    return lines
+
+
+def render_metrics(service=None) -> str:
+    lines: List[str] = []
+    for metric in METRICS:
+        lines += metric.render()
+    if service is not None:
+        lines += service_lines(service)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,166 @@
+"""
+Keyset (cursor) pagination for the scenario list endpoints
+Each list has a fixed sort key ending in a unique tiebreaker. A page's cursor holds the key of its
+last row and the next page filters on `key after cursor`, so page 50 scans no more than page 1.
+Cursor values reach the warehouse as named parameters (:after_0, :after_1, ...).
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import binascii
+import json
+import math
+
+from fastapi import HTTPException, Query
+
+from .decode import json_ready
+from .results import ResultSet
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+CURSOR_QUERY = Query(None, description=f"Opaque cursor from the previous page's {NEXT_CURSOR_HEADER} header")
+
+
+def sql_literal(value: Any) -> str:
+    """Render a constant (e.g. a COALESCE default) as a Databricks SQL literal"""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float) and math.isfinite(value):
+        return repr(value)
+    if isinstance(value, str):
+        return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+    raise ValueError(f"Unsupported cursor value: {value!r}")
+
+
+def parameter_type(value: Any) -> str:
+    """Statement Execution API parameter type for a cursor value"""
+    if isinstance(value, bool):
+        return "BOOLEAN"
+    if isinstance(value, int):
+        return "BIGINT"
+    if isinstance(value, float):
+        return "DOUBLE"
+    return "STRING"
+
+
+class SortKey:
+    """One ORDER BY column; `null_as` maps NULLs to a comparable value so keyset predicates stay exact"""
+
+    def __init__(self, column: str, descending: bool = False, null_as: Any = None):
+        self.column = column
+        self.descending = descending
+        self.null_as = null_as
+
+    @property
+    def expression(self) -> str:
+        if self.null_as is None:
+            return self.column
+        return f"COALESCE({self.column}, {sql_literal(self.null_as)})"
+
+    def value(self, row: Dict[str, Any]) -> Any:
+        value = row.get(self.column)
+        return self.null_as if value is None else value
+
+
+class KeysetOrder:
+    """Sort order of a list endpoint, with cursor encoding and the matching keyset predicate"""
+
+    def __init__(self, name: str, *keys: SortKey):
+        self.name = name
+        self.keys = keys
+
+    @property
+    def order_by(self) -> str:
+        return "ORDER BY " + ", ".join(f"{key.expression} {'DESC' if key.descending else 'ASC'}" for key in self.keys)
+
+    @property
+    def after(self) -> str:
+        """(k1 after :after_0) OR (k1 = :after_0 AND k2 after :after_1) OR ... for mixed ASC/DESC keys"""
+        terms = []
+        for index, key in enumerate(self.keys):
+            equal = [f"{prev.expression} = :after_{i}" for i, prev in enumerate(self.keys[:index])]
+            beyond = f"{key.expression} {'<' if key.descending else '>'} :after_{index}"
+            terms.append("(" + " AND ".join(equal + [beyond]) + ")")
+        return "(" + " OR ".join(terms) + ")"
+
+    def encode(self, row: Dict[str, Any]) -> str:
+        payload = json.dumps({"o": self.name, "k": [key.value(row) for key in self.keys]}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> List[Any]:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            values = payload["k"]
+            if payload["o"] != self.name or len(values) != len(self.keys):
+                raise ValueError("cursor belongs to a different list")
+            for value in values:
+                if not isinstance(value, (bool, int, float, str)) or (isinstance(value, float) and not math.isfinite(value)):
+                    raise ValueError("unsupported cursor value")
+            return values
+        except (ValueError, KeyError, TypeError, binascii.Error):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class Page:
+    """One page request: the ORDER BY / LIMIT tail of the statement and the cursor of the next page"""
+
+    def __init__(self, order: KeysetOrder, limit: int, cursor: Optional[str] = None):
+        self.order = order
+        self.limit = limit
+        self.after = order.decode(cursor) if cursor else None
+
+    def sql(self) -> str:
+        """Keyset predicate, ORDER BY and LIMIT, appended to a statement's WHERE clause"""
+        predicate = f"AND {self.order.after}\n" if self.after is not None else ""
+        return f"{predicate}{self.order.order_by}\nLIMIT :limit"
+
+    def parameters(self) -> Dict[str, Tuple[str, Any]]:
+        """Cursor values as typed named parameters"""
+        return {f"after_{i}": (parameter_type(value), value) for i, value in enumerate(self.after or [])}
+
+    def next_cursor(self, result: ResultSet) -> Optional[str]:
+        """A full page may have more rows behind it; a short page is the last one"""
+        if not self.limit or result.num_rows < self.limit:
+            return None
+        last_row = json_ready(result.table.slice(result.num_rows - 1, 1)).to_pylist()[0]
+        return self.order.encode(last_row)
+
+
+CAPACITY_ORDER = KeysetOrder(
+    "capacity",
+    SortKey("estimated_cost_opportunity", descending=True, null_as=0),
+    SortKey("drg_code", null_as=""),
+    SortKey("primary_diagnosis_code", null_as=""),
+)
+DENIALS_ORDER = KeysetOrder(
+    "denials",
+    SortKey("priority_score", descending=True, null_as=0),
+    SortKey("payer_name", null_as=""),
+    SortKey("drg_code", null_as=""),
+    SortKey("denial_category", null_as=""),
+    # denial_category is derived; the gold table is grouped by these (with payer_name and drg_code)
+    SortKey("denial_reason", null_as=""),
+    SortKey("payer_category", null_as=""),
+    SortKey("denial_priority", null_as=""),
+)
+CLINICAL_TRIAL_ORDER = KeysetOrder(
+    "clinical_trials",
+    SortKey("eligible_trial_count", descending=True, null_as=0),
+    SortKey("patient_id"),
+)
+TIMELY_FILING_ORDER = KeysetOrder(
+    "timely_filing",
+    SortKey("urgency_score", descending=True, null_as=0),
+    SortKey("days_to_deadline", null_as=0),
+    SortKey("claim_id"),
+)
+DOCUMENTATION_ORDER = KeysetOrder(
+    "documentation",
+    SortKey("associated_claim_value", descending=True, null_as=0),
+    SortKey("documentation_type", null_as=""),
+    SortKey("payer_name", null_as=""),
+    SortKey("drg_code", null_as=""),
+    SortKey("request_urgency", null_as=""),
+    SortKey("documentation_complexity", null_as=""),
+)
@@ -0,0 +1,274 @@
+"""
+On-demand request profiling for the R_Health backends
+A request sent with `X-Profile: 1` and the admin token (never when ADMIN_TOKEN is unset), or picked
+by PROFILE_SAMPLE_RATE, is profiled by a sampling thread. The thread records where the request's
+task is: the running stack while it is on the CPU (decoding, building dicts, JSON encoding) and
+the chain of awaits it is suspended in otherwise (warehouse submit, polling, chunk downloads),
+following the tasks it spawned (single-flight, hedging). Profiles are kept as folded stacks, the
+input format of flamegraph.pl and speedscope.
+"""
+from collections import Counter, OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional
+import asyncio
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+
+from .attribution import REQUEST
+from .metrics import route_template
+
+# Fraction of API requests profiled without asking (0 disables)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Seconds between samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# Profiles kept in memory; with PROFILE_DIR set, each one is also written there as <id>.folded
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-ID"
+# Routes that never run warehouse queries
+_SKIPPED_PREFIXES = ("/api/admin", "/api/health")
+
+WAITING = "[waiting]"
+
+# Profile of the request being handled; tasks created while it is set join that profile
+PROFILE: ContextVar[Optional["Profile"]] = ContextVar("profile", default=None)
+
+
+def _is_admin(token: Optional[str]) -> bool:
+    """On-demand profiling is an admin action; with no ADMIN_TOKEN configured it is off"""
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def _label(code) -> str:
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+
+def _awaiting(coro) -> List[str]:
+    """Frames of a suspended coroutine and everything it awaits, outermost first"""
+    labels = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "ag_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            if not hasattr(coro, "cr_code"):
+                labels.append(f"[{type(coro).__name__}]")  # a Future, gather() or an async generator step
+            break
+        labels.append(_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "ag_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return labels
+
+
+def _running(frame, root) -> List[str]:
+    """Stack of the thread from the task's own coroutine frame up to the executing frame"""
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        if frame is root:
+            break
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _is_running(task: asyncio.Task) -> bool:
+    return bool(getattr(task.get_coro(), "cr_running", False))
+
+
+class Profile:
+    """Samples of one request, as folded stacks ("frame;frame;frame count")"""
+
+    def __init__(self, profile_id: str, method: str, route: str, task: asyncio.Task, thread_id: int):
+        self.id = profile_id
+        self.method = method
+        self.route = route
+        self.task: Optional[asyncio.Task] = task
+        self.thread_id = thread_id
+        self.children: Dict[asyncio.Task, List[asyncio.Task]] = {}  # tasks spawned, by the task that spawned them
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.waiting = 0
+
+    def adopt(self, task: asyncio.Task):
+        """Called on the loop thread when the request spawns a task"""
+        parent = asyncio.current_task()
+        if parent is not None:
+            self.children.setdefault(parent, []).append(task)
+
+    def sample(self, frames: Dict[int, Any]):
+        """
+        The stack of the request's task and, while it awaits a task it spawned, of that task
+
+        A task that is executing contributes its thread stack and ends the sample; otherwise the
+        sample ends in [waiting] (network, timers, worker threads or other requests' work).
+        """
+        stack: List[str] = []
+        task = self.task
+        while task is not None:
+            coro = task.get_coro()
+            if getattr(coro, "cr_running", False):
+                stack += _running(frames.get(self.thread_id), coro.cr_frame)
+                break
+            stack += _awaiting(coro)
+            live = [child for child in list(self.children.get(task, ())) if not child.done()]
+            task = next((child for child in live if _is_running(child)), live[0] if live else None)
+        else:
+            stack.append(WAITING)
+            self.waiting += 1
+        if stack:
+            self.stacks[";".join(stack)] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        root = f"{self.method} {self.route}"
+        return "".join(f"{root};{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "started_at": round(self.started_at, 3),
+            "duration_ms": round(self.duration * 1000, 1),
+            "samples": self.samples,
+            "waiting_samples": self.waiting,
+        }
+
+
+class Profiler:
+    """
+    One sampling thread shared by every profiled request
+
+    The thread runs only while at least one request is being profiled. Each tick it reads the
+    current frames of all threads once and adds a sample to every active profile. Work handed to
+    worker threads (asyncio.to_thread) shows as the task waiting on it.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, keep: int = PROFILE_KEEP, directory: Optional[str] = PROFILE_DIR):
+        self.interval = interval
+        self.directory = directory
+        self.profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self.keep = keep
+        self._active: Deque[Profile] = deque()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, profile: Profile):
+        with self._lock:
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def end(self, profile: Profile):
+        profile.duration = time.time() - profile.started_at
+        with self._lock:
+            if profile in self._active:
+                self._active.remove(profile)
+            self.profiles[profile.id] = profile
+            while len(self.profiles) > self.keep:
+                self.profiles.popitem(last=False)
+        profile.task = None  # don't keep the finished tasks (and their frames) alive
+        profile.children = {}
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(os.path.join(self.directory, f"{profile.id}.folded"), "w") as f:
+                    f.write(profile.folded())
+            except OSError as e:
+                print(f"Could not write profile {profile.id}: {e}")
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for profile in active:
+                if profile.task is not None:
+                    profile.sample(frames)
+            del frames
+            time.sleep(self.interval)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return self.profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [profile.summary() for profile in reversed(self.profiles.values())]
+
+
+PROFILER = Profiler()
+
+
+def _install_task_factory(loop: asyncio.AbstractEventLoop):
+    """Have tasks created under a profiled request join its profile (kept around any existing factory)"""
+    previous = loop.get_task_factory()
+    if getattr(previous, "profiling", False):
+        return
+
+    def factory(loop, coro, **kwargs):
+        task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+        profile = PROFILE.get()
+        if profile is not None and profile.task is not None:
+            profile.adopt(task)
+        return task
+
+    factory.profiling = True
+    loop.set_task_factory(factory)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that ask for it (X-Profile: 1) or are sampled
+
+    Must run inside the task that handles the request (i.e. be added before
+    CancelOnDisconnectMiddleware). The profile id is the request id, and it is returned in
+    X-Profile-ID so the caller can fetch /api/admin/profiles/<id>.
+    """
+
+    def __init__(self, app, profiler: Profiler = PROFILER, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.profiler = profiler
+        self.sample_rate = sample_rate
+
+    def _wanted(self, scope) -> bool:
+        path = scope.get("path", "")
+        if not path.startswith("/api/") or path.startswith(_SKIPPED_PREFIXES):
+            return False
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        if headers.get(PROFILE_HEADER.lower()) == "1" and _is_admin(headers.get("x-admin-token")):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        request = REQUEST.get()  # set by RequestIdMiddleware, outside this one
+        profile_id = request[0] if request else f"{time.time():.6f}"
+        profile = Profile(profile_id, scope["method"], scope["path"], asyncio.current_task(), threading.get_ident())
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [(PROFILE_ID_HEADER.lower().encode(), profile_id.encode())])
+            await send(message)
+
+        _install_task_factory(asyncio.get_running_loop())
+        token = PROFILE.set(profile)
+        self.profiler.begin(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            PROFILE.reset(token)
+            profile.route = route_template(scope)
+            self.profiler.end(profile)
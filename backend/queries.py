@@ -0,0 +1,464 @@
+"""
+Named, parameterized query templates shared by the R_Health backends
+Every endpoint runs a fixed statement text with Statement Execution API named parameters
+(:payer, :limit, ...) instead of f-string literals, so each endpoint has one statement shape for
+every filter value: the warehouse can reuse plans and cached results, and the client-side cache
+key is the normalized text plus the typed parameter values.
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+from .admission import PRIORITY_INTERACTIVE, PRIORITY_LIST
+from .cache import GOLD_SCHEMA, make_key, referenced_tables
+from .pagination import (
+    CAPACITY_ORDER, CLINICAL_TRIAL_ORDER, DENIALS_ORDER, DOCUMENTATION_ORDER, TIMELY_FILING_ORDER, KeysetOrder, Page,
+)
+from .resilience import EndpointPolicy
+
+
+class QueryParameterError(ValueError):
+    """Raised when a template is bound with a missing, unknown or ill-typed parameter"""
+
+
+class Param:
+    """A named parameter marker: API type, allowed values and default"""
+
+    def __init__(
+        self,
+        name: str,
+        type: str = "STRING",
+        default: Any = None,
+        choices: Optional[Sequence[str]] = None,
+        minimum: Optional[int] = None,
+        normalize: Optional[Callable[[str], str]] = None,
+    ):
+        self.name = name
+        self.type = type
+        self.default = default
+        self.choices = choices
+        self.minimum = minimum
+        self.normalize = normalize
+
+    def convert(self, value: Any) -> Any:
+        """Validate and coerce a value; None binds SQL NULL"""
+        if value is None:
+            return None
+        if self.type in ("INT", "BIGINT"):
+            if isinstance(value, bool) or not isinstance(value, (int, str)):
+                raise QueryParameterError(f"{self.name} must be an integer")
+            try:
+                value = int(value)
+            except ValueError:
+                raise QueryParameterError(f"{self.name} must be an integer")
+            if self.minimum is not None and value < self.minimum:
+                raise QueryParameterError(f"{self.name} must be >= {self.minimum}")
+            return value
+        if self.type == "BOOLEAN":
+            if isinstance(value, str) and value.lower() in ("true", "false"):
+                return value.lower() == "true"
+            if not isinstance(value, bool):
+                raise QueryParameterError(f"{self.name} must be true or false")
+            return value
+        if not isinstance(value, str):
+            raise QueryParameterError(f"{self.name} must be a string")
+        if self.normalize:
+            value = self.normalize(value)
+        if self.choices is not None and value not in self.choices:
+            raise QueryParameterError(f"{self.name} must be one of: {', '.join(self.choices)}")
+        return value
+
+
+class BoundQuery:
+    """A template with validated parameter values, ready for the query service"""
+
+    def __init__(
+        self,
+        name: str,
+        statement: str,
+        params: Dict[str, Tuple[str, Any]],
+        page: Optional[Page] = None,
+        priority: int = PRIORITY_INTERACTIVE,
+        policy: Optional[EndpointPolicy] = None,
+    ):
+        self.name = name
+        self.statement = statement
+        self.params = params
+        self.page = page
+        self.priority = priority
+        self.policy = policy if policy is not None else EndpointPolicy()
+
+    @property
+    def parameters(self) -> List[Dict[str, Any]]:
+        """Statement Execution API `parameters`; a value left out binds NULL"""
+        specs = []
+        for name, (type_, value) in self.params.items():
+            spec = {"name": name, "type": type_}
+            if value is not None:
+                spec["value"] = str(value).lower() if isinstance(value, bool) else str(value)
+            specs.append(spec)
+        return specs
+
+    @property
+    def key(self) -> Tuple:
+        return make_key(self.statement, {name: value for name, (_, value) in self.params.items()})
+
+    @property
+    def tables(self):
+        return referenced_tables(self.statement)
+
+    @property
+    def row_limit(self) -> Optional[int]:
+        return self.page.limit if self.page else None
+
+
+class QueryTemplate:
+    """
+    Statement text with :name markers plus the parameters it accepts
+
+    `{gold}` is replaced by the gold schema. Paginated templates end their WHERE clause with
+    `{page}`, which becomes the keyset predicate, ORDER BY and LIMIT :limit of their order.
+    Admission priority defaults to list for paginated templates and interactive for the rest.
+    The retry / hedge policy defaults from the priority (only interactive templates hedge), with
+    WAREHOUSE_ENDPOINT_POLICIES overrides by template name.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        sql: str,
+        params: Sequence[Param] = (),
+        order: Optional[KeysetOrder] = None,
+        priority: Optional[int] = None,
+        policy: Optional[EndpointPolicy] = None,
+    ):
+        self.name = name
+        self.sql = sql.replace("{gold}", GOLD_SCHEMA)
+        self.order = order
+        self.priority = priority if priority is not None else (PRIORITY_LIST if order is not None else PRIORITY_INTERACTIVE)
+        self.policy = policy if policy is not None else EndpointPolicy.for_template(name, self.priority == PRIORITY_INTERACTIVE)
+        self.params = list(params)
+        if order is not None:
+            self.params.append(Param("limit", "INT", default=100, minimum=1))
+
+    def bind(self, cursor: Optional[str] = None, **values: Any) -> BoundQuery:
+        known = {param.name for param in self.params}
+        unknown = set(values) - known
+        if unknown:
+            raise QueryParameterError(f"Unknown parameter(s) for {self.name}: {', '.join(sorted(unknown))}")
+
+        params = {}
+        for param in self.params:
+            value = values.get(param.name)
+            params[param.name] = (param.type, param.convert(param.default if value is None else value))
+
+        page = None
+        statement = self.sql
+        if self.order is not None:
+            page = Page(self.order, params["limit"][1], cursor)
+            params.update(page.parameters())
+            statement = statement.replace("{page}", page.sql())
+        return BoundQuery(self.name, statement, params, page, self.priority, self.policy)
+
+
+QUERIES: Dict[str, QueryTemplate] = {}
+
+
+def register(template: QueryTemplate) -> QueryTemplate:
+    if template.name in QUERIES:
+        raise ValueError(f"Duplicate query template: {template.name}")
+    QUERIES[template.name] = template
+    return template
+
+
+def bind_query(name: str, cursor: Optional[str] = None, **values: Any) -> BoundQuery:
+    """Bind a registered template for an endpoint; bad parameters become a 400"""
+    try:
+        return QUERIES[name].bind(cursor=cursor, **values)
+    except QueryParameterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ==============================================================================
+# SCENARIO 1: CAPACITY MANAGEMENT
+# ==============================================================================
+
+register(QueryTemplate(
+    "capacity_management",
+    """
+    SELECT
+        drg_code,
+        primary_diagnosis_code,
+        total_encounters,
+        unique_patients,
+        avg_los,
+        gmlos_benchmark,
+        avg_los_variance,
+        median_los,
+        p90_los,
+        total_bed_days,
+        high_variance_count,
+        excess_days,
+        estimated_cost_opportunity,
+        optimization_priority
+    FROM {gold}.capacity_management
+    WHERE (:priority IS NULL OR optimization_priority LIKE CONCAT('%', :priority, '%'))
+    AND (:min_encounters IS NULL OR total_encounters >= :min_encounters)
+    {page}
+    """,
+    [Param("priority"), Param("min_encounters", "INT")],
+    order=CAPACITY_ORDER,
+))
+
+register(QueryTemplate(
+    "capacity_summary",
+    """
+    SELECT
+        COUNT(*) as total_drgs,
+        SUM(total_encounters) as total_encounters,
+        SUM(total_bed_days) as total_bed_days,
+        ROUND(AVG(avg_los), 2) as overall_avg_los,
+        SUM(estimated_cost_opportunity) as total_cost_opportunity,
+        SUM(CASE WHEN optimization_priority LIKE '%Critical%' THEN 1 ELSE 0 END) as critical_count,
+        SUM(CASE WHEN optimization_priority LIKE '%High%' THEN 1 ELSE 0 END) as high_priority_count,
+        SUM(CASE WHEN optimization_priority LIKE '%Low%' THEN 1 ELSE 0 END) as low_priority_count
+    FROM {gold}.capacity_management
+    """,
+))
+
+# ==============================================================================
+# SCENARIO 2: DENIALS MANAGEMENT
+# ==============================================================================
+
+register(QueryTemplate(
+    "denials_management",
+    """
+    SELECT
+        payer_name,
+        payer_category,
+        denial_reason,
+        denial_priority,
+        drg_code,
+        primary_diagnosis_code,
+        denial_category,
+        total_denials,
+        total_appealed,
+        total_denied_amount,
+        successful_appeals,
+        partial_overturn_count,
+        recovered_amount,
+        partial_recovered_amount,
+        appeal_win_rate,
+        avg_denial_age,
+        priority_score
+    FROM {gold}.denials_management
+    WHERE (:payer IS NULL OR payer_name = :payer)
+    AND (:denial_category IS NULL OR denial_category = :denial_category)
+    {page}
+    """,
+    [Param("payer"), Param("denial_category")],
+    order=DENIALS_ORDER,
+))
+
+register(QueryTemplate(
+    "denials_summary",
+    """
+    SELECT
+        COUNT(*) as total_denial_groups,
+        SUM(total_denials) as total_denials,
+        SUM(total_appealed) as total_appealed,
+        ROUND(SUM(total_denied_amount), 2) as total_denied_amount,
+        ROUND(SUM(recovered_amount), 2) as total_recovered,
+        ROUND(AVG(appeal_win_rate), 2) as avg_win_rate,
+        ROUND(AVG(avg_denial_age), 1) as avg_denial_age_days
+    FROM {gold}.denials_management
+    """,
+))
+
+# ==============================================================================
+# SCENARIO 3: CLINICAL TRIAL MATCHING
+# ==============================================================================
+
+register(QueryTemplate(
+    "clinical_trial_matching",
+    """
+    SELECT
+        patient_id,
+        age,
+        gender,
+        primary_diagnosis,
+        biomarker_status,
+        kras_g12c_mutation,
+        pdl1_expression_pct,
+        latest_fev1,
+        fev1_category,
+        copd_severity,
+        kras_trial_eligible,
+        copd_trial_eligible,
+        pdl1_trial_eligible,
+        eligible_trial_count,
+        trial_match_priority
+    FROM {gold}.clinical_trial_matching
+    WHERE (NOT :eligible_only OR eligible_trial_count > 0)
+    AND (
+        :trial_type IS NULL
+        OR (:trial_type = 'KRAS' AND kras_trial_eligible = true)
+        OR (:trial_type = 'COPD' AND copd_trial_eligible = true)
+        OR (:trial_type = 'PDL1' AND pdl1_trial_eligible = true)
+    )
+    {page}
+    """,
+    [
+        Param("trial_type", choices=("KRAS", "COPD", "PDL1"), normalize=str.upper),
+        Param("eligible_only", "BOOLEAN", default=False),
+    ],
+    order=CLINICAL_TRIAL_ORDER,
+))
+
+register(QueryTemplate(
+    "clinical_trial_summary",
+    """
+    SELECT
+        COUNT(*) as total_patients,
+        SUM(CASE WHEN kras_trial_eligible THEN 1 ELSE 0 END) as kras_eligible,
+        SUM(CASE WHEN copd_trial_eligible THEN 1 ELSE 0 END) as copd_eligible,
+        SUM(CASE WHEN pdl1_trial_eligible THEN 1 ELSE 0 END) as pdl1_eligible,
+        SUM(CASE WHEN eligible_trial_count > 1 THEN 1 ELSE 0 END) as multi_trial_eligible,
+        ROUND(AVG(age), 1) as avg_patient_age
+    FROM {gold}.clinical_trial_matching
+    """,
+))
+
+# ==============================================================================
+# SCENARIO 4: TIMELY FILING & APPEALS
+# ==============================================================================
+
+register(QueryTemplate(
+    "timely_filing_appeals",
+    """
+    SELECT
+        claim_id,
+        patient_id,
+        payer_name,
+        drg_code,
+        billed_amount,
+        claim_submission_date,
+        filing_deadline,
+        days_to_deadline,
+        compliance_status,
+        is_at_risk,
+        denial_status,
+        denial_category,
+        appeal_deadline,
+        urgency_score,
+        at_risk_amount,
+        action_required
+    FROM {gold}.timely_filing_appeals
+    WHERE (
+        :urgency IS NULL
+        OR (:urgency = 'Critical' AND urgency_score >= 90)
+        OR (:urgency = 'High' AND urgency_score >= 70 AND urgency_score < 90)
+        OR (:urgency = 'Medium' AND urgency_score >= 40 AND urgency_score < 70)
+        OR (:urgency = 'Low' AND urgency_score < 40)
+    )
+    AND (:compliance_status IS NULL OR compliance_status = :compliance_status)
+    {page}
+    """,
+    [Param("urgency", choices=("Critical", "High", "Medium", "Low")), Param("compliance_status")],
+    order=TIMELY_FILING_ORDER,
+))
+
+register(QueryTemplate(
+    "timely_filing_summary",
+    """
+    SELECT
+        COUNT(*) as total_claims,
+        SUM(CASE WHEN is_at_risk THEN 1 ELSE 0 END) as at_risk_claims,
+        SUM(CASE WHEN urgency_score >= 90 THEN 1 ELSE 0 END) as critical_urgency,
+        SUM(CASE WHEN urgency_score >= 70 AND urgency_score < 90 THEN 1 ELSE 0 END) as high_urgency,
+        ROUND(SUM(at_risk_amount), 2) as total_at_risk_amount,
+        ROUND(AVG(days_to_deadline), 1) as avg_days_to_deadline,
+        SUM(CASE WHEN denial_status IS NOT NULL THEN 1 ELSE 0 END) as denied_claims
+    FROM {gold}.timely_filing_appeals
+    """,
+))
+
+# ==============================================================================
+# SCENARIO 5: DOCUMENTATION MANAGEMENT
+# ==============================================================================
+
+register(QueryTemplate(
+    "documentation_management",
+    """
+    SELECT
+        documentation_type,
+        payer_name,
+        drg_code,
+        request_urgency,
+        documentation_complexity,
+        total_requests,
+        completed_requests,
+        avg_turnaround_days,
+        associated_claims,
+        associated_claim_value,
+        completion_rate,
+        sla_compliance_score
+    FROM {gold}.documentation_management
+    WHERE (:doc_type IS NULL OR documentation_type = :doc_type)
+    AND (:payer IS NULL OR payer_name = :payer)
+    AND (:urgency IS NULL OR request_urgency = :urgency)
+    {page}
+    """,
+    [Param("doc_type"), Param("payer"), Param("urgency")],
+    order=DOCUMENTATION_ORDER,
+))
+
+register(QueryTemplate(
+    "documentation_summary",
+    """
+    SELECT
+        COUNT(*) as total_doc_groups,
+        SUM(total_requests) as total_requests,
+        SUM(completed_requests) as total_completed,
+        ROUND(AVG(avg_turnaround_days), 1) as overall_avg_turnaround,
+        ROUND(AVG(completion_rate), 2) as overall_completion_rate,
+        ROUND(AVG(sla_compliance_score), 2) as overall_sla_compliance,
+        ROUND(SUM(associated_claim_value), 2) as total_claim_value
+    FROM {gold}.documentation_management
+    """,
+))
+
+# ==============================================================================
+# UTILITY QUERIES
+# ==============================================================================
+
+register(QueryTemplate(
+    "payers",
+    """
+    SELECT DISTINCT payer_name
+    FROM (
+        SELECT payer_name FROM {gold}.denials_management
+        UNION
+        SELECT payer_name FROM {gold}.timely_filing_appeals
+        UNION
+        SELECT payer_name FROM {gold}.documentation_management
+    )
+    ORDER BY payer_name
+    """,
+))
+
+register(QueryTemplate(
+    "drg_codes",
+    """
+    SELECT DISTINCT drg_code
+    FROM (
+        SELECT drg_code FROM {gold}.capacity_management
+        UNION
+        SELECT drg_code FROM {gold}.denials_management
+        UNION
+        SELECT drg_code FROM {gold}.timely_filing_appeals
+    )
+    WHERE drg_code IS NOT NULL
+    ORDER BY drg_code
+    """,
+))
@@ -0,0 +1,210 @@
+"""
+Local replica of the gold layer
+Each r_health_gold table is snapshotted to Parquet and loaded into an embedded DuckDB database, so
+the registered query templates run in-process instead of on the SQL warehouse. Snapshots follow
+the gold Delta versions and the warehouse stays the fallback for anything the replica can't answer.
+"""
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import json
+import os
+import re
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .cache import GOLD_SCHEMA, GOLD_TABLES
+from .decode import ARROW_TYPES, decode_json_array, normalize_table
+from .queries import BoundQuery
+from .results import ResultSet, ResultStream
+from .warehouse import AsyncWarehouseClient
+
+if TYPE_CHECKING:
+    import duckdb
+
+# Directory for the Parquet snapshots; the replica is off unless this is set
+GOLD_REPLICA_DIR = os.getenv("GOLD_REPLICA_DIR")
+# Rows per chunk when a replica result is streamed
+REPLICA_STREAM_ROWS = 5000
+
+MANIFEST_FILE = "manifest.json"
+
+# :name markers (but not :: casts) -> DuckDB $name parameters
+_MARKER = re.compile(r"(?<![:\w]):(\w+)")
+_TYPE_NAMES = {arrow: name for name, arrow in reversed(list(ARROW_TYPES.items()))}
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _schema_columns(schema: pa.Schema) -> List[Dict[str, Any]]:
+    """Manifest-style columns for a replica result, so it looks like a warehouse ResultSet"""
+    return [{"name": field.name, "type_name": _TYPE_NAMES.get(field.type, "STRING")} for field in schema]
+
+
+def _align_types(table: pa.Table) -> pa.Table:
+    """DuckDB sums integers into HUGEINT (decimal(38, 0) in Arrow); the warehouse returns BIGINT"""
+    for index, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type) and field.type.scale == 0:
+            try:
+                table = table.set_column(index, field.name, table.column(index).cast(pa.int64()))
+            except pa.ArrowInvalid:
+                pass
+    return normalize_table(table)
+
+
+class GoldReplica:
+    """
+    Parquet snapshots of the gold tables served through DuckDB
+
+    `sync()` re-snapshots tables whose Delta version differs from the one on disk, then loads
+    every snapshot into a fresh in-memory DuckDB database and swaps it in. Queries hold on to
+    the database they started with, so a refresh never mixes versions within one statement.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.versions: Dict[str, Any] = {}
+        self.files: Dict[str, str] = {}
+        self.loaded_at: Optional[float] = None
+        self.queries = 0
+        self.fallbacks = 0
+        self._db: Optional["duckdb.DuckDBPyConnection"] = None
+        self._sync_lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._db is not None
+
+    def covers(self, query: BoundQuery) -> bool:
+        return self.ready and bool(query.tables) and query.tables <= set(self.files)
+
+    # ------------------------------------------------------------------ serving
+
+    def _run(self, statement: str, values: Dict[str, Any]) -> pa.Table:
+        # One cursor per call: DuckDB connections are not shared across threads
+        cursor = self._db.cursor()
+        try:
+            return cursor.execute(_MARKER.sub(r"$\1", statement), values).fetch_record_batch().read_all()
+        finally:
+            cursor.close()
+
+    async def execute(self, query: BoundQuery) -> ResultSet:
+        values = {name: value for name, (_, value) in query.params.items()}
+        table = _align_types(await asyncio.to_thread(self._run, query.statement, values))
+        self.queries += 1
+        return ResultSet(_schema_columns(table.schema), table)
+
+    async def stream(self, query: BoundQuery) -> ResultStream:
+        result = await self.execute(query)
+
+        async def chunks() -> AsyncIterator[pa.Table]:
+            for offset in range(0, result.num_rows, REPLICA_STREAM_ROWS):
+                yield result.table.slice(offset, REPLICA_STREAM_ROWS)
+
+        return ResultStream(result.schema_columns, chunks())
+
+    # ------------------------------------------------------------------ snapshots
+
+    def load(self) -> bool:
+        """Serve the snapshots already on disk (e.g. after a restart while the warehouse is down)"""
+        try:
+            with open(os.path.join(self.directory, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        files = {t: f for t, f in manifest.get("files", {}).items() if os.path.exists(os.path.join(self.directory, f))}
+        if not files:
+            return False
+        self._swap(files, {t: v for t, v in manifest.get("versions", {}).items() if t in files})
+        print(f"Gold replica loaded {len(files)} tables from {self.directory}")
+        return True
+
+    async def sync(self, warehouse: AsyncWarehouseClient, versions: Dict[str, Any]) -> List[str]:
+        """Snapshot tables whose gold version moved (or that have no snapshot yet); returns them"""
+        async with self._sync_lock:
+            stale = [
+                table for table in GOLD_TABLES
+                if versions.get(table) is not None and (table not in self.files or self.versions.get(table) != versions[table])
+            ]
+            if not stale:
+                return []
+
+            os.makedirs(self.directory, exist_ok=True)
+            files, new_versions = dict(self.files), dict(self.versions)
+            for table in stale:
+                try:
+                    files[table] = await self._snapshot(warehouse, table, versions[table])
+                    new_versions[table] = versions[table]
+                except Exception as e:
+                    # Keep serving the previous snapshot of this table
+                    print(f"Gold replica snapshot of {table} failed: {str(e)[:200]}")
+
+            refreshed = [table for table in stale if files.get(table) != self.files.get(table)]
+            if refreshed:
+                superseded = [self.files[t] for t in refreshed if t in self.files]
+                await asyncio.to_thread(self._swap, files, new_versions)
+                self._write_manifest()
+                for name in superseded:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+                print(f"Gold replica refreshed {refreshed}")
+            return refreshed
+
+    async def _snapshot(self, warehouse: AsyncWarehouseClient, table: str, version: Any) -> str:
+        """Stream a gold table into a Parquet file; written under a temporary name, then renamed"""
+        name = f"{table}.v{version}.parquet"
+        path = os.path.join(self.directory, name)
+        stream = await warehouse.open_stream(f"SELECT * FROM {GOLD_SCHEMA}.{table}")
+        writer = None
+        try:
+            async for chunk in stream:
+                if writer is None:
+                    writer = pq.ParquetWriter(path + ".tmp", chunk.schema)
+                writer.write_table(chunk)
+            if writer is None:
+                writer = pq.ParquetWriter(path + ".tmp", decode_json_array(stream.schema_columns, []).schema)
+        finally:
+            await stream.aclose()
+            if writer is not None:
+                writer.close()
+        os.replace(path + ".tmp", path)
+        return name
+
+    def _swap(self, files: Dict[str, str], versions: Dict[str, Any]):
+        """Load every snapshot into a new in-memory database under the gold schema name, then swap it in"""
+        import duckdb  # only loaded when GOLD_REPLICA_DIR is set
+
+        catalog, schema = GOLD_SCHEMA.split(".", 1)
+        db = duckdb.connect()
+        db.execute(f"ATTACH ':memory:' AS {_quote(catalog)}")
+        db.execute(f"CREATE SCHEMA {_quote(catalog)}.{_quote(schema)}")
+        for table, name in files.items():
+            path = os.path.join(self.directory, name).replace("'", "''")
+            db.execute(f"CREATE TABLE {_quote(catalog)}.{_quote(schema)}.{_quote(table)} AS SELECT * FROM read_parquet('{path}')")
+
+        # The old database is released once the queries still running on it finish
+        self._db = db
+        self.files, self.versions = files, versions
+        self.loaded_at = time.time()
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"files": self.files, "versions": self.versions}, f, default=str)
+        os.replace(path + ".tmp", path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "directory": self.directory,
+            "tables": sorted(self.files),
+            "versions": self.versions,
+            "loaded_at": self.loaded_at,
+            "queries": self.queries,
+            "fallbacks": self.fallbacks,
+        }
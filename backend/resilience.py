@@ -0,0 +1,293 @@
+"""
+Retries, circuit breaker and hedged requests for warehouse calls
+Transient Statement Execution API errors (429, 502-504, dropped connections) are retried with
+jittered exponential backoff, repeated failures open a breaker that fails fast while the query
+service answers from expired cache entries, and latency-critical queries can hedge with a
+second statement. Retry and hedge settings are set per query template.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+
+# Retries per warehouse API call for transient errors (0 disables)
+WAREHOUSE_RETRIES = int(os.getenv("WAREHOUSE_RETRIES", "3"))
+WAREHOUSE_RETRY_BASE = float(os.getenv("WAREHOUSE_RETRY_BASE", "0.5"))
+WAREHOUSE_RETRY_MAX = float(os.getenv("WAREHOUSE_RETRY_MAX", "8"))
+# Seconds before an interactive query (summary, lookup) sends a hedge statement (0 disables)
+WAREHOUSE_HEDGE_AFTER = float(os.getenv("WAREHOUSE_HEDGE_AFTER", "0"))
+# Consecutive failed calls that open the breaker, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+# Per-template overrides, e.g. {"denials_summary": {"retries": 1, "hedge_after": 1.5}}
+WAREHOUSE_ENDPOINT_POLICIES: Dict[str, Dict[str, Any]] = json.loads(os.getenv("WAREHOUSE_ENDPOINT_POLICIES") or "{}")
+
+TRANSIENT_STATUS = (429, 502, 503, 504)
+
+RESILIENCE_STATS: Dict[str, int] = {"retries": 0, "retries_exhausted": 0, "hedges": 0, "hedge_wins": 0}
+
+
+class WarehouseUnavailable(Exception):
+    """The warehouse is throttling or unreachable; the caller should answer 503 with Retry-After"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _status_error_response(exc: BaseException) -> Optional[Any]:
+    """Response of an HTTP error status from httpx or, for the sync client, requests"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response
+    requests = sys.modules.get("requests")  # only loaded by the layer scripts
+    if requests is not None and isinstance(exc, requests.HTTPError):
+        return exc.response
+    return None
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Throttling, gateway errors and dropped connections: worth another try"""
+    response = _status_error_response(exc)
+    if response is not None:
+        return response.status_code in TRANSIENT_STATUS
+    if isinstance(exc, httpx.TransportError):
+        return True
+    requests = sys.modules.get("requests")
+    return requests is not None and isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+def retry_after_hint(exc: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After response header, if the server sent one"""
+    response = _status_error_response(exc)
+    if response is not None:
+        try:
+            return float(response.headers["retry-after"])
+        except (KeyError, ValueError):
+            return None
+    return None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter
+
+    Attempt n sleeps a random time up to min(max_delay, base_delay * 2**n), or the server's
+    Retry-After when that is longer. A Retry-After beyond max_delay is not waited out: the error
+    is raised so the caller can fail fast instead.
+    """
+
+    def __init__(self, retries: int = WAREHOUSE_RETRIES, base_delay: float = WAREHOUSE_RETRY_BASE, max_delay: float = WAREHOUSE_RETRY_MAX):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, hint: Optional[float] = None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, hint or 0.0)
+
+    def _retry_delay(self, attempt: int, exc: Exception) -> Optional[float]:
+        """Seconds to wait before retrying after `exc`, or None when it should be raised"""
+        if not is_transient(exc):
+            return None
+        hint = retry_after_hint(exc)
+        if attempt >= self.retries or (hint is not None and hint > self.max_delay):
+            if self.retries:
+                RESILIENCE_STATS["retries_exhausted"] += 1
+            return None
+        RESILIENCE_STATS["retries"] += 1
+        return self.delay(attempt, hint)
+
+    async def run(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def run_sync(self, fn: Callable[[], Any]) -> Any:
+        """`run` for the blocking client of the layer scripts"""
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise
+            attempt += 1
+            time.sleep(delay)
+
+
+NO_RETRY = RetryPolicy(retries=0)
+DEFAULT_RETRY = RetryPolicy()
+
+
+class EndpointPolicy:
+    """Retry and hedging settings of one query template"""
+
+    def __init__(self, retry: RetryPolicy = DEFAULT_RETRY, hedge_after: float = 0.0):
+        self.retry = retry
+        self.hedge_after = hedge_after
+
+    @classmethod
+    def for_template(cls, name: str, interactive: bool) -> "EndpointPolicy":
+        """Defaults (interactive templates hedge) with the WAREHOUSE_ENDPOINT_POLICIES override applied"""
+        override = WAREHOUSE_ENDPOINT_POLICIES.get(name, {})
+        retry = DEFAULT_RETRY
+        if "retries" in override:
+            retry = RetryPolicy(retries=int(override["retries"]))
+        hedge_after = WAREHOUSE_HEDGE_AFTER if interactive else 0.0
+        return cls(retry, float(override.get("hedge_after", hedge_after)))
+
+
+async def hedged(
+    attempt: Callable[[], Awaitable[Any]],
+    delay: float,
+    allow: Callable[[], bool] = lambda: True,
+) -> Any:
+    """
+    Run `attempt`; if it hasn't finished after `delay` seconds, race a second `attempt` against it
+
+    The first success wins and the other attempt is cancelled (which cancels its statement).
+    A failure only counts once both attempts have failed. `allow` is asked when the hedge is
+    due, so no second statement is sent while the warehouse has no spare capacity for it.
+    """
+    tasks: List[asyncio.Future] = [asyncio.ensure_future(attempt())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not allow():
+            return await tasks[0]
+        RESILIENCE_STATS["hedges"] += 1
+        tasks.append(asyncio.ensure_future(attempt()))
+
+        pending, error = list(tasks), None
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.remove(task)
+                if task.exception() is None:
+                    if task is tasks[1]:
+                        RESILIENCE_STATS["hedge_wins"] += 1
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+class CircuitBreaker:
+    """
+    Fails fast once the warehouse keeps failing
+
+    CLOSED counts consecutive failures as judged by `is_failure`; other errors (a failed SQL
+    statement, an admission rejection) neither count nor reset the count. At
+    `failure_threshold` it opens and every call raises WarehouseUnavailable for `reset_timeout`
+    seconds. Then one probe call is let through (HALF_OPEN): success closes the breaker,
+    failure opens it again. Transient errors that survive the retries are raised as
+    WarehouseUnavailable too, so endpoints answer 503 rather than 500.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+        is_failure: Callable[[BaseException], bool] = is_transient,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "CLOSED"
+        return "OPEN" if time.monotonic() - self.opened_at < self.reset_timeout else "HALF_OPEN"
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != "CLOSED"
+
+    def _retry_after(self) -> int:
+        if self.opened_at is None:
+            return 1
+        return max(1, int(self.reset_timeout - (time.monotonic() - self.opened_at) + 0.999))
+
+    def _admit(self) -> bool:
+        """True when this call is the half-open probe"""
+        state = self.state
+        if state == "CLOSED":
+            return False
+        if state == "HALF_OPEN" and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        raise WarehouseUnavailable("Warehouse is unavailable (circuit open)", self._retry_after())
+
+    def _record(self, failed: bool):
+        if not failed:
+            self.failures = 0
+            if self.opened_at is not None:
+                print("Warehouse circuit closed")
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                print(f"Warehouse circuit opened after {self.failures} consecutive failures")
+                self.opened += 1
+            self.opened_at = time.monotonic()
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await fn()
+        probe = self._admit()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failed = self.is_failure(e)
+            if failed:
+                self._record(True)
+            if failed and is_transient(e):
+                hint = retry_after_hint(e)
+                retry_after = int(hint) if hint else self._retry_after() if self.is_open else 1
+                raise WarehouseUnavailable(f"Warehouse unavailable: {str(e)[:200]}", max(retry_after, 1)) from e
+            raise
+        else:
+            self._record(False)
+            return result
+        finally:
+            if probe:
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout_seconds": self.reset_timeout,
+            "times_opened": self.opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,95 @@
+"""
+Statement results as returned to the API layer
+Inline JSON_ARRAY rows and Arrow chunks from EXTERNAL_LINKS both end up as one typed Arrow table
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import pyarrow as pa
+
+from .decode import decode_json_array, json_ready, normalize_table
+
+
+def read_arrow_stream(payload: bytes) -> pa.Table:
+    """Decode one ARROW_STREAM chunk without copying the downloaded bytes"""
+    with pa.ipc.open_stream(pa.py_buffer(payload)) as reader:
+        return reader.read_all()
+
+
+class ResultSet:
+    """Typed Arrow table of a SUCCEEDED statement, however its rows were transferred"""
+
+    def __init__(self, schema_columns: List[Dict[str, Any]], table: pa.Table):
+        self.schema_columns = schema_columns
+        self.table = table
+        self._records: Optional[List[Dict[str, Any]]] = None
+        # Seconds since the rows were fetched, when served as a last-known result
+        self.staleness: Optional[float] = None
+
+    @classmethod
+    def from_manifest(
+        cls,
+        manifest: Dict[str, Any],
+        data_array: Optional[List[List[Any]]] = None,
+        tables: Optional[List[pa.Table]] = None,
+    ) -> "ResultSet":
+        schema_columns = manifest.get("schema", {}).get("columns", [])
+        if tables:
+            # Chunks keep their own buffers; concatenation only stitches chunk lists together
+            table = normalize_table(pa.concat_tables(tables) if len(tables) > 1 else tables[0])
+        else:
+            table = decode_json_array(schema_columns, data_array or [])
+        return cls(schema_columns, table)
+
+    def as_stale(self, age: float) -> "ResultSet":
+        """Copy flagged as `age` seconds old; the cached original is left untouched"""
+        stale = ResultSet(self.schema_columns, self.table)
+        stale._records = self._records
+        stale.staleness = age
+        return stale
+
+    @property
+    def columns(self) -> List[str]:
+        return self.table.column_names
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.num_rows
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Row objects for the default JSON response (built once, then shared by cache hits)"""
+        if self._records is None:
+            self._records = json_ready(self.table).to_pylist()
+        return self._records
+
+    def to_columnar(self) -> Dict[str, Any]:
+        """{"columns": [...], "data": {column: [values]}} - one list per column, no per-row dicts"""
+        table = json_ready(self.table)
+        return {
+            "columns": table.column_names,
+            "data": {name: column.to_pylist() for name, column in zip(table.column_names, table.columns)},
+        }
+
+    def to_arrow_ipc(self) -> bytes:
+        """The typed table as an Arrow IPC stream"""
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, self.table.schema) as writer:
+            writer.write_table(self.table)
+        return sink.getvalue().to_pybytes()
+
+
+class ResultStream:
+    """Result of a SUCCEEDED statement yielded one Arrow chunk at a time, as each is downloaded"""
+
+    def __init__(self, schema_columns: List[Dict[str, Any]], chunks: AsyncIterator[pa.Table]):
+        self.schema_columns = schema_columns
+        self._chunks = chunks
+
+    @property
+    def columns(self) -> List[str]:
+        return [col["name"] for col in self.schema_columns]
+
+    def __aiter__(self) -> AsyncIterator[pa.Table]:
+        return self._chunks
+
+    async def aclose(self):
+        await self._chunks.aclose()
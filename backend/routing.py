@@ -0,0 +1,252 @@
+"""
+Routing statements across several SQL warehouses
+WAREHOUSES lists warehouse ids with roles and weights, e.g. "abc123:interactive:2,def456:bulk,
+789aaa:pipeline". Summaries, lookups and lists run on interactive warehouses, exports and replica
+snapshots on bulk ones, and the pipeline scripts use the pipeline warehouse. Within a role the
+least loaded warehouse gets the statement, and stopped or failing warehouses are skipped.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+import os
+import time
+
+from .admission import PRIORITY_EXPORT
+from .resilience import RetryPolicy, is_transient
+from .results import ResultSet, ResultStream
+from .warehouse import DEFAULT_POLICY, AsyncWarehouseClient, ExecutionPolicy
+from .warehouse_monitor import WarehouseMonitor
+
+# "id[:role+role[:weight]],..."; unset routes everything to WAREHOUSE_ID
+WAREHOUSES = os.getenv("WAREHOUSES")
+# How long a warehouse that kept failing is skipped (seconds)
+WAREHOUSE_FAILOVER_COOLDOWN = float(os.getenv("WAREHOUSE_FAILOVER_COOLDOWN", "60"))
+
+ROLE_INTERACTIVE = "interactive"
+ROLE_BULK = "bulk"
+ROLE_PIPELINE = "pipeline"
+ROLES = (ROLE_INTERACTIVE, ROLE_BULK, ROLE_PIPELINE)
+# Roles of a warehouse listed without any; pipeline warehouses are always named explicitly
+API_ROLES = (ROLE_INTERACTIVE, ROLE_BULK)
+
+
+def role_for(priority: int) -> str:
+    """Exports are bulk work; summaries, lookups and paginated lists are interactive"""
+    return ROLE_BULK if priority >= PRIORITY_EXPORT else ROLE_INTERACTIVE
+
+
+def parse_warehouses(spec: str) -> List[Tuple[str, Tuple[str, ...], float]]:
+    """[(warehouse_id, roles, weight)] from a WAREHOUSES spec"""
+    warehouses = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        fields = item.split(":")
+        if len(fields) > 3 or not fields[0]:
+            raise ValueError(f"Invalid WAREHOUSES entry: {item!r}")
+        roles = tuple(fields[1].split("+")) if len(fields) > 1 and fields[1] else API_ROLES
+        unknown = set(roles) - set(ROLES)
+        if unknown:
+            raise ValueError(f"Unknown warehouse role(s) in {item!r}: {', '.join(sorted(unknown))}")
+        weight = float(fields[2]) if len(fields) > 2 else 1.0
+        if weight <= 0:
+            raise ValueError(f"Warehouse weight must be positive: {item!r}")
+        warehouses.append((fields[0], roles, weight))
+    return warehouses
+
+
+def pipeline_warehouse_id(default: str, spec: Optional[str] = WAREHOUSES) -> str:
+    """Warehouse the pipeline scripts should use: the first pipeline warehouse in WAREHOUSES, if any"""
+    for warehouse_id, roles, _ in parse_warehouses(spec or ""):
+        if ROLE_PIPELINE in roles:
+            return warehouse_id
+    return default
+
+
+class WarehouseTarget:
+    """One warehouse the router can send statements to, with its own state monitor"""
+
+    def __init__(
+        self,
+        client: AsyncWarehouseClient,
+        roles: Sequence[str] = API_ROLES,
+        weight: float = 1.0,
+        monitor: Optional[WarehouseMonitor] = None,
+    ):
+        self.client = client
+        self.roles = tuple(roles)
+        self.weight = weight
+        self.monitor = monitor if monitor is not None else WarehouseMonitor(client)
+        if ROLE_INTERACTIVE not in self.roles:
+            self.monitor.keep_warm = None  # business-hours keep-warm is for the warehouses users wait on
+        self.routed = 0
+        self.failures = 0
+        self.failed_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def warehouse_id(self) -> str:
+        return self.client.warehouse_id
+
+    @property
+    def load(self) -> float:
+        """Statements in flight plus those the warehouse still has queued, per unit of weight"""
+        return (self.client.in_flight + self.client.queued) / self.weight
+
+    def available(self, cooldown: float = WAREHOUSE_FAILOVER_COOLDOWN) -> bool:
+        if self.monitor.cold:
+            return False
+        return self.failed_at is None or time.monotonic() - self.failed_at >= cooldown
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.warehouse_id,
+            "roles": list(self.roles),
+            "weight": self.weight,
+            "state": self.monitor.state,
+            "available": self.available(),
+            "in_flight": self.client.in_flight,
+            "queued": self.client.queued,
+            "routed": self.routed,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class WarehouseRouter:
+    """
+    Picks a warehouse per statement and fails over between them
+
+    Candidates are the available warehouses with the statement's role; when none is available
+    (stopped, starting, or failing within the cooldown), any available interactive or bulk
+    warehouse takes it, and only then a cold one with the role (the statement starts it). Among
+    candidates the lowest `load` wins, ties going to the warehouse that has had the fewest
+    statements per unit of weight. A statement that fails with a transient error after its
+    retries is resubmitted on the next candidate.
+
+    The router offers the execute / open_stream calls of AsyncWarehouseClient (plus a role), so
+    the replica and the version watcher use it like a single client.
+    """
+
+    def __init__(
+        self,
+        targets: Sequence[WarehouseTarget],
+        cooldown: float = WAREHOUSE_FAILOVER_COOLDOWN,
+        pool_owner: Optional[AsyncWarehouseClient] = None,
+    ):
+        if not targets:
+            raise ValueError("At least one warehouse is required")
+        self.targets = list(targets)
+        self.cooldown = cooldown
+        # Client whose connection pool the others share; closed last
+        self.pool_owner = pool_owner
+        self.failovers = 0
+        self.primary = next((t for t in self.targets if ROLE_INTERACTIVE in t.roles), self.targets[0])
+
+    @classmethod
+    def from_client(
+        cls,
+        client: AsyncWarehouseClient,
+        spec: Optional[str] = WAREHOUSES,
+        monitor: Optional[WarehouseMonitor] = None,
+    ) -> "WarehouseRouter":
+        """Router over the WAREHOUSES spec, or over `client` alone when there is none"""
+        if not spec:
+            return cls([WarehouseTarget(client, ROLES, monitor=monitor)])
+        targets = []
+        for warehouse_id, roles, weight in parse_warehouses(spec):
+            if warehouse_id == client.warehouse_id:
+                targets.append(WarehouseTarget(client, roles, weight, monitor=monitor))
+            else:
+                targets.append(WarehouseTarget(client.sibling(warehouse_id), roles, weight))
+        return cls(targets, pool_owner=client)
+
+    @property
+    def cold(self) -> bool:
+        """No interactive warehouse is up, so interactive callers would wait out a cold start"""
+        interactive = [t for t in self.targets if ROLE_INTERACTIVE in t.roles] or [self.primary]
+        return all(t.monitor.cold for t in interactive)
+
+    def pick(self, role: str, exclude: Sequence[WarehouseTarget] = ()) -> Optional[WarehouseTarget]:
+        remaining = [t for t in self.targets if t not in exclude]
+        available = [t for t in remaining if t.available(self.cooldown)]
+        candidates = (
+            [t for t in available if role in t.roles]
+            or ([t for t in available if set(t.roles) & set(API_ROLES)] if role in API_ROLES else [])
+            or [t for t in remaining if role in t.roles]
+        )
+        if not candidates:
+            return None
+        return min(candidates, key=lambda t: (t.load, t.routed / t.weight))
+
+    async def _route(self, role: str, call: Callable[[AsyncWarehouseClient], Awaitable[Any]]) -> Any:
+        tried: List[WarehouseTarget] = []
+        target = self.pick(role)
+        if target is None:
+            raise ValueError(f"No warehouse has the {role} role")
+        while True:
+            target.routed += 1
+            try:
+                result = await call(target.client)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                target.failures += 1
+                target.failed_at = time.monotonic()
+                target.last_error = str(e)[:200]
+                tried.append(target)
+                target = self.pick(role, exclude=tried)
+                if target is None:
+                    raise
+                self.failovers += 1
+                print(f"Warehouse {tried[-1].warehouse_id} failing, retrying on {target.warehouse_id}: {str(e)[:200]}")
+                continue
+            target.failed_at = None
+            target.monitor.note_activity()
+            return result
+
+    async def execute(
+        self,
+        statement: str,
+        policy: ExecutionPolicy = DEFAULT_POLICY,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        row_limit: Optional[int] = None,
+        retry: Optional[RetryPolicy] = None,
+        role: str = ROLE_INTERACTIVE,
+    ) -> ResultSet:
+        return await self._route(role, lambda client: client.execute(statement, policy, parameters, row_limit, retry))
+
+    async def open_stream(
+        self,
+        statement: str,
+        policy: ExecutionPolicy = DEFAULT_POLICY,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        retry: Optional[RetryPolicy] = None,
+        role: str = ROLE_BULK,
+    ) -> ResultStream:
+        return await self._route(role, lambda client: client.open_stream(statement, policy, parameters, retry))
+
+    def runtime_stats(self) -> Dict[str, Any]:
+        """Cancellation counters summed over every warehouse"""
+        totals: Dict[str, Any] = {}
+        for target in self.targets:
+            for name, value in target.client.runtimes.stats().items():
+                totals[name] = round(totals.get(name, 0) + value, 1)
+        return totals
+
+    def start(self):
+        for target in self.targets:
+            target.monitor.start()
+
+    def stop(self):
+        for target in self.targets:
+            target.monitor.stop()
+
+    async def aclose(self):
+        for target in self.targets:
+            await target.client.aclose()
+        if self.pool_owner is not None and all(t.client is not self.pool_owner for t in self.targets):
+            await self.pool_owner.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "failovers": self.failovers,
+            "warehouses": [t.snapshot() for t in self.targets],
+            "roles": {role: [t.warehouse_id for t in self.targets if role in t.roles] for role in ROLES},
+        }
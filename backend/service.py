@@ -0,0 +1,354 @@
+"""
+Query service shared by the R_Health backends
+Sits between the endpoints and the warehouse client: the optional local gold replica, result
+caching (in-process, plus an optional tier shared by all workers), gold-refresh invalidation and
+single-flight coalescing of identical concurrent statements, and the circuit breaker, hedged
+statements and warehouse routing in front of the SQL warehouses
+"""
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+import asyncio
+import os
+import time
+
+from .admission import PRIORITY_EXPORT, AdmissionController
+from .attribution import CostCollector
+from .cache import GOLD_SCHEMA, GOLD_TABLES, ResultCache
+from .metrics import QUERY_NAME, SERVED, observe_phase
+from .queries import QUERIES, BoundQuery
+from .replica import GOLD_REPLICA_DIR, GoldReplica
+from .resilience import CircuitBreaker, WarehouseUnavailable, hedged, is_transient
+from .routing import ROLE_BULK, WarehouseRouter, role_for
+from .results import ResultSet, ResultStream
+from .shared_cache import SHARED_CACHE_PATH, SharedResultCache
+from .singleflight import SingleFlight
+from .warehouse import AsyncWarehouseClient, StatementTimeoutError
+from .warehouse_monitor import WarehouseMonitor
+
+# How often to compare gold table Delta versions (seconds, 0 disables the watcher)
+GOLD_VERSION_CHECK_INTERVAL = float(os.getenv("GOLD_VERSION_CHECK_INTERVAL", "60"))
+# Longest gap between version checks while no requests arrive (the interval doubles up to it)
+GOLD_VERSION_CHECK_MAX_INTERVAL = float(os.getenv("GOLD_VERSION_CHECK_MAX_INTERVAL", "600"))
+# Templates run with their default parameters at startup so the first page loads are cache hits:
+# "all", comma separated template names, or empty to disable
+STARTUP_PREWARM = os.getenv("STARTUP_PREWARM", "all")
+
+
+def _is_outage(exc: BaseException) -> bool:
+    """Failures that say the warehouse is unhealthy (not that a statement was wrong)"""
+    return is_transient(exc) or isinstance(exc, StatementTimeoutError)
+
+
+class QueryService:
+    """
+    Runs gold-layer queries for the API, serving repeats from the result cache
+
+    Cache misses for the same key that arrive while a statement is already running share that
+    statement instead of submitting their own (single-flight).
+
+    A background task reads the latest Delta version of each gold table (DESCRIBE HISTORY ...
+    LIMIT 1, a metadata-only lookup) and drops cached results for tables whose version moved.
+    Those lookups are statements too, so the task never sends them to a stopped or starting
+    warehouse, outside the keep-warm window, or when nothing it could refresh is held, and backs
+    off while no requests arrive; otherwise the warehouse would never auto-stop.
+
+    With a replica (GOLD_REPLICA_DIR), the same task re-snapshots changed tables and queries are
+    answered locally by DuckDB; the warehouse path is only used when the replica can't answer.
+
+    With a shared cache (SHARED_CACHE_PATH), an in-process miss checks the store shared by the
+    other workers before going to the warehouse, and every warehouse result is written back to it.
+
+    While the warehouse monitors report every interactive warehouse stopped or starting, a cache miss that
+    still has an expired entry is answered with it (flagged with its age) and the fresh result is
+    fetched in the background, instead of making the caller wait out the cold start.
+
+    Every statement the API sends to the warehouse first takes a slot from the admission
+    controller (in-flight cap, priorities, per-client fairness); cache and replica hits don't.
+
+    Warehouse calls go through a circuit breaker. While it is open they fail fast with
+    WarehouseUnavailable and, as during a cold start, expired cache entries are served instead.
+    Templates with a hedge delay send a second statement when the first is slow and the
+    admission controller has a free slot; the loser is cancelled.
+
+    Statements are sent through the warehouse router (WAREHOUSES): interactive queries to the
+    interactive warehouses, exports and replica snapshots to the bulk ones. Without a
+    WAREHOUSES spec every statement goes to `warehouse`.
+
+    Every statement sent is tagged with the request's route and query template; `costs` reads
+    their warehouse time, bytes scanned and rows produced from Query History.
+
+    At startup the templates in `prewarm` are run in the background with their default
+    parameters (what each page loads first) unless the warehouse is stopped or starting, so a
+    new worker doesn't send its first users to the warehouse. Users who arrive before that
+    finishes share the statements in flight.
+    """
+
+    def __init__(
+        self,
+        warehouse: AsyncWarehouseClient,
+        cache: Optional[ResultCache] = None,
+        version_check_interval: float = GOLD_VERSION_CHECK_INTERVAL,
+        replica: Optional[GoldReplica] = None,
+        shared_cache: Optional[SharedResultCache] = None,
+        monitor: Optional[WarehouseMonitor] = None,
+        admission: Optional[AdmissionController] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        router: Optional[WarehouseRouter] = None,
+        prewarm: str = STARTUP_PREWARM,
+    ):
+        self.warehouse = warehouse
+        self.router = router if router is not None else WarehouseRouter.from_client(warehouse, monitor=monitor)
+        self.cache = cache if cache is not None else ResultCache()
+        self.replica = replica if replica is not None else (GoldReplica(GOLD_REPLICA_DIR) if GOLD_REPLICA_DIR else None)
+        if shared_cache is None and SHARED_CACHE_PATH:
+            shared_cache = SharedResultCache(SHARED_CACHE_PATH)
+        self.shared_cache = shared_cache
+        self.monitor = self.router.primary.monitor
+        self.admission = admission if admission is not None else AdmissionController()
+        self.breaker = breaker if breaker is not None else CircuitBreaker(is_failure=_is_outage)
+        self.version_check_interval = version_check_interval
+        self.last_request = 0.0
+        self.singleflight = SingleFlight()
+        self.costs = CostCollector(self.router.primary.client)
+        self.gold_versions: Dict[str, Any] = {}
+        self.prewarm = sorted(QUERIES) if prewarm.strip() == "all" else [name.strip() for name in prewarm.split(",") if name.strip()]
+        self.prewarm_status = "pending"
+        self._watcher: Optional[asyncio.Task] = None
+        self._startup_task: Optional[asyncio.Task] = None
+        self._prewarm_task: Optional[asyncio.Task] = None
+        self._refreshes: Set[asyncio.Task] = set()
+
+    async def execute(self, query: BoundQuery) -> List[Dict[str, Any]]:
+        return (await self.execute_result(query)).to_records()
+
+    async def execute_result(self, query: BoundQuery) -> ResultSet:
+        """Decoded result of `query`; the cache holds the typed table so any response format can be served"""
+        QUERY_NAME.set(query.name)
+        self.last_request = time.monotonic()
+        if self.replica and self.replica.covers(query):
+            try:
+                return await self._from_replica(query)
+            except Exception as e:
+                self.replica.fallbacks += 1
+                print(f"Gold replica failed for {query.name}, using the warehouse: {str(e)[:200]}")
+
+        key = query.key
+        found, result = self.cache.get(key)
+        if found:
+            SERVED.inc(query=query.name, source="cache")
+            return result
+
+        if self.router.cold or self.breaker.is_open:
+            found, result, age = self.cache.get_stale(key)
+            if found:
+                SERVED.inc(query=query.name, source="stale")
+                self._revalidate(key, query)
+                return result.as_stale(age)
+
+        return await self.singleflight.do(key, lambda: self._fetch(key, query))
+
+    def _revalidate(self, key, query: BoundQuery):
+        """Refresh a stale entry in the background; single-flight keeps it to one statement per key"""
+
+        async def refresh():
+            try:
+                await self.singleflight.do(key, lambda: self._fetch(key, query))
+            except WarehouseUnavailable:
+                pass  # circuit still open; the next stale hit tries again
+            except Exception as e:
+                print(f"Background refresh of {query.name} failed: {str(e)[:200]}")
+
+        # Keep a reference so the refresh isn't garbage collected mid-flight
+        task = asyncio.create_task(refresh())
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def _from_replica(self, query: BoundQuery) -> ResultSet:
+        started = time.perf_counter()
+        result = await self.replica.execute(query)
+        observe_phase("replica", time.perf_counter() - started)
+        SERVED.inc(query=query.name, source="replica")
+        return result
+
+    @asynccontextmanager
+    async def _slot(self, priority: int) -> AsyncIterator[None]:
+        waiting = time.perf_counter()
+        async with self.admission.slot(priority):
+            observe_phase("admission", time.perf_counter() - waiting)
+            yield
+
+    async def stream(self, query: BoundQuery) -> ResultStream:
+        """Chunked result for streaming responses; bypasses the cache so memory stays bounded"""
+        QUERY_NAME.set(query.name)
+        self.last_request = time.monotonic()
+        if self.replica and self.replica.covers(query):
+            try:
+                stream = await self.replica.stream(query)
+                SERVED.inc(query=query.name, source="replica")
+                return stream
+            except Exception as e:
+                self.replica.fallbacks += 1
+                print(f"Gold replica failed for {query.name}, using the warehouse: {str(e)[:200]}")
+        SERVED.inc(query=query.name, source="warehouse")
+        return await self.breaker.call(lambda: self._open_stream(query))
+
+    async def _open_stream(self, query: BoundQuery) -> ResultStream:
+        # The slot covers running the statement; chunk downloads afterwards don't load the warehouse
+        async with self._slot(PRIORITY_EXPORT):
+            return await self.router.open_stream(
+                query.statement, parameters=query.parameters, retry=query.policy.retry, role=ROLE_BULK
+            )
+
+    async def _run(self, query: BoundQuery) -> ResultSet:
+        async def attempt() -> ResultSet:
+            async with self._slot(query.priority):
+                return await self.router.execute(
+                    query.statement,
+                    parameters=query.parameters,
+                    row_limit=query.row_limit,
+                    retry=query.policy.retry,
+                    role=role_for(query.priority),
+                )
+
+        if query.policy.hedge_after > 0:
+            return await hedged(attempt, query.policy.hedge_after, allow=lambda: self.admission.has_capacity)
+        return await attempt()
+
+    async def _fetch(self, key, query: BoundQuery) -> ResultSet:
+        if self.shared_cache:
+            found, result = await asyncio.to_thread(self.shared_cache.get, key, self.gold_versions)
+            if found:
+                SERVED.inc(query=query.name, source="shared_cache")
+                self.cache.set(key, result, query.tables)
+                return result
+
+        SERVED.inc(query=query.name, source="warehouse")
+        result = await self.breaker.call(lambda: self._run(query))
+        self.cache.set(key, result, query.tables)
+        if self.shared_cache:
+            await asyncio.to_thread(self.shared_cache.set, key, result, query.tables, self.gold_versions)
+        return result
+
+    async def _table_version(self, table: str) -> Any:
+        QUERY_NAME.set("gold_version_check")  # runs in its own task (gather), so this stays local
+        result = await self.breaker.call(lambda: self.router.execute(f"DESCRIBE HISTORY {GOLD_SCHEMA}.{table} LIMIT 1"))
+        rows = result.to_records()
+        return rows[0]["version"] if rows else None
+
+    async def check_gold_versions(self) -> List[str]:
+        """Refresh known gold table versions, invalidate tables that changed and re-snapshot the replica"""
+        versions = await asyncio.gather(*(self._table_version(t) for t in GOLD_TABLES), return_exceptions=True)
+
+        changed = []
+        for table, version in zip(GOLD_TABLES, versions):
+            if isinstance(version, Exception):
+                print(f"Gold version check failed for {table}: {str(version)[:200]}")
+                continue
+            previous = self.gold_versions.get(table)
+            self.gold_versions[table] = version
+            if previous is not None and previous != version:
+                changed.append(table)
+
+        if changed:
+            dropped = self.cache.invalidate(changed)
+            if self.shared_cache:
+                dropped += await asyncio.to_thread(self.shared_cache.invalidate, changed)
+            print(f"Gold tables changed {changed}: invalidated {dropped} cached results")
+        if self.replica:
+            await self.replica.sync(self.router, self.gold_versions)
+        return changed
+
+    def _version_check_due(self) -> bool:
+        """Whether a version check is worth its statements right now"""
+        if self.router.cold:
+            return False  # don't wake it; stale entries are served until it is back
+        if self.monitor.keep_warm and not self.monitor.keep_warm.contains():
+            return False  # let it auto-stop; the TTL and the gold layer's invalidate call still apply
+        # Expired entries are only served stale, so only fresh ones need invalidating
+        return bool(self.cache.fresh_entries() or self.replica or self.shared_cache)
+
+    async def _watch_gold_versions(self):
+        delay = self.version_check_interval
+        checked_at = time.monotonic()
+        while True:
+            await asyncio.sleep(delay)
+            if self.last_request < checked_at:
+                # No requests since the last check: nobody to serve a changed table to, back off
+                delay = min(delay * 2, max(GOLD_VERSION_CHECK_MAX_INTERVAL, self.version_check_interval))
+                continue
+            delay = self.version_check_interval
+            checked_at = time.monotonic()
+            if not self._version_check_due():
+                continue
+            try:
+                await self.check_gold_versions()
+            except Exception as e:
+                print(f"Gold version watcher error: {str(e)[:200]}")
+
+    async def _startup(self):
+        # Serve whatever is on disk right away, then learn the current gold versions so replica
+        # snapshots and shared cache entries from before the restart are checked against them
+        if self.replica:
+            await asyncio.to_thread(self.replica.load)
+        try:
+            await self.check_gold_versions()
+        except Exception as e:
+            print(f"Initial gold version check failed: {str(e)[:200]}")
+
+    async def _prewarm(self):
+        """Run the `prewarm` templates with their default parameters to fill the result cache"""
+        unknown = [name for name in self.prewarm if name not in QUERIES]
+        if unknown:
+            print(f"Startup prewarm: unknown template(s) {', '.join(unknown)}")
+        await self.monitor.check()
+        if self.router.cold:
+            # Filling the cache isn't worth waking the warehouse; the first users will
+            self.prewarm_status = f"skipped (warehouse {self.monitor.state})"
+            return
+
+        async def run(name: str) -> bool:
+            try:
+                await self.execute_result(QUERIES[name].bind())
+                return True
+            except Exception as e:
+                print(f"Startup prewarm of {name} failed: {str(e)[:200]}")
+                return False
+
+        started = time.perf_counter()
+        names = [name for name in self.prewarm if name in QUERIES]
+        done = sum(await asyncio.gather(*(run(name) for name in names)))
+        self.prewarm_status = f"{done}/{len(names)} in {time.perf_counter() - started:.1f}s"
+        print(f"Startup prewarm: {self.prewarm_status}")
+
+    def health(self) -> Dict[str, Any]:
+        """Warehouse state and local serving capacity, for /api/health"""
+        health = {"warehouse": self.monitor.snapshot(), "circuit": self.breaker.state, "cached_results": len(self.cache),
+                  "prewarm": self.prewarm_status}
+        if len(self.router.targets) > 1:
+            health["warehouses"] = [target.snapshot() for target in self.router.targets]
+        if self.replica:
+            health["replica_ready"] = self.replica.ready
+        return health
+
+    def start(self):
+        self.router.start()
+        self.costs.start()
+        if (self.replica or self.shared_cache) and self._startup_task is None:
+            self._startup_task = asyncio.create_task(self._startup())
+        # The replica answers locally anyway, and a disabled cache would drop the results
+        if not (self.prewarm and self.cache.enabled and self.replica is None):
+            self.prewarm_status = "disabled"
+        elif self._prewarm_task is None:
+            self._prewarm_task = asyncio.create_task(self._prewarm())
+        if self.version_check_interval > 0 and (self.cache.enabled or self.replica or self.shared_cache) and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch_gold_versions())
+
+    async def stop(self):
+        self.router.stop()
+        self.costs.stop()
+        for task in (self._watcher, self._startup_task, self._prewarm_task, *self._refreshes):
+            if task:
+                task.cancel()
+        self._watcher = self._startup_task = self._prewarm_task = None
+        self._refreshes.clear()
+        await self.router.aclose()
@@ -0,0 +1,180 @@
+"""
+Cross-process result cache for gold-layer queries
+A SQLite file (WAL mode) shared by every uvicorn/gunicorn worker on the host: results are stored as
+Arrow IPC with the gold table versions they were read at, bounded by total size (least recently
+used first) and kept across restarts
+"""
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pyarrow as pa
+
+from .results import ResultSet, read_arrow_stream
+
+# SQLite file shared by the workers; the shared tier is off unless this is set
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH")
+SHARED_CACHE_TTL = float(os.getenv("SHARED_CACHE_TTL", "3600"))
+SHARED_CACHE_MAX_MB = float(os.getenv("SHARED_CACHE_MAX_MB", "512"))
+
+# Bump when the stored layout or decoded types change so old entries are never read back
+ENTRY_FORMAT = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    tables TEXT NOT NULL,
+    versions TEXT NOT NULL,
+    schema_columns TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+
+def _digest(key: Hashable) -> str:
+    return hashlib.sha256(repr((ENTRY_FORMAT, key)).encode()).hexdigest()
+
+
+class SharedResultCache:
+    """
+    Size-bounded result store shared between processes
+
+    An entry remembers the Delta version of each gold table it read. A lookup made with newer
+    known versions treats it as stale, so a worker that noticed a gold rebuild never serves a
+    result another worker fetched before it. SQLite errors are logged and count as misses:
+    this tier only ever saves warehouse calls, it never fails a request.
+    """
+
+    def __init__(self, path: str, max_bytes: int = int(SHARED_CACHE_MAX_MB * 1024 * 1024), ttl: float = SHARED_CACHE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.errors = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute(_SCHEMA)
+            db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; the queries run on asyncio.to_thread workers
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: Hashable, versions: Dict[str, Any]) -> Tuple[bool, Optional[ResultSet]]:
+        """Return (found, result); expired entries and entries older than `versions` are misses"""
+        digest = _digest(key)
+        try:
+            db = self._connect()
+            row = db.execute(
+                "SELECT versions, schema_columns, payload, expires_at FROM results WHERE key = ?", (digest,)
+            ).fetchone()
+            if row is None or row[3] < time.time():
+                self._count("misses")
+                return False, None
+            stored = json.loads(row[0])
+            if any(versions.get(table) is not None and versions[table] != version for table, version in stored.items()):
+                db.execute("DELETE FROM results WHERE key = ?", (digest,))
+                self._count("stale")
+                self._count("misses")
+                return False, None
+            db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (time.time(), digest))
+            result = ResultSet(json.loads(row[1]), read_arrow_stream(row[2]))
+        except (sqlite3.Error, pa.ArrowException, ValueError) as e:
+            print(f"Shared cache read failed: {str(e)[:200]}")
+            self._count("errors")
+            return False, None
+        self._count("hits")
+        return True, result
+
+    def set(self, key: Hashable, result: ResultSet, tables: Iterable[str], versions: Dict[str, Any]):
+        """Store a result tagged with the gold versions it was read at, then evict down to max_bytes"""
+        tables = sorted(tables)
+        payload = result.to_arrow_ipc()
+        if len(payload) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    _digest(key),
+                    "," + ",".join(tables) + ",",
+                    json.dumps({table: versions.get(table) for table in tables}, default=str),
+                    json.dumps(result.schema_columns),
+                    payload,
+                    len(payload),
+                    now + self.ttl,
+                    now,
+                ),
+            )
+            self._evict(db)
+        except sqlite3.Error as e:
+            print(f"Shared cache write failed: {str(e)[:200]}")
+            self._count("errors")
+
+    def _evict(self, db: sqlite3.Connection):
+        db.execute("DELETE FROM results WHERE expires_at < ?", (time.time(),))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        while total > self.max_bytes:
+            oldest = db.execute("SELECT key, size FROM results ORDER BY accessed_at LIMIT 1").fetchone()
+            if oldest is None:
+                break
+            db.execute("DELETE FROM results WHERE key = ?", (oldest[0],))
+            total -= oldest[1]
+            self._count("evictions")
+
+    def invalidate(self, tables: Optional[Iterable[str]] = None) -> int:
+        """Drop entries reading any of `tables` (all entries when None); returns the count"""
+        try:
+            db = self._connect()
+            if tables is None:
+                return db.execute("DELETE FROM results").rowcount
+            return sum(db.execute("DELETE FROM results WHERE tables LIKE ?", (f"%,{table},%",)).rowcount for table in tables)
+        except sqlite3.Error as e:
+            print(f"Shared cache invalidation failed: {str(e)[:200]}")
+            self._count("errors")
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        except sqlite3.Error:
+            entries, size = None, None
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
@@ -0,0 +1,39 @@
+"""Decoding of warehouse results into JSON-native values"""
+import json
+
+import pyarrow as pa
+
+from backend.decode import decode_json_array, json_ready
+from backend.formats import render_result
+from backend.results import ResultSet
+
+SCHEMA = [
+    {"name": "label", "type_name": "STRING"},
+    {"name": "rate", "type_name": "DOUBLE"},
+    {"name": "amount", "type_name": "DECIMAL"},
+]
+ROWS = [
+    ["finite", "0.25", "10.50"],
+    ["nan", "NaN", "1"],
+    ["positive", "Infinity", "2"],
+    ["negative", "-Infinity", "3"],
+    ["missing", None, None],
+]
+
+
+def test_non_finite_doubles_become_null():
+    records = json_ready(decode_json_array(SCHEMA, ROWS)).to_pylist()
+    assert [row["rate"] for row in records] == [0.25, None, None, None, None]
+    assert [row["amount"] for row in records] == [10.5, 1.0, 2.0, 3.0, None]
+
+
+def test_non_finite_floats_from_arrow_chunks_become_null():
+    table = pa.table({"rate": pa.array([1.5, float("nan"), float("-inf")], pa.float32())})
+    assert json_ready(table).column("rate").to_pylist() == [1.5, None, None]
+
+
+def test_json_responses_render_non_finite_doubles():
+    result = ResultSet(SCHEMA, decode_json_array(SCHEMA, ROWS))
+    for response in (render_result(result), render_result(result, "columnar"), render_result(result, first_row=True)):
+        json.loads(response.body)  # JSONResponse refuses NaN/Infinity (allow_nan=False)
+    assert json.loads(render_result(result).body)[2] == {"label": "positive", "rate": None, "amount": 2.0}
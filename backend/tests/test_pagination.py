@@ -0,0 +1,186 @@
+"""Keyset pagination of the scenario list endpoints"""
+import base64
+import itertools
+import json
+import random
+
+import duckdb
+import pyarrow as pa
+import pytest
+from fastapi import HTTPException
+
+from backend.benchmarks.gold_fixtures import template_columns
+from backend.cache import GOLD_SCHEMA
+from backend.decode import ARROW_TYPES
+from backend.pagination import KeysetOrder, Page, SortKey, parameter_type, sql_literal
+from backend.queries import QUERIES
+from backend.replica import _MARKER
+from backend.results import ResultSet
+
+# Columns each gold list table is grouped by (sql/03_gold), i.e. what makes one of its rows unique
+GRAIN = {
+    "capacity_management": ("drg_code", "primary_diagnosis_code"),
+    "denials_management": ("payer_name", "payer_category", "denial_reason", "denial_priority", "drg_code"),
+    "clinical_trial_matching": ("patient_id",),
+    "timely_filing_appeals": ("claim_id",),
+    "documentation_management": ("documentation_type", "payer_name", "drg_code", "request_urgency", "documentation_complexity"),
+}
+LISTS = sorted(GRAIN)
+
+
+def gold_table(name: str, seed: int = 7) -> pa.Table:
+    """Rows unique on the table's grain, with NULLs and heavy ties in every other sort column"""
+    rng = random.Random(seed)
+    columns = template_columns(QUERIES[name].sql)
+    grain = GRAIN[name]
+    if len(grain) == 1:
+        keys = [(f"ID{index:04d}",) for index in range(300)]
+    else:
+        keys = list(itertools.product(("A", "B", "C", None), repeat=len(grain)))
+    sort_columns = {key.column for key in QUERIES[name].order.keys}
+
+    def value(column):
+        if column["name"] not in sort_columns:
+            return None
+        if column["type_name"] in ("LONG", "DOUBLE"):
+            return rng.choice((None, 0, 1, 2))
+        return rng.choice((None, "", "x", "y"))
+
+    rows = []
+    for key in keys:
+        row = {column["name"]: value(column) for column in columns}
+        row.update(zip(grain, key))
+        rows.append(row)
+    schema = pa.schema([(column["name"], ARROW_TYPES.get(column["type_name"], pa.string())) for column in columns])
+    return pa.Table.from_pylist(rows, schema=schema)
+
+
+@pytest.fixture(scope="module")
+def gold():
+    db = duckdb.connect()
+    catalog, schema = GOLD_SCHEMA.split(".", 1)
+    db.execute(f'ATTACH \':memory:\' AS "{catalog}"')
+    db.execute(f'CREATE SCHEMA "{catalog}"."{schema}"')
+    for name in LISTS:
+        db.register("rows", gold_table(name))
+        db.execute(f'CREATE TABLE "{catalog}"."{schema}"."{name}" AS SELECT * FROM rows')
+        db.unregister("rows")
+    yield db
+    db.close()
+
+
+def run(db, query) -> ResultSet:
+    """A bound query on DuckDB, as the gold replica runs it"""
+    values = {name: value for name, (_, value) in query.params.items()}
+    table = db.execute(_MARKER.sub(r"$\1", query.statement), values).arrow()
+    if isinstance(table, pa.RecordBatchReader):  # duckdb >= 1.4
+        table = table.read_all()
+    return ResultSet([], table)
+
+
+def grain_of(result: ResultSet, name: str):
+    return list(zip(*(result.table.column(column).to_pylist() for column in GRAIN[name])))
+
+
+@pytest.mark.parametrize("name", LISTS)
+def test_sort_key_is_unique(gold, name):
+    order = QUERIES[name].order
+    records = run(gold, QUERIES[name].bind(limit=10000)).to_records()
+    keys = [tuple(key.value(row) for key in order.keys) for row in records]
+    assert len(set(keys)) == len(keys)
+
+
+@pytest.mark.parametrize("name", LISTS)
+@pytest.mark.parametrize("limit", [5, 64])
+def test_paging_matches_full_scan(gold, name, limit):
+    template = QUERIES[name]
+    full = run(gold, template.bind(limit=10000))
+
+    paged, cursor = [], None
+    while True:
+        query = template.bind(cursor=cursor, limit=limit)
+        result = run(gold, query)
+        paged.extend(grain_of(result, name))
+        cursor = query.page.next_cursor(result)
+        if cursor is None:
+            break
+    assert paged == grain_of(full, name)
+
+
+ORDER = KeysetOrder("test", SortKey("score", descending=True, null_as=0), SortKey("name", null_as=""), SortKey("id"))
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    cursor = ORDER.encode({"score": None, "name": "O'Brien", "id": 42, "other": "ignored"})
+    assert "=" not in cursor
+    assert ORDER.decode(cursor) == [0, "O'Brien", 42]
+
+
+def test_cursor_from_another_list_is_rejected():
+    other = KeysetOrder("other", *ORDER.keys)
+    with pytest.raises(HTTPException) as error:
+        ORDER.decode(other.encode({"score": 1, "name": "a", "id": 1}))
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    raw_cursor(["test", [1, "a", 1]]),
+    raw_cursor({"o": "test"}),
+    raw_cursor({"o": "test", "k": [1, "a"]}),
+    raw_cursor({"o": "test", "k": [1, "a", 1, 2]}),
+    raw_cursor({"o": "test", "k": [1, "a", None]}),
+    raw_cursor({"o": "test", "k": [1, "a", [1]]}),
+    raw_cursor({"o": "test", "k": [1, "a", {"x": 1}]}),
+    raw_cursor({"o": "test", "k": [float("nan"), "a", 1]}),
+    raw_cursor({"o": "test", "k": [float("inf"), "a", 1]}),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        ORDER.decode(cursor)
+    assert error.value.status_code == 400
+
+
+def test_keyset_predicate_follows_each_key_direction():
+    assert ORDER.order_by == "ORDER BY COALESCE(score, 0) DESC, COALESCE(name, '') ASC, id ASC"
+    assert ORDER.after == (
+        "((COALESCE(score, 0) < :after_0)"
+        " OR (COALESCE(score, 0) = :after_0 AND COALESCE(name, '') > :after_1)"
+        " OR (COALESCE(score, 0) = :after_0 AND COALESCE(name, '') = :after_1 AND id > :after_2))"
+    )
+
+
+def test_cursor_values_are_bound_as_typed_parameters():
+    page = Page(ORDER, 10, ORDER.encode({"score": 2.5, "name": "x'; DROP TABLE t; --", "id": 7}))
+    assert page.parameters() == {
+        "after_0": ("DOUBLE", 2.5),
+        "after_1": ("STRING", "x'; DROP TABLE t; --"),
+        "after_2": ("BIGINT", 7),
+    }
+    assert "DROP" not in page.sql()
+    assert page.sql().startswith(f"AND {ORDER.after}\n")
+    assert Page(ORDER, 10).sql() == f"{ORDER.order_by}\nLIMIT :limit"
+
+
+def test_parameter_types():
+    assert [parameter_type(value) for value in (True, 3, 1.5, "a")] == ["BOOLEAN", "BIGINT", "DOUBLE", "STRING"]
+
+
+def test_sql_literal_escapes_strings():
+    assert sql_literal("it's \\ here") == "'it\\'s \\\\ here'"
+    assert [sql_literal(value) for value in (True, 0, 1.5)] == ["TRUE", "0", "1.5"]
+    for value in (None, float("nan"), [1]):
+        with pytest.raises(ValueError):
+            sql_literal(value)
+
+
+def test_next_cursor_only_after_a_full_page():
+    table = pa.table({"score": [3.0, None], "name": ["b", None], "id": [1, 2]})
+    assert Page(ORDER, 3).next_cursor(ResultSet([], table)) is None
+    cursor = Page(ORDER, 2).next_cursor(ResultSet([], table))
+    assert ORDER.decode(cursor) == [0, "", 2]
@@ -0,0 +1,105 @@
+"""Query template registry: parameter validation, statements and cache keys"""
+import pytest
+from fastapi import HTTPException
+
+from backend.cache import GOLD_SCHEMA
+from backend.queries import QUERIES, Param, QueryParameterError, bind_query
+from backend.replica import _MARKER
+
+
+def assert_rejected(name, **values):
+    with pytest.raises(HTTPException) as error:
+        bind_query(name, **values)
+    assert error.value.status_code == 400
+    return error.value.detail
+
+
+@pytest.mark.parametrize("name", sorted(QUERIES))
+def test_every_template_binds_with_defaults(name):
+    query = bind_query(name)
+    assert "{" not in query.statement
+    assert GOLD_SCHEMA in query.statement
+    # Every marker in the text is bound, and nothing is bound that the text doesn't use
+    assert set(_MARKER.findall(query.statement)) == set(query.params)
+    assert {spec["name"] for spec in query.parameters} == set(query.params)
+    assert query.tables
+
+
+@pytest.mark.parametrize("name", sorted(name for name, template in QUERIES.items() if template.order is not None))
+def test_list_templates_end_with_keyset_order_and_limit(name):
+    query = bind_query(name, limit=25)
+    assert query.params["limit"] == ("INT", 25)
+    assert query.row_limit == 25
+    assert query.statement.rstrip().endswith("LIMIT :limit")
+    assert QUERIES[name].order.order_by in query.statement
+
+
+def test_filter_values_are_parameters_not_sql():
+    payer = "Aetna' OR '1'='1"
+    query = bind_query("denials_management", payer=payer)
+    assert payer not in query.statement
+    assert query.params["payer"] == ("STRING", payer)
+    assert {"name": "payer", "type": "STRING", "value": payer} in query.parameters
+
+
+def test_unset_filters_bind_null():
+    query = bind_query("denials_management")
+    assert {"name": "payer", "type": "STRING"} in query.parameters
+
+
+@pytest.mark.parametrize("urgency", ["Urgent", "critical", "Critical; DROP TABLE x", ""])
+def test_unknown_urgency_is_rejected(urgency):
+    assert "urgency must be one of" in assert_rejected("timely_filing_appeals", urgency=urgency)
+
+
+def test_trial_type_is_normalized_and_checked():
+    assert bind_query("clinical_trial_matching", trial_type="kras").params["trial_type"] == ("STRING", "KRAS")
+    assert "trial_type must be one of" in assert_rejected("clinical_trial_matching", trial_type="EGFR")
+
+
+@pytest.mark.parametrize("limit", [0, -5, "ten", "1.5", 2.5, True])
+def test_invalid_limit_is_rejected(limit):
+    assert_rejected("capacity_management", limit=limit)
+
+
+def test_integer_strings_are_coerced():
+    query = bind_query("capacity_management", min_encounters="12", limit="50")
+    assert query.params["min_encounters"] == ("INT", 12)
+    assert query.params["limit"] == ("INT", 50)
+
+
+def test_booleans():
+    assert bind_query("clinical_trial_matching").params["eligible_only"] == ("BOOLEAN", False)
+    query = bind_query("clinical_trial_matching", eligible_only="TRUE")
+    assert query.params["eligible_only"] == ("BOOLEAN", True)
+    assert {"name": "eligible_only", "type": "BOOLEAN", "value": "true"} in query.parameters
+    assert_rejected("clinical_trial_matching", eligible_only="yes")
+    assert_rejected("clinical_trial_matching", eligible_only=1)
+
+
+def test_unknown_parameters_are_rejected():
+    assert "Unknown parameter(s) for capacity_summary: payer" in assert_rejected("capacity_summary", payer="Aetna")
+
+
+def test_string_parameters_must_be_strings():
+    with pytest.raises(QueryParameterError):
+        Param("payer").convert(5)
+
+
+def test_cache_key_follows_the_bound_values():
+    first = bind_query("denials_management", payer="Aetna", limit=10)
+    assert first.key == bind_query("denials_management", limit=10, payer="Aetna").key
+    assert first.key != bind_query("denials_management", payer="Cigna", limit=10).key
+    assert first.key != bind_query("denials_management", payer="Aetna", limit=20).key
+    # A filter left out and its default share an entry
+    assert bind_query("clinical_trial_matching").key == bind_query("clinical_trial_matching", eligible_only=False).key
+
+
+def test_a_cursor_changes_statement_and_key():
+    first = bind_query("clinical_trial_matching", limit=2)
+    cursor = QUERIES["clinical_trial_matching"].order.encode({"eligible_trial_count": 3, "patient_id": "P1"})
+    second = bind_query("clinical_trial_matching", cursor=cursor, limit=2)
+    assert second.params["after_0"] == ("BIGINT", 3)
+    assert second.params["after_1"] == ("STRING", "P1")
+    assert ":after_0" in second.statement and ":after_0" not in first.statement
+    assert first.key != second.key
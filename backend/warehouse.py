@@ -0,0 +1,741 @@
+"""
+Shared Databricks SQL Statement Execution clients for the R_Health backends
+Keeps a pool of keep-alive connections to the warehouse so API calls skip the TCP+TLS handshake
+"""
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Union
+import asyncio
+import os
+import re
+import threading
+import time
+
+import httpx
+import pyarrow as pa
+
+from .attribution import LEDGER, STATEMENT_TAGS, StatementTag, current_tag
+from .decode import normalize_table
+from .metrics import QUERY_NAME, RESULT_BYTES, RESULT_ROWS, observe_phase
+from .resilience import DEFAULT_RETRY, NO_RETRY, RetryPolicy
+from .results import ResultSet, ResultStream, read_arrow_stream
+
+STATEMENTS_PATH = "/api/2.0/sql/statements"
+WAREHOUSES_PATH = "/api/2.0/sql/warehouses"
+QUERY_HISTORY_PATH = "/api/2.0/sql/history/queries"
+
+# Connection pool tuning (per process)
+POOL_CONNECTIONS = int(os.getenv("WAREHOUSE_POOL_CONNECTIONS", "4"))  # distinct hosts kept pooled
+POOL_MAXSIZE = int(os.getenv("WAREHOUSE_POOL_MAXSIZE", "32"))  # keep-alive connections per host
+POOL_BLOCK = os.getenv("WAREHOUSE_POOL_BLOCK", "true").lower() == "true"  # enforce the per-host limit
+REQUEST_TIMEOUT = float(os.getenv("WAREHOUSE_REQUEST_TIMEOUT", "60"))
+
+# Async client: in-flight statements are cheap, so allow far more open connections
+ASYNC_MAX_CONNECTIONS = int(os.getenv("WAREHOUSE_ASYNC_MAX_CONNECTIONS", "256"))
+ASYNC_MAX_KEEPALIVE = int(os.getenv("WAREHOUSE_ASYNC_MAX_KEEPALIVE", "64"))
+
+# Statement lifecycle: short server-side wait on submit, then poll statement_id with backoff
+SUBMIT_WAIT = os.getenv("WAREHOUSE_SUBMIT_WAIT", "5s")  # API accepts 0s or 5s-50s
+POLL_INTERVAL = float(os.getenv("WAREHOUSE_POLL_INTERVAL", "0.25"))
+POLL_MAX_INTERVAL = float(os.getenv("WAREHOUSE_POLL_MAX_INTERVAL", "5"))
+POLL_BACKOFF = float(os.getenv("WAREHOUSE_POLL_BACKOFF", "1.5"))
+STATEMENT_TIMEOUT = float(os.getenv("WAREHOUSE_STATEMENT_TIMEOUT", "300"))
+CANCEL_ON_DEADLINE = os.getenv("WAREHOUSE_CANCEL_ON_DEADLINE", "true").lower() == "true"
+PIPELINE_STATEMENT_TIMEOUT = float(os.getenv("PIPELINE_STATEMENT_TIMEOUT", "3600"))  # bronze CTAS runs for minutes
+# Retries of each poll of a layer statement; an hour-long CTAS must outlast a brief API outage
+PIPELINE_POLL_RETRIES = int(os.getenv("PIPELINE_POLL_RETRIES", "8"))
+
+# Result transfer: small results inline as JSON, large ones as Arrow chunks behind external links
+ARROW_ROW_THRESHOLD = int(os.getenv("WAREHOUSE_ARROW_ROW_THRESHOLD", "5000"))
+ARROW_BYTE_THRESHOLD = int(os.getenv("WAREHOUSE_ARROW_BYTE_THRESHOLD", str(4 * 1024 * 1024)))
+CHUNK_DOWNLOAD_CONCURRENCY = int(os.getenv("WAREHOUSE_CHUNK_DOWNLOAD_CONCURRENCY", "8"))
+
+PENDING_STATES = ("PENDING", "RUNNING")
+
+_LIMIT_CLAUSE = re.compile(r"\bLIMIT\s+(\d+)\s*;?\s*$", re.IGNORECASE)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+# Statements safe to submit twice: a retried submit may run them again
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH|DESCRIBE|SHOW)\b", re.IGNORECASE)
+_INLINE_LIMIT_ERROR = re.compile(r"EXTERNAL_LINKS|inline.{0,40}limit|exceeds.{0,40}MiB", re.IGNORECASE)
+
+
+class WarehouseError(Exception):
+    """Raised when the warehouse reports a statement as failed, canceled or closed"""
+
+    def __init__(self, message: str, state: Optional[str] = None):
+        super().__init__(message)
+        self.state = state
+
+
+class StatementTimeoutError(WarehouseError):
+    """Raised when a statement is still PENDING/RUNNING at its deadline"""
+
+    def __init__(self, message: str, statement_id: str, state: Optional[str] = None, canceled: bool = False):
+        super().__init__(message, state=state)
+        self.statement_id = statement_id
+        self.canceled = canceled
+
+
+class ExecutionPolicy:
+    """
+    How long to wait for a statement and how to poll it
+
+    The submit call blocks server-side for at most submit_wait. After that the statement keeps
+    running on the warehouse and is polled with exponential backoff (poll_interval growing by
+    backoff up to max_interval) until `deadline` seconds after submission, when it is
+    optionally canceled so the warehouse stops spending compute on it. Each poll retries
+    transient API errors with `poll_retry`.
+    """
+
+    def __init__(
+        self,
+        submit_wait: str = SUBMIT_WAIT,
+        poll_interval: float = POLL_INTERVAL,
+        max_interval: float = POLL_MAX_INTERVAL,
+        backoff: float = POLL_BACKOFF,
+        deadline: float = STATEMENT_TIMEOUT,
+        cancel_on_deadline: bool = CANCEL_ON_DEADLINE,
+        poll_retry: RetryPolicy = DEFAULT_RETRY,
+    ):
+        self.submit_wait = submit_wait
+        self.poll_interval = poll_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.deadline = deadline
+        self.cancel_on_deadline = cancel_on_deadline
+        self.poll_retry = poll_retry
+
+    def delays(self) -> Iterator[float]:
+        delay = self.poll_interval
+        while True:
+            yield delay
+            delay = min(delay * self.backoff, self.max_interval)
+
+
+class DispositionAdvisor:
+    """
+    Chooses INLINE/JSON_ARRAY or EXTERNAL_LINKS/ARROW_STREAM per statement
+
+    Statements are grouped by shape (SQL with literals stripped, so each filter value of an
+    endpoint shares one entry). A shape whose last result exceeded the row or byte threshold
+    goes straight to external links; unseen shapes use the statement's trailing LIMIT as the
+    row estimate and otherwise start inline.
+    """
+
+    def __init__(self, row_threshold: int = ARROW_ROW_THRESHOLD, byte_threshold: int = ARROW_BYTE_THRESHOLD):
+        self.row_threshold = row_threshold
+        self.byte_threshold = byte_threshold
+        self._large: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def _shape(self, statement: str, row_limit: Optional[int] = None) -> Optional[str]:
+        """
+        Shape key, or None when a small row limit already settles it
+
+        row_limit is the bound value of a parameterized `LIMIT :limit`; otherwise a literal
+        trailing LIMIT is used.
+        """
+        limit = _LIMIT_CLAUSE.search(statement)
+        if row_limit is None and limit:
+            row_limit = int(limit.group(1))
+        if row_limit is not None and row_limit < self.row_threshold:
+            return None
+        body = statement[:limit.start()] if limit else statement
+        shape = _WHITESPACE.sub(" ", _LITERALS.sub("?", body)).strip()
+        return f"{shape} LIMIT >={self.row_threshold}" if row_limit is not None else shape
+
+    def use_external_links(self, statement: str, row_limit: Optional[int] = None) -> bool:
+        shape = self._shape(statement, row_limit)
+        if shape is None:
+            return False
+        with self._lock:
+            large = self._large.get(shape)
+        if large is not None:
+            return large
+        return shape.endswith(f"LIMIT >={self.row_threshold}")
+
+    def observe(self, statement: str, manifest: Dict[str, Any], row_limit: Optional[int] = None):
+        shape = self._shape(statement, row_limit)
+        if shape is None:
+            return
+        rows = manifest.get("total_row_count") or 0
+        size = manifest.get("total_byte_count") or 0
+        with self._lock:
+            self._large[shape] = rows >= self.row_threshold or size >= self.byte_threshold
+
+    def mark_large(self, statement: str, row_limit: Optional[int] = None):
+        shape = self._shape(statement, row_limit)
+        if shape is not None:
+            with self._lock:
+                self._large[shape] = True
+
+
+class StatementRuntimes:
+    """
+    Run times of completed statements per shape, and what cancelling statements saved
+
+    The warehouse time a cancellation saved is estimated as the shape's average run time (or
+    the overall average for a shape never seen to finish) minus the time it had already run.
+    """
+
+    def __init__(self, max_shapes: int = 1024):
+        self.max_shapes = max_shapes
+        self._runtimes: "OrderedDict[str, float]" = OrderedDict()
+        self._overall: Optional[float] = None
+        self.canceled_abandoned = 0
+        self.canceled_deadline = 0
+        self.seconds_saved = 0.0
+        self.seconds_before_cancel = 0.0
+
+    @staticmethod
+    def _shape(statement: str) -> str:
+        return _WHITESPACE.sub(" ", _LITERALS.sub("?", statement)).strip()
+
+    def completed(self, statement: str, seconds: float):
+        shape = self._shape(statement)
+        previous = self._runtimes.pop(shape, None)
+        self._runtimes[shape] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+        if len(self._runtimes) > self.max_shapes:
+            self._runtimes.popitem(last=False)
+        self._overall = seconds if self._overall is None else 0.9 * self._overall + 0.1 * seconds
+
+    def canceled(self, statement: str, elapsed: float, abandoned: bool):
+        if abandoned:
+            self.canceled_abandoned += 1
+        else:
+            self.canceled_deadline += 1
+        expected = self._runtimes.get(self._shape(statement), self._overall)
+        if expected is not None:
+            self.seconds_saved += max(expected - elapsed, 0.0)
+        self.seconds_before_cancel += elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "canceled_abandoned": self.canceled_abandoned,
+            "canceled_deadline": self.canceled_deadline,
+            "warehouse_seconds_saved": round(self.seconds_saved, 1),
+            "warehouse_seconds_before_cancel": round(self.seconds_before_cancel, 1),
+        }
+
+
+DEFAULT_POLICY = ExecutionPolicy()
+PIPELINE_POLICY = ExecutionPolicy(
+    submit_wait="0s", deadline=PIPELINE_STATEMENT_TIMEOUT, poll_retry=RetryPolicy(retries=PIPELINE_POLL_RETRIES)
+)
+
+
+def _normalize_host(host: str) -> str:
+    if not host.startswith("http"):
+        host = f"https://{host}"
+    return host.rstrip("/")
+
+
+class _StatementsClient:
+    """Configuration and response handling shared by the sync and async clients"""
+
+    def __init__(
+        self,
+        host: Union[str, Callable[[], str]],
+        warehouse_id: str,
+        token: Optional[str] = None,
+        auth: Optional[Callable[[], Dict[str, str]]] = None,
+        timeout: float = REQUEST_TIMEOUT,
+    ):
+        self._host = host if callable(host) else _normalize_host(host)  # a callable is resolved on first use
+        self.warehouse_id = warehouse_id
+        self.timeout = timeout
+        self._token = token
+        self._auth = auth
+
+    @property
+    def host(self) -> str:
+        if callable(self._host):
+            self._host = _normalize_host(self._host())
+        return self._host
+
+    @property
+    def configured(self) -> bool:
+        return bool(self._token or self._auth)
+
+    @property
+    def statements_url(self) -> str:
+        return f"{self.host}{STATEMENTS_PATH}"
+
+    @property
+    def warehouse_url(self) -> str:
+        return f"{self.host}{WAREHOUSES_PATH}/{self.warehouse_id}"
+
+    def _headers(self) -> Dict[str, str]:
+        if self._auth:
+            return self._auth()
+        if self._token:
+            return {"Authorization": f"Bearer {self._token}"}
+        return {}
+
+    def _payload(
+        self,
+        statement: str,
+        wait_timeout: str,
+        external_links: bool = False,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        tag: Optional[StatementTag] = None,
+    ) -> Dict[str, Any]:
+        if tag is not None and STATEMENT_TAGS:
+            # Writes (layer runs) carry their run id in the text; see StatementTag.comment
+            statement = f"{tag.comment(with_request_id=not _READ_ONLY.match(statement))}\n{statement}"
+        payload = {
+            "warehouse_id": self.warehouse_id,
+            "statement": statement,
+            "wait_timeout": wait_timeout,
+            "on_wait_timeout": "CONTINUE",
+        }
+        if parameters:
+            # Named parameter markers (:name): one statement text for every filter value
+            payload["parameters"] = parameters
+        if external_links:
+            payload["format"] = "ARROW_STREAM"
+            payload["disposition"] = "EXTERNAL_LINKS"
+        return payload
+
+    def _statement_url(self, statement_id: str) -> str:
+        return f"{self.statements_url}/{statement_id}"
+
+    @staticmethod
+    def _history_params(statement_ids: List[str], page_token: Optional[str] = None) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"filter_by.statement_ids": statement_ids, "include_metrics": "true", "max_results": 1000}
+        if page_token:
+            params["page_token"] = page_token
+        return params
+
+    @staticmethod
+    def _timeout_error(result: Dict[str, Any], policy: ExecutionPolicy, canceled: bool) -> StatementTimeoutError:
+        state = result["status"]["state"]
+        action = "canceled" if canceled else "left running"
+        return StatementTimeoutError(
+            f"Statement still {state} after {policy.deadline:g}s ({action})",
+            statement_id=result["statement_id"],
+            state=state,
+            canceled=canceled,
+        )
+
+    @staticmethod
+    def _is_pending(result: Dict[str, Any]) -> bool:
+        """True while the statement is still queued or running, raises if it ended badly"""
+        status = result.get("status", {})
+        state = status.get("state")
+        if state == "SUCCEEDED":
+            return False
+        if state in PENDING_STATES:
+            return True
+        error_msg = status.get("error", {}).get("message", f"State: {state}")
+        raise WarehouseError(error_msg, state=state)
+
+
+class WarehouseClient(_StatementsClient):
+    """
+    Thread-safe, connection-pooled client for /api/2.0/sql/statements
+
+    One instance is shared by every caller in a process. Authentication is either a static
+    bearer token (Databricks Apps / env var) or a callable returning auth headers
+    (e.g. WorkspaceClient().config.authenticate, which refreshes OAuth tokens itself).
+
+    Transient API errors are retried with jittered backoff as in the async client: polls,
+    cancels and history reads always, the submit only for read-only statements. When a poll
+    still fails, the statement is cancelled before the error is raised, so a layer script never
+    moves on while it keeps running.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        warehouse_id: str,
+        token: Optional[str] = None,
+        auth: Optional[Callable[[], Dict[str, str]]] = None,
+        pool_connections: int = POOL_CONNECTIONS,
+        pool_maxsize: int = POOL_MAXSIZE,
+        pool_block: bool = POOL_BLOCK,
+        timeout: float = REQUEST_TIMEOUT,
+    ):
+        super().__init__(host, warehouse_id, token=token, auth=auth, timeout=timeout)
+        # Imported here: only the layer scripts use the sync client, the API backends don't load requests
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # requests.Session reuses connections through urllib3 pools, which are thread-safe.
+        # pool_block=True makes threads wait for a free connection instead of opening
+        # unbounded extra sockets to the same host.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def execute_statement(self, statement: str, policy: ExecutionPolicy = DEFAULT_POLICY) -> Dict[str, Any]:
+        """Run a statement, polling until it leaves PENDING/RUNNING, and return the raw response"""
+        started = time.monotonic()
+        tag = current_tag()
+        submit_retry = DEFAULT_RETRY if _READ_ONLY.match(statement) else NO_RETRY
+        result = self._request("POST", self.statements_url, retry=submit_retry,
+                               json=self._payload(statement, policy.submit_wait, tag=tag))
+        LEDGER.record(result.get("statement_id"), tag)
+
+        delays = policy.delays()
+        while self._is_pending(result):
+            remaining = policy.deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                canceled = policy.cancel_on_deadline and self.cancel_statement(result["statement_id"])
+                raise self._timeout_error(result, policy, canceled)
+            time.sleep(min(next(delays), remaining))
+            try:
+                result = self._request("GET", self._statement_url(result["statement_id"]), retry=policy.poll_retry)
+            except Exception:
+                # We lose track of it here: stop it rather than let it run on behind the caller
+                self.cancel_statement(result["statement_id"])
+                raise
+
+        return result
+
+    def cancel_statement(self, statement_id: str) -> bool:
+        """Ask the warehouse to stop a running statement; best effort"""
+        from requests.exceptions import RequestException
+
+        try:
+            self._request("POST", f"{self._statement_url(statement_id)}/cancel")
+            return True
+        except RequestException:
+            return False
+
+    def query_history(self, statement_ids: List[str]) -> List[Dict[str, Any]]:
+        """Query History entries (with execution metrics) of the given statements"""
+        rows: List[Dict[str, Any]] = []
+        page_token = None
+        while True:
+            page = self._request("GET", f"{self.host}{QUERY_HISTORY_PATH}", params=self._history_params(statement_ids, page_token))
+            rows.extend(page.get("res") or [])
+            page_token = page.get("next_page_token")
+            if not page.get("has_next_page") or not page_token:
+                return rows
+
+    def _request(self, method: str, url: str, retry: RetryPolicy = DEFAULT_RETRY, **kwargs) -> Dict[str, Any]:
+        def send() -> Dict[str, Any]:
+            response = self.session.request(method, url, headers=self._headers(), timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+            return response.json() if response.content else {}
+
+        return retry.run_sync(send)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncWarehouseClient(_StatementsClient):
+    """
+    Non-blocking client for /api/2.0/sql/statements built on httpx
+
+    A statement that is still PENDING/RUNNING after the submit wait is polled on its
+    statement_id instead of holding a worker thread, so one event loop can keep hundreds
+    of warehouse queries in flight. A caller that is cancelled (client disconnect, abandoned
+    single-flight) cancels its statement on the warehouse as well.
+
+    Transient API errors (429, 502-504, dropped connections) are retried with jittered backoff.
+    Polls, chunk fetches and cancels always are; the submit only for read-only statements, with
+    the caller's retry policy.
+
+    `in_flight` and `queued` (statements the warehouse last reported PENDING) are the live load
+    the warehouse router balances on.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        warehouse_id: str,
+        token: Optional[str] = None,
+        auth: Optional[Callable[[], Dict[str, str]]] = None,
+        max_connections: int = ASYNC_MAX_CONNECTIONS,
+        max_keepalive: int = ASYNC_MAX_KEEPALIVE,
+        timeout: float = REQUEST_TIMEOUT,
+        http: Optional[httpx.AsyncClient] = None,
+    ):
+        super().__init__(host, warehouse_id, token=token, auth=auth, timeout=timeout)
+        self.dispositions = DispositionAdvisor()
+        self.runtimes = StatementRuntimes()
+        self.in_flight = 0
+        self.queued = 0
+        self._background: Set[asyncio.Task] = set()
+        self._owns_http = http is None
+        self.http = http or httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=timeout,
+            headers={"Content-Type": "application/json"},
+        )
+
+    def sibling(self, warehouse_id: str) -> "AsyncWarehouseClient":
+        """Client for another warehouse in the same workspace, sharing this client's connection pool"""
+        return AsyncWarehouseClient(
+            self._host, warehouse_id, token=self._token, auth=self._auth, timeout=self.timeout, http=self.http
+        )
+
+    async def execute(
+        self,
+        statement: str,
+        policy: ExecutionPolicy = DEFAULT_POLICY,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        row_limit: Optional[int] = None,
+        retry: Optional[RetryPolicy] = None,
+    ) -> ResultSet:
+        """Run a statement and collect every result chunk, inline or via external links"""
+        external_links = self.dispositions.use_external_links(statement, row_limit)
+        started = time.perf_counter()
+        try:
+            result = await self.execute_statement(statement, policy, external_links, parameters, retry)
+        except WarehouseError as e:
+            # Result too large for the 25 MiB inline limit: remember the shape and refetch as Arrow
+            if external_links or not _INLINE_LIMIT_ERROR.search(str(e)):
+                raise
+            self.dispositions.mark_large(statement, row_limit)
+            external_links = True
+            result = await self.execute_statement(statement, policy, True, parameters, retry)
+
+        fetched = time.perf_counter()
+        observe_phase("warehouse", fetched - started)
+        manifest = result.get("manifest", {})
+        self.dispositions.observe(statement, manifest, row_limit)
+        query = QUERY_NAME.get()
+        RESULT_ROWS.inc(manifest.get("total_row_count") or 0, query=query)
+        RESULT_BYTES.inc(manifest.get("total_byte_count") or 0, query=query)
+
+        if external_links:
+            tables = await self._download_arrow_chunks(result)
+            decoding = time.perf_counter()
+            result_set = ResultSet.from_manifest(manifest, tables=tables)
+        else:
+            rows = await self._inline_rows(result)
+            decoding = time.perf_counter()
+            result_set = ResultSet.from_manifest(manifest, data_array=rows)
+        observe_phase("fetch", decoding - fetched)
+        observe_phase("decode", time.perf_counter() - decoding)
+        return result_set
+
+    async def open_stream(
+        self,
+        statement: str,
+        policy: ExecutionPolicy = DEFAULT_POLICY,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        retry: Optional[RetryPolicy] = None,
+    ) -> ResultStream:
+        """
+        Run a statement and return its result as a stream of Arrow chunks
+
+        Always uses EXTERNAL_LINKS (no 25 MiB cap). Chunk links are resolved lazily and at most one
+        chunk is downloaded ahead of the consumer, so memory stays bounded by the chunk size.
+        Statement failures and timeouts are raised here, before any chunk is read.
+        """
+        started = time.perf_counter()
+        result = await self.execute_statement(statement, policy, True, parameters, retry)
+        observe_phase("warehouse", time.perf_counter() - started)
+        manifest = result.get("manifest", {})
+        query = QUERY_NAME.get()
+        RESULT_ROWS.inc(manifest.get("total_row_count") or 0, query=query)
+        RESULT_BYTES.inc(manifest.get("total_byte_count") or 0, query=query)
+        return ResultStream(manifest.get("schema", {}).get("columns", []), self._iter_arrow_chunks(result))
+
+    async def execute_statement(
+        self,
+        statement: str,
+        policy: ExecutionPolicy = DEFAULT_POLICY,
+        external_links: bool = False,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        retry: Optional[RetryPolicy] = None,
+    ) -> Dict[str, Any]:
+        """Run a statement, polling until it leaves PENDING/RUNNING, and return the raw response"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tag = current_tag()
+        payload = self._payload(statement, policy.submit_wait, external_links, parameters, tag)
+        submit_retry = (retry or DEFAULT_RETRY) if _READ_ONLY.match(statement) else NO_RETRY
+        submit = asyncio.ensure_future(self._request("POST", self.statements_url, retry=submit_retry, json=payload))
+        self.in_flight += 1
+        queued = False
+        try:
+            try:
+                result = await asyncio.shield(submit)
+            except asyncio.CancelledError:
+                # Abandoned during the submit wait: the statement id arrives with the response
+                self._spawn(self._cancel_when_submitted(submit, statement, started, tag))
+                raise
+            LEDGER.record(result.get("statement_id"), tag)
+
+            delays = policy.delays()
+            try:
+                queued = self._note_queued(queued, result)
+                while self._is_pending(result):
+                    remaining = policy.deadline - (loop.time() - started)
+                    if remaining <= 0:
+                        canceled = policy.cancel_on_deadline and await self.cancel_statement(result["statement_id"])
+                        if canceled:
+                            self.runtimes.canceled(statement, loop.time() - started, abandoned=False)
+                        raise self._timeout_error(result, policy, canceled)
+                    await asyncio.sleep(min(next(delays), remaining))
+                    result = await self._request("GET", self._statement_url(result["statement_id"]), retry=policy.poll_retry)
+                    queued = self._note_queued(queued, result)
+            except asyncio.CancelledError:
+                if self._is_pending(result):
+                    await asyncio.shield(self._cancel_abandoned(result["statement_id"], statement, started))
+                raise
+        finally:
+            self.in_flight -= 1
+            self.queued -= queued
+
+        self.runtimes.completed(statement, loop.time() - started)
+        return result
+
+    def _note_queued(self, queued: bool, result: Dict[str, Any]) -> bool:
+        """Keep `queued` in step with whether this statement is waiting for warehouse capacity"""
+        pending = result.get("status", {}).get("state") == "PENDING"
+        self.queued += pending - queued
+        return pending
+
+    async def _cancel_abandoned(self, statement_id: str, statement: str, started: float):
+        if await self.cancel_statement(statement_id):
+            self.runtimes.canceled(statement, asyncio.get_running_loop().time() - started, abandoned=True)
+
+    async def _cancel_when_submitted(self, submit: asyncio.Future, statement: str, started: float, tag: StatementTag):
+        try:
+            result = await submit
+        except Exception:
+            return
+        LEDGER.record(result.get("statement_id"), tag)
+        if self._is_pending(result):
+            await self._cancel_abandoned(result["statement_id"], statement, started)
+
+    def _spawn(self, coro):
+        # Keep a reference so fire-and-forget cleanup isn't garbage collected mid-flight
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def cancel_statement(self, statement_id: str) -> bool:
+        """Ask the warehouse to stop a running statement; best effort"""
+        try:
+            await self._request("POST", f"{self._statement_url(statement_id)}/cancel")
+            return True
+        except httpx.HTTPError:
+            return False
+
+    async def query_history(self, statement_ids: List[str]) -> List[Dict[str, Any]]:
+        """Query History entries (with execution metrics) of the given statements"""
+        rows: List[Dict[str, Any]] = []
+        page_token = None
+        while True:
+            page = await self._request("GET", f"{self.host}{QUERY_HISTORY_PATH}", params=self._history_params(statement_ids, page_token))
+            rows.extend(page.get("res") or [])
+            page_token = page.get("next_page_token")
+            if not page.get("has_next_page") or not page_token:
+                return rows
+
+    async def warehouse_state(self) -> str:
+        """RUNNING, STARTING, STOPPED, STOPPING, ... as reported by the SQL Warehouses API"""
+        info = await self._request("GET", self.warehouse_url)
+        return info.get("state", "UNKNOWN")
+
+    async def start_warehouse(self):
+        await self._request("POST", f"{self.warehouse_url}/start")
+
+    async def _chunk(self, statement_id: str, chunk_index: int) -> Dict[str, Any]:
+        return await self._request("GET", f"{self._statement_url(statement_id)}/result/chunks/{chunk_index}")
+
+    async def _inline_rows(self, result: Dict[str, Any]) -> List[List[Any]]:
+        """All JSON_ARRAY rows; chunks after the first are fetched in parallel"""
+        first = result.get("result") or {}
+        total_chunks = result.get("manifest", {}).get("total_chunk_count", 1)
+        rows = list(first.get("data_array") or [])
+        if total_chunks > 1:
+            chunks = await asyncio.gather(
+                *(self._chunk(result["statement_id"], index) for index in range(1, total_chunks))
+            )
+            for chunk in chunks:
+                rows.extend(chunk.get("data_array") or [])
+        return rows
+
+    async def _download_arrow_chunks(self, result: Dict[str, Any]) -> List[pa.Table]:
+        """Resolve the presigned link of every chunk, then download and decode them in parallel"""
+        statement_id = result["statement_id"]
+        total_chunks = result.get("manifest", {}).get("total_chunk_count", 0)
+        links = {link["chunk_index"]: link for link in (result.get("result") or {}).get("external_links") or []}
+
+        missing = [index for index in range(total_chunks) if index not in links]
+        for chunk in await asyncio.gather(*(self._chunk(statement_id, index) for index in missing)):
+            for link in chunk.get("external_links") or []:
+                links[link["chunk_index"]] = link
+
+        semaphore = asyncio.Semaphore(CHUNK_DOWNLOAD_CONCURRENCY)
+
+        async def download(link: Dict[str, Any]):
+            async with semaphore:
+                return await self._download_link(link)
+
+        return list(await asyncio.gather(*(download(links[index]) for index in sorted(links))))
+
+    async def _iter_arrow_chunks(self, result: Dict[str, Any]) -> AsyncIterator[pa.Table]:
+        """Yield chunks in order, downloading chunk n+1 while the consumer handles chunk n"""
+        statement_id = result["statement_id"]
+        total_chunks = result.get("manifest", {}).get("total_chunk_count", 0)
+        links = {link["chunk_index"]: link for link in (result.get("result") or {}).get("external_links") or []}
+
+        async def fetch(index: int) -> pa.Table:
+            if index not in links:
+                for link in (await self._chunk(statement_id, index)).get("external_links") or []:
+                    links[link["chunk_index"]] = link
+            return await self._download_link(links.pop(index))
+
+        pending = asyncio.ensure_future(fetch(0)) if total_chunks else None
+        try:
+            for index in range(total_chunks):
+                table = await pending
+                pending = asyncio.ensure_future(fetch(index + 1)) if index + 1 < total_chunks else None
+                yield normalize_table(table)
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def _download_link(self, link: Dict[str, Any]) -> pa.Table:
+        async def download() -> bytes:
+            # Presigned cloud storage URL: must not carry the workspace Authorization header
+            response = await self.http.get(link["external_link"], headers=link.get("http_headers") or {})
+            response.raise_for_status()
+            return response.content
+
+        return read_arrow_stream(await DEFAULT_RETRY.run(download))
+
+    async def _request(self, method: str, url: str, retry: RetryPolicy = DEFAULT_RETRY, **kwargs) -> Dict[str, Any]:
+        async def send() -> Dict[str, Any]:
+            response = await self.http.request(method, url, headers=await self._auth_headers(), **kwargs)
+            response.raise_for_status()
+            return response.json() if response.content else {}
+
+        return await retry.run(send)
+
+    async def _auth_headers(self) -> Dict[str, str]:
+        # Credentials still being resolved (workspace.LazyWorkspace) are waited for off the event loop
+        if self._auth is not None and not getattr(self._auth, "ready", True):
+            return await asyncio.to_thread(self._auth)
+        return self._headers()
+
+    async def aclose(self):
+        if self._owns_http:
+            await self.http.aclose()
+
+
+def to_records(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert a SUCCEEDED statement response into a list of row dictionaries"""
+    data_array = result.get("result", {}).get("data_array")
+    if not data_array:
+        return []
+
+    manifest = result.get("manifest") or result["result"].get("manifest", {})
+    columns = [col["name"] for col in manifest["schema"]["columns"]]
+    return [dict(zip(columns, row)) for row in data_array]
@@ -0,0 +1,156 @@
+"""
+SQL warehouse state monitor
+Polls the SQL Warehouses API so the query service knows when the warehouse is stopped or still
+starting (and can answer from last-known results instead of queueing behind a cold start), and
+optionally keeps the warehouse running during business hours
+"""
+from datetime import datetime, time as clock
+from typing import Any, Dict, Optional
+from zoneinfo import ZoneInfo
+import asyncio
+import os
+import time
+
+from .warehouse import AsyncWarehouseClient
+
+# How often to read the warehouse state (seconds, 0 disables the monitor)
+WAREHOUSE_STATE_INTERVAL = float(os.getenv("WAREHOUSE_STATE_INTERVAL", "30"))
+# e.g. "Mon-Fri 07:00-19:00" or "07:00-19:00" (every day); unset disables keep-warm
+WAREHOUSE_KEEP_WARM = os.getenv("WAREHOUSE_KEEP_WARM")
+WAREHOUSE_KEEP_WARM_TZ = os.getenv("WAREHOUSE_KEEP_WARM_TZ", "America/Los_Angeles")
+# Idle time after which a keep-warm SELECT 1 is sent, to stay ahead of the auto-stop timer
+WAREHOUSE_KEEP_WARM_PING = float(os.getenv("WAREHOUSE_KEEP_WARM_PING", "300"))
+
+COLD_STATES = ("STOPPED", "STOPPING", "STARTING")
+# Poll faster while the warehouse is coming up so we notice RUNNING promptly
+COLD_POLL_INTERVAL = 5.0
+
+_DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class KeepWarmWindow:
+    """Weekly business-hours window, parsed from "Mon-Fri 07:00-19:00" style specs"""
+
+    def __init__(self, spec: str, tz: str = WAREHOUSE_KEEP_WARM_TZ):
+        parts = spec.split()
+        if len(parts) == 1:
+            days, hours = "mon-sun", parts[0]
+        elif len(parts) == 2:
+            days, hours = parts
+        else:
+            raise ValueError(f"Invalid keep-warm window: {spec!r}")
+
+        self.days = set()
+        for item in days.lower().split(","):
+            first, _, last = item.partition("-")
+            start, end = _DAYS.index(first[:3]), _DAYS.index((last or first)[:3])
+            self.days.update(range(start, end + 1) if start <= end else [*range(start, 7), *range(0, end + 1)])
+
+        opens, _, closes = hours.partition("-")
+        self.opens = clock.fromisoformat(opens)
+        self.closes = clock.fromisoformat(closes)
+        self.tz = ZoneInfo(tz)
+        self.spec = spec
+
+    def contains(self, moment: Optional[datetime] = None) -> bool:
+        local = (moment or datetime.now(self.tz)).astimezone(self.tz)
+        return local.weekday() in self.days and self.opens <= local.time() < self.closes
+
+
+class WarehouseMonitor:
+    """
+    Tracks the warehouse state in the background
+
+    `cold` is true while the warehouse is stopped or starting; the state is UNKNOWN until the
+    first successful read (or when the token can't read warehouse state), which never counts as
+    cold, so the monitor can only ever help. Successful statements mark the warehouse RUNNING
+    and reset the keep-warm idle timer.
+    """
+
+    def __init__(
+        self,
+        warehouse: AsyncWarehouseClient,
+        interval: float = WAREHOUSE_STATE_INTERVAL,
+        keep_warm: Optional[KeepWarmWindow] = None,
+        ping_after: float = WAREHOUSE_KEEP_WARM_PING,
+    ):
+        self.warehouse = warehouse
+        self.interval = interval
+        self.keep_warm = keep_warm if keep_warm is not None else (KeepWarmWindow(WAREHOUSE_KEEP_WARM) if WAREHOUSE_KEEP_WARM else None)
+        self.ping_after = ping_after
+        self.state = "UNKNOWN"
+        self.state_since = time.time()
+        self.checked_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_activity = time.monotonic()
+        self.starts_requested = 0
+        self.pings = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def cold(self) -> bool:
+        return self.state in COLD_STATES
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            print(f"Warehouse state: {self.state} -> {state}")
+            self.state = state
+            self.state_since = time.time()
+
+    def note_activity(self):
+        """A statement just succeeded, so the warehouse is up"""
+        self.last_activity = time.monotonic()
+        self._set_state("RUNNING")
+
+    async def check(self) -> str:
+        try:
+            self._set_state(await self.warehouse.warehouse_state())
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)[:200]
+        self.checked_at = time.time()
+        return self.state
+
+    async def _keep_warm_tick(self):
+        if not self.keep_warm or not self.keep_warm.contains():
+            return
+        if self.state == "STOPPED":
+            print(f"Starting warehouse for keep-warm window {self.keep_warm.spec}")
+            await self.warehouse.start_warehouse()
+            self.starts_requested += 1
+            self._set_state("STARTING")
+        elif self.state == "RUNNING" and time.monotonic() - self.last_activity >= self.ping_after:
+            await self.warehouse.execute("SELECT 1")
+            self.pings += 1
+            self.note_activity()
+
+    async def _run(self):
+        while True:
+            await self.check()
+            try:
+                await self._keep_warm_tick()
+            except Exception as e:
+                print(f"Warehouse keep-warm error: {str(e)[:200]}")
+            await asyncio.sleep(min(self.interval, COLD_POLL_INTERVAL) if self.cold else self.interval)
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "id": self.warehouse.warehouse_id,
+            "state": self.state,
+            "state_since": self.state_since,
+            "checked_at": self.checked_at,
+            "error": self.last_error,
+            "keep_warm": self.keep_warm.spec if self.keep_warm else None,
+            "keep_warm_active": bool(self.keep_warm and self.keep_warm.contains()),
+            "starts_requested": self.starts_requested,
+            "keep_warm_pings": self.pings,
+        }
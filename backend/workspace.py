@@ -0,0 +1,86 @@
+"""
+Databricks workspace config for the SDK-authenticated backend, resolved on first use
+WorkspaceClient() reads the config chain (environment, ~/.databrickscfg, the OAuth client of a
+Databricks App) and fetches the host's metadata over the network, with retries, before it
+returns; importing databricks.sdk alone takes about a second. Done at import, both run before
+uvicorn binds its port, on every cold start and scale-out. LazyWorkspace imports the SDK and
+builds the client on first use instead: `warm()` starts that in a thread at startup, and the
+async warehouse client waits for it off the event loop.
+"""
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+import os
+import threading
+import time
+
+if TYPE_CHECKING:
+    from databricks.sdk import WorkspaceClient
+
+
+class LazyWorkspace:
+    """
+    A WorkspaceClient built once, on first use
+
+    Pass the instance as `auth` and `resolve_host` as `host` of a warehouse client. The host is
+    taken from DATABRICKS_HOST when it is set (Databricks Apps set it), without building the client.
+    """
+
+    def __init__(self, factory: Optional[Callable[[], "WorkspaceClient"]] = None):
+        self._factory = factory
+        self._client: Optional["WorkspaceClient"] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.resolve_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._client is not None
+
+    @property
+    def client(self) -> "WorkspaceClient":
+        """The client, building it (blocking) if no one has yet"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    started = time.perf_counter()
+                    try:
+                        if self._factory is None:
+                            from databricks.sdk import WorkspaceClient
+                            self._factory = WorkspaceClient
+                        self._client = self._factory()
+                    except Exception as e:
+                        self.error = str(e)[:200]
+                        raise
+                    self.error = None
+                    self.resolve_seconds = time.perf_counter() - started
+        return self._client
+
+    def resolve_host(self) -> str:
+        return os.getenv("DATABRICKS_HOST") or self.client.config.host
+
+    def __call__(self) -> Dict[str, str]:
+        """Auth headers for a request (the SDK refreshes OAuth tokens itself)"""
+        return self.client.config.authenticate()
+
+    def warm(self):
+        """Build the client in a background thread; returns at once"""
+        if self._client is not None or self._thread is not None:
+            return
+
+        def build():
+            try:
+                self.client
+            except Exception as e:
+                print(f"Databricks workspace config failed: {str(e)[:200]}")
+            finally:
+                self._thread = None
+
+        self._thread = threading.Thread(target=build, name="workspace-config", daemon=True)
+        self._thread.start()
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "ready": self.ready,
+            "resolve_ms": round(self.resolve_seconds * 1000, 1) if self.resolve_seconds is not None else None,
+            "error": self.error,
+        }
@@ -65,7 +65,30 @@ def main():
     # Upload app files
     files_to_upload = [
         ("app.yaml", f"{workspace_path}/app.yaml"),
+        ("backend/__init__.py", f"{workspace_path}/backend/__init__.py"),
+        ("backend/admin.py", f"{workspace_path}/backend/admin.py"),
+        ("backend/admission.py", f"{workspace_path}/backend/admission.py"),
         ("backend/app_main.py", f"{workspace_path}/backend/app_main.py"),
+        ("backend/attribution.py", f"{workspace_path}/backend/attribution.py"),
+        ("backend/batch.py", f"{workspace_path}/backend/batch.py"),
+        ("backend/cache.py", f"{workspace_path}/backend/cache.py"),
+        ("backend/decode.py", f"{workspace_path}/backend/decode.py"),
+        ("backend/disconnect.py", f"{workspace_path}/backend/disconnect.py"),
+        ("backend/formats.py", f"{workspace_path}/backend/formats.py"),
+        ("backend/metrics.py", f"{workspace_path}/backend/metrics.py"),
+        ("backend/pagination.py", f"{workspace_path}/backend/pagination.py"),
+        ("backend/profiling.py", f"{workspace_path}/backend/profiling.py"),
+        ("backend/queries.py", f"{workspace_path}/backend/queries.py"),
+        ("backend/replica.py", f"{workspace_path}/backend/replica.py"),
+        ("backend/resilience.py", f"{workspace_path}/backend/resilience.py"),
+        ("backend/results.py", f"{workspace_path}/backend/results.py"),
+        ("backend/routing.py", f"{workspace_path}/backend/routing.py"),
+        ("backend/service.py", f"{workspace_path}/backend/service.py"),
+        ("backend/shared_cache.py", f"{workspace_path}/backend/shared_cache.py"),
+        ("backend/singleflight.py", f"{workspace_path}/backend/singleflight.py"),
+        ("backend/warehouse.py", f"{workspace_path}/backend/warehouse.py"),
+        ("backend/warehouse_monitor.py", f"{workspace_path}/backend/warehouse_monitor.py"),
+        ("backend/workspace.py", f"{workspace_path}/backend/workspace.py"),
         ("backend/requirements.txt", f"{workspace_path}/backend/requirements.txt"),
     ]
 
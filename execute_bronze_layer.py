@@ -8,14 +8,24 @@ import os
 import re
 import time
 
+from backend.routing import pipeline_warehouse_id
+from backend.attribution import PipelineRun
+from backend.warehouse import PIPELINE_POLICY, WarehouseClient, WarehouseError
+
 # Configuration from environment variables
 DB_HOST = os.getenv("DATABRICKS_HOST", "https://fe-vm-hls-amer.cloud.databricks.com")
 DB_TOKEN = os.getenv("DATABRICKS_TOKEN")
-WAREHOUSE_ID = os.getenv("DATABRICKS_WAREHOUSE_ID", "4b28691c780d9875")
+# The pipeline warehouse from WAREHOUSES when one is listed, so CTAS runs never share the API warehouses
+WAREHOUSE_ID = pipeline_warehouse_id(os.getenv("DATABRICKS_WAREHOUSE_ID", "4b28691c780d9875"))
 
 if not DB_TOKEN:
     raise ValueError("DATABRICKS_TOKEN environment variable must be set")
 
+# Statements are submitted without blocking and polled until done (CTAS can run for minutes)
+warehouse = WarehouseClient(host=DB_HOST, warehouse_id=WAREHOUSE_ID, token=DB_TOKEN)
+# Tags every statement with this run's id, so its cost can be read back from Query History
+run = PipelineRun("bronze")
+
 def split_sql_statements(sql_content):
     """Split SQL content into individual statements"""
     # Remove comments
@@ -52,19 +62,7 @@ def split_sql_statements(sql_content):
     return [s for s in statements if s.strip()]
 
 def execute_sql_statement(statement, statement_num, total_statements):
-    """Execute a single SQL statement via Databricks REST API"""
-    url = f"{DB_HOST}/api/2.0/sql/statements/"
-    headers = {
-        "Authorization": f"Bearer {DB_TOKEN}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "warehouse_id": WAREHOUSE_ID,
-        "statement": statement,
-        "wait_timeout": "50s"
-    }
-
+    """Execute a single SQL statement via Databricks REST API, polling until it finishes"""
     # Extract statement preview (first 80 chars)
     preview = statement[:80].replace('\n', ' ').strip()
     if len(statement) > 80:
@@ -73,25 +71,20 @@ def execute_sql_statement(statement, statement_num, total_statements):
     print(f"[{statement_num}/{total_statements}] {preview}")
 
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=150)
-
-        if response.status_code == 200:
-            result = response.json()
-            status = result.get('status', {}).get('state', 'UNKNOWN')
-
-            if status == 'SUCCEEDED':
-                row_count = result.get('result', {}).get('row_count', 0)
-                print(f"  ✓ Success (rows: {row_count})")
-                return True, f"Success (rows: {row_count})"
-            else:
-                error_msg = result.get('status', {}).get('error', {}).get('message', 'Unknown error')
-                print(f"  ✗ Status: {status}, Error: {error_msg[:200]}")
-                return False, f"Status: {status}, Error: {error_msg[:200]}"
-        else:
-            error_text = response.text[:200]
-            print(f"  ✗ HTTP {response.status_code}: {error_text}")
-            return False, f"HTTP {response.status_code}: {error_text}"
+        with run.statement(statement_num):
+            result = warehouse.execute_statement(statement, PIPELINE_POLICY)
+        row_count = result.get('manifest', {}).get('total_row_count', 0)
+        print(f"  ✓ Success (rows: {row_count})")
+        return True, f"Success (rows: {row_count})"
 
+    except WarehouseError as e:
+        error_msg = str(e)[:200]
+        print(f"  ✗ Status: {e.state}, Error: {error_msg}")
+        return False, f"Status: {e.state}, Error: {error_msg}"
+    except requests.exceptions.HTTPError as e:
+        error_text = e.response.text[:200]
+        print(f"  ✗ HTTP {e.response.status_code}: {error_text}")
+        return False, f"HTTP {e.response.status_code}: {error_text}"
     except Exception as e:
         error_msg = str(e)[:200]
         print(f"  ✗ Exception: {error_msg}")
@@ -103,6 +96,7 @@ def main():
     print("="*80)
     print(f"Host: {DB_HOST}")
     print(f"Warehouse ID: {WAREHOUSE_ID}")
+    print(f"Run ID: {run.run_id}")
     print("="*80 + "\n")
 
     # Read the Bronze layer SQL file
@@ -142,6 +136,8 @@ def main():
     print(f"Completed Bronze Layer: {successful} succeeded, {failed} failed")
     print("="*80 + "\n")
     print(f"Layer completed in {elapsed_time:.1f} seconds ({elapsed_time/60:.1f} minutes)\n")
+    run.report(warehouse)
+    print()
 
     if failed == 0:
         print("="*80)
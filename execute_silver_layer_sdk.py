@@ -7,9 +7,19 @@ from databricks.sdk import WorkspaceClient
 import re
 import time
 
+from backend.routing import pipeline_warehouse_id
+from backend.attribution import PipelineRun
+from backend.warehouse import PIPELINE_POLICY, WarehouseClient, WarehouseError
+
 # Initialize Databricks client (uses credentials from ~/.databrickscfg)
 w = WorkspaceClient()
-WAREHOUSE_ID = "4b28691c780d9875"
+# The pipeline warehouse from WAREHOUSES when one is listed, so CTAS runs never share the API warehouses
+WAREHOUSE_ID = pipeline_warehouse_id("4b28691c780d9875")
+
+# Statements are submitted without blocking and polled until done (CTAS can run for minutes)
+warehouse = WarehouseClient(host=w.config.host, warehouse_id=WAREHOUSE_ID, auth=w.config.authenticate)
+# Tags every statement with this run's id, so its cost can be read back from Query History
+run = PipelineRun("silver")
 
 def split_sql_statements(sql_content):
     """Split SQL content into individual statements"""
@@ -47,7 +57,7 @@ def split_sql_statements(sql_content):
     return [s for s in statements if s.strip()]
 
 def execute_sql_statement(statement, statement_num, total_statements):
-    """Execute a single SQL statement via Databricks SDK"""
+    """Execute a single SQL statement via the Statement Execution API, polling until it finishes"""
     # Extract statement preview (first 80 chars)
     preview = statement[:80].replace('\n', ' ').strip()
     if len(statement) > 80:
@@ -56,23 +66,16 @@ def execute_sql_statement(statement, statement_num, total_statements):
     print(f"[{statement_num}/{total_statements}] {preview}")
 
     try:
-        # Execute statement using Databricks SDK
-        response = w.statement_execution.execute_statement(
-            warehouse_id=WAREHOUSE_ID,
-            statement=statement,
-            wait_timeout="50s"
-        )
-
-        if response.status and str(response.status.state) == "StatementState.SUCCEEDED":
-            row_count = len(response.result.data_array) if response.result and response.result.data_array else 0
-            print(f"  ✓ Success (rows: {row_count})")
-            return True, f"Success (rows: {row_count})"
-        else:
-            state = str(response.status.state) if response.status else "No status"
-            error_msg = response.status.error.message if response.status and response.status.error else f"State: {state}"
-            print(f"  ✗ Error: {error_msg[:200]}")
-            return False, f"Error: {error_msg[:200]}"
+        with run.statement(statement_num):
+            result = warehouse.execute_statement(statement, PIPELINE_POLICY)
+        row_count = result.get('manifest', {}).get('total_row_count', 0)
+        print(f"  ✓ Success (rows: {row_count})")
+        return True, f"Success (rows: {row_count})"
 
+    except WarehouseError as e:
+        error_msg = str(e)[:200]
+        print(f"  ✗ Error: {error_msg}")
+        return False, f"Error: {error_msg}"
     except Exception as e:
         error_msg = str(e)[:200]
         print(f"  ✗ Exception: {error_msg}")
@@ -83,6 +86,7 @@ def main():
     print("R_HEALTH SILVER LAYER - DATA CLEANSING & ENRICHMENT")
     print("="*80)
     print(f"Warehouse ID: {WAREHOUSE_ID}")
+    print(f"Run ID: {run.run_id}")
     print("="*80 + "\n")
 
     # Read the Silver layer SQL file
@@ -122,6 +126,8 @@ def main():
     print(f"Completed Silver Layer: {successful} succeeded, {failed} failed")
     print("="*80 + "\n")
     print(f"Layer completed in {elapsed_time:.1f} seconds ({elapsed_time/60:.1f} minutes)\n")
+    run.report(warehouse)
+    print()
 
     if failed == 0:
         print("="*80)
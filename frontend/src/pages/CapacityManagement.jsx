@@ -19,7 +19,7 @@ import HotelIcon from '@mui/icons-material/Hotel';
 import TrendingUpIcon from '@mui/icons-material/TrendingUp';
 import PeopleIcon from '@mui/icons-material/People';
 import WarningIcon from '@mui/icons-material/Warning';
-import { getCapacityManagement, getCapacitySummary } from '../services/api';
+import { getBatch, isCanceled } from '../services/api';
 
 function CapacityManagement() {
   const [loading, setLoading] = useState(true);
@@ -30,7 +30,10 @@ function CapacityManagement() {
   const [priorityFilter, setPriorityFilter] = useState('All');
 
   useEffect(() => {
-    fetchData();
+    const controller = new AbortController();
+    fetchData(controller.signal);
+    // Leaving the page aborts the request, and the backend cancels its warehouse statements
+    return () => controller.abort();
   }, []);
 
   useEffect(() => {
@@ -41,18 +44,19 @@ function CapacityManagement() {
     }
   }, [priorityFilter, data]);
 
-  const fetchData = async () => {
+  const fetchData = async (signal) => {
     try {
       setLoading(true);
-      const [summaryData, capacityData] = await Promise.all([
-        getCapacitySummary(),
-        getCapacityManagement({ limit: 100 }),
-      ]);
+      const { summary: summaryData, rows: capacityData } = await getBatch({
+        summary: ['/api/capacity-management/summary'],
+        rows: ['/api/capacity-management', { limit: 100 }],
+      }, { signal });
       setSummary(summaryData);
       setData(capacityData);
       setFilteredData(capacityData);
       setError(null);
     } catch (err) {
+      if (isCanceled(err)) return;
       setError('Failed to load capacity management data. Please ensure the backend is running.');
       console.error(err);
     } finally {
@@ -20,7 +20,7 @@ import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, Responsive
 import ScienceIcon from '@mui/icons-material/Science';
 import PersonIcon from '@mui/icons-material/Person';
 import CheckCircleIcon from '@mui/icons-material/CheckCircle';
-import { getClinicalTrialMatching, getClinicalTrialSummary } from '../services/api';
+import { getBatch, isCanceled } from '../services/api';
 
 function ClinicalTrials() {
   const [loading, setLoading] = useState(true);
@@ -32,7 +32,10 @@ function ClinicalTrials() {
   const [eligibleOnly, setEligibleOnly] = useState(false);
 
   useEffect(() => {
-    fetchData();
+    const controller = new AbortController();
+    fetchData(controller.signal);
+    // Leaving the page aborts the request, and the backend cancels its warehouse statements
+    return () => controller.abort();
   }, []);
 
   useEffect(() => {
@@ -50,18 +53,19 @@ function ClinicalTrials() {
     setFilteredData(filtered);
   }, [trialTypeFilter, eligibleOnly, data]);
 
-  const fetchData = async () => {
+  const fetchData = async (signal) => {
     try {
       setLoading(true);
-      const [summaryData, trialsData] = await Promise.all([
-        getClinicalTrialSummary(),
-        getClinicalTrialMatching({ limit: 100 }),
-      ]);
+      const { summary: summaryData, rows: trialsData } = await getBatch({
+        summary: ['/api/clinical-trial-matching/summary'],
+        rows: ['/api/clinical-trial-matching', { limit: 100 }],
+      }, { signal });
       setSummary(summaryData);
       setData(trialsData);
       setFilteredData(trialsData);
       setError(null);
     } catch (err) {
+      if (isCanceled(err)) return;
       setError('Failed to load clinical trial data. Please ensure the backend is running.');
       console.error(err);
     } finally {
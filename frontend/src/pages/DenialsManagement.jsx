@@ -19,7 +19,7 @@ import AssignmentLateIcon from '@mui/icons-material/AssignmentLate';
 import GavelIcon from '@mui/icons-material/Gavel';
 import AttachMoneyIcon from '@mui/icons-material/AttachMoney';
 import TrendingUpIcon from '@mui/icons-material/TrendingUp';
-import { getDenialsManagement, getDenialsSummary, getPayers } from '../services/api';
+import { getBatch, isCanceled } from '../services/api';
 
 const COLORS = ['#1976d2', '#2e7d32', '#ed6c02', '#d32f2f', '#9c27b0', '#00897b'];
 
@@ -33,7 +33,10 @@ function DenialsManagement() {
   const [payerFilter, setPayerFilter] = useState('All');
 
   useEffect(() => {
-    fetchData();
+    const controller = new AbortController();
+    fetchData(controller.signal);
+    // Leaving the page aborts the request, and the backend cancels its warehouse statements
+    return () => controller.abort();
   }, []);
 
   useEffect(() => {
@@ -44,20 +47,21 @@ function DenialsManagement() {
     }
   }, [payerFilter, data]);
 
-  const fetchData = async () => {
+  const fetchData = async (signal) => {
     try {
       setLoading(true);
-      const [summaryData, denialsData, payersData] = await Promise.all([
-        getDenialsSummary(),
-        getDenialsManagement({ limit: 100 }),
-        getPayers(),
-      ]);
+      const { summary: summaryData, rows: denialsData, payers: payersData } = await getBatch({
+        summary: ['/api/denials-management/summary'],
+        rows: ['/api/denials-management', { limit: 100 }],
+        payers: ['/api/payers'],
+      }, { signal });
       setSummary(summaryData);
       setData(denialsData);
       setFilteredData(denialsData);
       setPayers(payersData);
       setError(null);
     } catch (err) {
+      if (isCanceled(err)) return;
       setError('Failed to load denials management data. Please ensure the backend is running.');
       console.error(err);
     } finally {
@@ -20,7 +20,7 @@ import DescriptionIcon from '@mui/icons-material/Description';
 import CheckCircleIcon from '@mui/icons-material/CheckCircle';
 import TimerIcon from '@mui/icons-material/Timer';
 import VerifiedIcon from '@mui/icons-material/Verified';
-import { getDocumentationManagement, getDocumentationSummary, getPayers } from '../services/api';
+import { getBatch, isCanceled } from '../services/api';
 
 function DocumentationManagement() {
   const [loading, setLoading] = useState(true);
@@ -33,7 +33,10 @@ function DocumentationManagement() {
   const [urgencyFilter, setUrgencyFilter] = useState('All');
 
   useEffect(() => {
-    fetchData();
+    const controller = new AbortController();
+    fetchData(controller.signal);
+    // Leaving the page aborts the request, and the backend cancels its warehouse statements
+    return () => controller.abort();
   }, []);
 
   useEffect(() => {
@@ -50,20 +53,21 @@ function DocumentationManagement() {
     setFilteredData(filtered);
   }, [payerFilter, urgencyFilter, data]);
 
-  const fetchData = async () => {
+  const fetchData = async (signal) => {
     try {
       setLoading(true);
-      const [summaryData, docData, payersData] = await Promise.all([
-        getDocumentationSummary(),
-        getDocumentationManagement({ limit: 100 }),
-        getPayers(),
-      ]);
+      const { summary: summaryData, rows: docData, payers: payersData } = await getBatch({
+        summary: ['/api/documentation-management/summary'],
+        rows: ['/api/documentation-management', { limit: 100 }],
+        payers: ['/api/payers'],
+      }, { signal });
       setSummary(summaryData);
       setData(docData);
       setFilteredData(docData);
       setPayers(payersData);
       setError(null);
     } catch (err) {
+      if (isCanceled(err)) return;
       setError('Failed to load documentation management data. Please ensure the backend is running.');
       console.error(err);
     } finally {
@@ -20,7 +20,7 @@ import AccessTimeIcon from '@mui/icons-material/AccessTime';
 import WarningIcon from '@mui/icons-material/Warning';
 import AttachMoneyIcon from '@mui/icons-material/AttachMoney';
 import AssignmentIcon from '@mui/icons-material/Assignment';
-import { getTimelyFilingAppeals, getTimelyFilingSummary } from '../services/api';
+import { getBatch, isCanceled } from '../services/api';
 
 function TimelyFiling() {
   const [loading, setLoading] = useState(true);
@@ -31,7 +31,10 @@ function TimelyFiling() {
   const [urgencyFilter, setUrgencyFilter] = useState('All');
 
   useEffect(() => {
-    fetchData();
+    const controller = new AbortController();
+    fetchData(controller.signal);
+    // Leaving the page aborts the request, and the backend cancels its warehouse statements
+    return () => controller.abort();
   }, []);
 
   useEffect(() => {
@@ -48,18 +51,19 @@ function TimelyFiling() {
     }
   }, [urgencyFilter, data]);
 
-  const fetchData = async () => {
+  const fetchData = async (signal) => {
     try {
       setLoading(true);
-      const [summaryData, filingData] = await Promise.all([
-        getTimelyFilingSummary(),
-        getTimelyFilingAppeals({ limit: 100 }),
-      ]);
+      const { summary: summaryData, rows: filingData } = await getBatch({
+        summary: ['/api/timely-filing-appeals/summary'],
+        rows: ['/api/timely-filing-appeals', { limit: 100 }],
+      }, { signal });
       setSummary(summaryData);
       setData(filingData);
       setFilteredData(filingData);
       setError(null);
     } catch (err) {
+      if (isCanceled(err)) return;
       setError('Failed to load timely filing data. Please ensure the backend is running.');
       console.error(err);
     } finally {
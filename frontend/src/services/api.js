@@ -149,6 +149,28 @@ export const getDrgCodes = async () => {
   }
 };
 
+// ==============================================================================
+// BATCH
+// ==============================================================================
+
+// Run several GET calls in one request; the backend executes them concurrently.
+// calls: { name: [path, params] } -> resolves to { name: data }, rejects if any call failed.
+// Aborting `signal` drops the request, and the backend cancels the statements it started for it.
+export const getBatch = async (calls, { signal } = {}) => {
+  const response = await api.post('/api/batch', {
+    calls: Object.entries(calls).map(([id, [path, params = {}]]) => ({ id, path, params })),
+  }, { signal });
+  const results = response.data.results;
+  const failed = Object.entries(results).filter(([, result]) => result.status !== 200);
+  if (failed.length > 0) {
+    throw new Error(`Batch calls failed: ${failed.map(([id, result]) => `${id} (${result.status})`).join(', ')}`);
+  }
+  return Object.fromEntries(Object.entries(results).map(([id, result]) => [id, result.data]));
+};
+
+// True for requests aborted through their AbortSignal (e.g. the page was left)
+export const isCanceled = (error) => axios.isCancel(error);
+
 export const getHealthCheck = async () => {
   try {
     const response = await api.get('/health');